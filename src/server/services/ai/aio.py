@@ -0,0 +1,621 @@
+"""
+asyncio entry point for the Player Analytics Service
+
+    python aio.py
+    ANALYTICS_WORKER_CLASS=aiohttp.GunicornWebWorker gunicorn -c gunicorn.conf.py aio:app
+
+Serves the same endpoints as the Flask app in player-analytics.py, with the
+same requests and responses, on aiohttp. Both apps parse and check their
+requests with analytics.api, so the handlers here only adapt aiohttp
+requests to it. A frame request awaits the hosted
+detector instead of holding a thread for the round trip, so one process
+keeps up to ROBOFLOW_ASYNC_CONCURRENCY detector calls in flight. Decoding,
+resizing and jersey sampling still run on the frame pool. Tracking,
+analytics and response encoding run on the loop's default executor, so the
+event loop itself only moves bytes and schedules work. Detector backends
+without non-blocking I/O (local model, replay) run on that executor too.
+
+Video streams and job uploads are read off the socket by the loop and fed
+to the existing threaded pipeline. Each stream or upload gets a thread of
+its own rather than one from the shared executor. With
+ANALYTICS_FRAME_SOCKET set, the Unix socket frame transport
+(analytics.transport) is served on the same loop.
+"""
+
+import os
+import asyncio
+import threading
+import concurrent.futures
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+from aiohttp import web
+from werkzeug.datastructures import CombinedMultiDict, MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header
+
+from analytics import encoding, streaming
+from analytics.sessions import SessionNotFound
+from analytics.jobs import JobNotFound, JobLimitExceeded, QueueFull
+from analytics.uploads import UploadBuffer, UploadTooLarge
+from analytics.api import RequestError, heatmap_filename, job_result_path
+from wsgi import player_analytics as pa, service
+
+# Option parsing and validation are shared with the Flask app
+parser = pa.request_parser
+routes = web.RouteTableDef()
+
+
+def json_response(data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> web.Response:
+    return web.Response(body=encoding.dumps_json(data) + b'\n', status=status, content_type='application/json',
+                        headers=headers)
+
+
+def error(message: str, status: int, **extra) -> web.Response:
+    return json_response({'error': message, **extra}, status)
+
+
+def query(request: web.Request) -> MultiDict:
+    """The query string as a werkzeug MultiDict, so the shared request parser applies unchanged"""
+    return MultiDict(list(request.query.items()))
+
+
+def mimetype(request: web.Request) -> str:
+    # aiohttp reports a missing Content-Type as application/octet-stream; Flask reports ''
+    return request.content_type if 'Content-Type' in request.headers else ''
+
+
+async def read_form(request: web.Request) -> Tuple[MultiDict, MultiDict]:
+    """Form fields and uploaded files (as memoryviews) of a multipart or urlencoded body, within MAX_UPLOAD_BYTES"""
+    limit = pa.MAX_UPLOAD_BYTES
+    # Rejected from the declared length before any of the body is read
+    if limit and request.content_length and request.content_length > limit:
+        raise UploadTooLarge(f"Request exceeds the {limit} byte upload limit")
+    form, files = MultiDict(), MultiDict()
+    if request.content_type != 'multipart/form-data':
+        for key, value in (await request.post()).items():
+            form.add(key, value)
+        return form, files
+    reader = await request.multipart()
+    received = 0
+    async for part in reader:
+        if part.filename is None:
+            form.add(part.name, await part.text())
+            continue
+        buffer = UploadBuffer(pa.STREAM_MAX_FRAME_BYTES)
+        while chunk := await part.read_chunk():
+            received += len(chunk)
+            # Chunked bodies carry no length to check up front
+            if limit and received > limit:
+                raise UploadTooLarge(f"Request exceeds the {limit} byte upload limit")
+            buffer.write(chunk)
+        files.add(part.name, buffer.view())
+    return form, files
+
+
+async def json_body(request: web.Request) -> Dict[str, Any]:
+    """The JSON body, or {} when it is missing or malformed"""
+    try:
+        return await request.json() or {}
+    except ValueError:
+        return {}
+
+
+async def analysis_response(request: web.Request, result: Dict[str, Any]) -> web.Response:
+    """Encode an analysis result as JSON, msgpack or Arrow IPC according to the Accept header"""
+    accept = parse_accept_header(request.headers.get('Accept'), MIMEAccept)
+    negotiated = encoding.negotiate(accept)
+    body = await asyncio.get_running_loop().run_in_executor(None, encoding.encode, result, negotiated)
+    return web.Response(body=body, content_type=negotiated, headers={'Vary': 'Accept'})
+
+
+def in_thread(function: Callable, *args) -> Awaitable:
+    """Run a long blocking call on a thread of its own instead of tying up the default executor"""
+    future = concurrent.futures.Future()
+
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(function(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return asyncio.wrap_future(future)
+
+
+def blocking_chunks(content, loop: asyncio.AbstractEventLoop) -> Iterator[bytes]:
+    """The request body as a blocking iterator for a worker thread; every read happens on the event loop"""
+    while True:
+        chunk = asyncio.run_coroutine_threadsafe(content.readany(), loop).result()
+        if not chunk:
+            return
+        yield chunk
+
+
+async def iterate_in_thread(iterator: Iterator, queue_size: int = pa.STREAM_QUEUE_SIZE) -> AsyncIterator:
+    """Drive a blocking iterator on a thread of its own, yielding its items on the event loop"""
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue(queue_size)
+    stopped = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterator:
+                if stopped.is_set():
+                    break
+                asyncio.run_coroutine_threadsafe(items.put((item, None)), loop).result()
+        except BaseException as e:
+            asyncio.run_coroutine_threadsafe(items.put((done, e)), loop).result()
+            return
+        finally:
+            # Generators are closed on the thread that ran them
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+        asyncio.run_coroutine_threadsafe(items.put((done, None)), loop).result()
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, failure = await items.get()
+            if failure is not None:
+                raise failure
+            if item is done:
+                return
+            yield item
+    finally:
+        # Also reached when the client goes away; free the producer if it is waiting on a full queue
+        stopped.set()
+        while not items.empty():
+            items.get_nowait()
+
+
+async def stream_response(request: web.Request, session) -> web.StreamResponse:
+    """NDJSON results for the video in the request body, analyzed while it is still uploading"""
+    upload_type = mimetype(request)
+    options = parser.stream_options(upload_type, query(request))
+    frames = streaming.frames_from_upload(
+        blocking_chunks(request.content, asyncio.get_running_loop()), upload_type, pa.FFMPEG_PATH,
+        pa.STREAM_MAX_FRAME_BYTES
+    )
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    try:
+        results = iterate_in_thread(service.analyze_stream(frames, session, **options))
+        async with aclosing(results):
+            async for result in results:
+                await response.write(encoding.dumps_json(result) + b'\n')
+    except ConnectionResetError:
+        # The client went away; nobody is left to tell
+        raise
+    except Exception as e:
+        # Headers are long gone; report the failure as the last line
+        await response.write(encoding.dumps_json({'error': str(e)}) + b'\n')
+    await response.write_eof()
+    return response
+
+
+# API Endpoints
+@routes.get('/health')
+async def health(request):
+    """Health check endpoint"""
+    return json_response({
+        'status': 'healthy',
+        'service': 'player-analytics',
+        'detector': service.detector.stats(),
+        'detection_cache': service.detection_cache.stats(),
+        'jobs': service.jobs.stats(),
+        'frame_socket': pa.frame_server.stats() if pa.frame_server is not None else None
+    })
+
+
+@routes.get('/ready')
+async def ready(request):
+    """Readiness probe; 503 until the detector is loaded and once the worker starts draining"""
+    readiness = await asyncio.get_running_loop().run_in_executor(None, service.readiness)
+    return json_response(readiness, 200 if readiness['ready'] else 503)
+
+
+@routes.post('/api/analyze-frame')
+async def analyze_frame(request):
+    """Analyze a single frame for player tracking"""
+    try:
+        form, files = await read_form(request)
+        result = await service.analyze_frame_async(
+            parser.frame(files.getlist('image')),
+            camera_id=form.get('camera_id'),
+            detection_filter=parser.detection_filter(CombinedMultiDict([query(request), form]))
+        )
+        return await analysis_response(request, result)
+    except RequestError as e:
+        return json_response(e.body, e.status)
+    except UploadTooLarge as e:
+        return error(str(e), 413)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.post('/api/analyze-frames')
+async def analyze_frames(request):
+    """Analyze a batch of frames in one request"""
+    try:
+        form, files = await read_form(request)
+        result = await service.analyze_frames_async(
+            parser.batch(files.getlist('images')),
+            camera_id=form.get('camera_id'),
+            detection_filter=parser.detection_filter(CombinedMultiDict([query(request), form]))
+        )
+        return await analysis_response(request, result)
+    except RequestError as e:
+        return json_response(e.body, e.status)
+    except UploadTooLarge as e:
+        return error(str(e), 413)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.post('/api/analyze-video')
+async def analyze_video(request):
+    """Stream a video upload (MJPEG, or any container ffmpeg can read) through a one-off session"""
+    try:
+        return await stream_response(request, parser.one_off_session(query(request)))
+    except RequestError as e:
+        return json_response(e.body, e.status)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.post('/api/calibrations/{camera_id}')
+async def calibrate_camera(request):
+    """Calibrate a camera from pitch landmarks"""
+    try:
+        points, length, width = parser.calibration(await json_body(request))
+        calibration = await asyncio.get_running_loop().run_in_executor(
+            None, service.calibrate_camera, request.match_info['camera_id'], points, length, width
+        )
+        return json_response(calibration.to_dict(), 201)
+    except (ValueError, KeyError, TypeError) as e:
+        return error(f'Invalid calibration: {e}', 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.get('/api/calibrations/{camera_id}')
+async def get_calibration(request):
+    """Get a cached camera calibration"""
+    calibration = service.calibrations.get(request.match_info['camera_id'])
+    if calibration is None:
+        return error('Calibration not found', 404)
+    return json_response(calibration.to_dict())
+
+
+@routes.delete('/api/calibrations/{camera_id}')
+async def delete_calibration(request):
+    """Remove a camera calibration"""
+    calibration = await asyncio.get_running_loop().run_in_executor(
+        None, service.calibrations.remove, request.match_info['camera_id']
+    )
+    if calibration is None:
+        return error('Calibration not found', 404)
+    return json_response(calibration.to_dict())
+
+
+@routes.post('/api/sessions')
+async def create_session(request):
+    """Start a match session with persistent player tracking"""
+    try:
+        data = await json_body(request)
+        session = service.sessions.create(data.get('session_id'), **parser.session_options(data))
+        return json_response(session.summary(), 201)
+    except RequestError as e:
+        return json_response(e.body, e.status)
+    except ValueError as e:
+        return error(str(e), 409)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.get('/api/sessions/{session_id}')
+async def get_session(request):
+    """Get match session state"""
+    try:
+        return json_response(service.sessions.get(request.match_info['session_id']).summary())
+    except SessionNotFound:
+        return error('Session not found', 404)
+
+
+@routes.delete('/api/sessions/{session_id}')
+async def end_session(request):
+    """End a match session and release its state"""
+    try:
+        return json_response(service.sessions.remove(request.match_info['session_id']).summary())
+    except SessionNotFound:
+        return error('Session not found', 404)
+
+
+@routes.post('/api/sessions/{session_id}/analyze-frame')
+async def analyze_session_frame(request):
+    """Analyze the next frame of a match session"""
+    session_id = request.match_info['session_id']
+    try:
+        session = service.sessions.get(session_id)
+        form, files = await read_form(request)
+        result = await service.analyze_frame_async(
+            parser.frame(files.getlist('image')), session=session, timestamp=form.get('timestamp', type=float),
+            detection_filter=parser.detection_filter(CombinedMultiDict([query(request), form]))
+        )
+        result['session_id'] = session_id
+        return await analysis_response(request, result)
+    except SessionNotFound:
+        return error('Session not found', 404)
+    except RequestError as e:
+        return json_response(e.body, e.status)
+    except UploadTooLarge as e:
+        return error(str(e), 413)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.post('/api/sessions/{session_id}/analyze-frames')
+async def analyze_session_frames(request):
+    """Analyze the next batch of frames of a match session, in order"""
+    session_id = request.match_info['session_id']
+    try:
+        session = service.sessions.get(session_id)
+        form, files = await read_form(request)
+        frames = parser.batch(files.getlist('images'))
+        result = await service.analyze_frames_async(
+            frames, session=session, timestamps=parser.timestamps(form.getlist('timestamps'), len(frames)),
+            detection_filter=parser.detection_filter(CombinedMultiDict([query(request), form]))
+        )
+        result['session_id'] = session_id
+        return await analysis_response(request, result)
+    except SessionNotFound:
+        return error('Session not found', 404)
+    except RequestError as e:
+        return json_response(e.body, e.status)
+    except UploadTooLarge as e:
+        return error(str(e), 413)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.post('/api/sessions/{session_id}/stream')
+async def stream_session_video(request):
+    """Stream the next stretch of a match session's video, one NDJSON result per sampled frame"""
+    try:
+        return await stream_response(request, service.sessions.get(request.match_info['session_id']))
+    except SessionNotFound:
+        return error('Session not found', 404)
+    except RequestError as e:
+        return json_response(e.body, e.status)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.get('/api/sessions/{session_id}/live')
+async def live_session(request):
+    """Server-Sent Events feed of a session's analytics: a keyframe, then deltas as its frames are processed"""
+    try:
+        subscription = service.sessions.get(request.match_info['session_id']).live.subscribe()
+    except SessionNotFound:
+        return error('Session not found', 404)
+
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                           'X-Accel-Buffering': 'no'})
+    try:
+        await response.prepare(request)
+        await response.write(b'retry: 2000\n\n')
+        while not subscription.closed:
+            events = await subscription.get_async(pa.LIVE_HEARTBEAT)
+            await response.write(b''.join(events) if events else b': keepalive\n\n')
+        await response.write_eof()
+    except ConnectionResetError:
+        # The viewer went away
+        pass
+    finally:
+        subscription.close()
+    return response
+
+
+@routes.get('/api/sessions/{session_id}/heatmaps')
+async def get_session_heatmaps(request):
+    """Whole-match occupancy heatmaps per player and team (npz or downsampled JSON)"""
+    session_id = request.match_info['session_id']
+    try:
+        session = service.sessions.get(session_id)
+        npz, result = await asyncio.get_running_loop().run_in_executor(None, parser.heatmaps, session, query(request))
+        if npz is not None:
+            return web.Response(body=npz, content_type='application/octet-stream',
+                                headers={'Content-Disposition': f'attachment; filename={heatmap_filename(session_id)}'})
+        return json_response(result)
+    except SessionNotFound:
+        return error('Session not found', 404)
+    except KeyError as e:
+        return error(f'Unknown heatmap: {e.args[0]}', 404)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.post('/api/sessions/{session_id}/finalize')
+async def finalize_session(request):
+    """Produce per-player speed, distance and sprint data for analyze-performance"""
+    try:
+        session = service.sessions.get(request.match_info['session_id'])
+        data = await json_body(request)
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, service.finalize_session, session, data.get('positions', {}), parser.min_tracked_seconds(data)
+        )
+        return json_response(result)
+    except SessionNotFound:
+        return error('Session not found', 404)
+    except RequestError as e:
+        return json_response(e.body, e.status)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.post('/api/jobs')
+async def create_job(request):
+    """Queue a video upload for background analysis; poll the job, then download its NDJSON results"""
+    try:
+        upload_type = mimetype(request)
+        args = query(request)
+        options = parser.stream_options(upload_type, args)
+        max_bytes, max_frames, max_seconds = parser.job_limits(args, request.content_length)
+        session_id = args.get('session_id')
+        session = service.sessions.get(session_id) if session_id else parser.one_off_session(args)
+
+        job = service.jobs.create(upload_type, args.to_dict(), max_frames=max_frames, max_seconds=max_seconds)
+        try:
+            await in_thread(job.spool, blocking_chunks(request.content, asyncio.get_running_loop()), max_bytes)
+        except Exception:
+            service.jobs.discard(job)
+            raise
+        job.context.update(session=session, **options)
+        service.jobs.submit(job)
+        return json_response(job.to_dict(), 202)
+    except RequestError as e:
+        return json_response(e.body, e.status)
+    except QueueFull as e:
+        return json_response({'error': str(e)}, 503, {'Retry-After': '30'})
+    except JobLimitExceeded as e:
+        return error(str(e), 413)
+    except SessionNotFound:
+        return error('Session not found', 404)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.get('/api/jobs/{job_id}')
+async def get_job(request):
+    """Job state and progress"""
+    try:
+        return json_response(service.jobs.get(request.match_info['job_id']).to_dict())
+    except JobNotFound:
+        return error('Job not found', 404)
+
+
+@routes.get('/api/jobs/{job_id}/result')
+async def get_job_result(request):
+    """Per-frame NDJSON results of a finished job (partial for failed or cancelled ones)"""
+    job_id = request.match_info['job_id']
+    try:
+        return web.FileResponse(job_result_path(service.jobs.get(job_id)), headers={
+            'Content-Type': 'application/x-ndjson',
+            'Content-Disposition': f'attachment; filename={job_id}.ndjson'
+        })
+    except RequestError as e:
+        return json_response(e.body, e.status)
+    except JobNotFound:
+        return error('Job not found', 404)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.delete('/api/jobs/{job_id}')
+async def cancel_job(request):
+    """Cancel a queued or running job, or delete a finished one and its results"""
+    try:
+        job = await asyncio.get_running_loop().run_in_executor(None, service.jobs.cancel, request.match_info['job_id'])
+        return json_response(job.to_dict())
+    except JobNotFound:
+        return error('Job not found', 404)
+
+
+@routes.post('/api/analyze-performance')
+async def analyze_performance(request):
+    """Analyze player performance against pro benchmarks"""
+    try:
+        data = await request.json()
+        result = service.analyze_performance(data.get('player_data', {}), data.get('position', 'midfielder'))
+        return json_response(result)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.post('/api/predict-result')
+async def predict_result(request):
+    """Predict match result based on team statistics"""
+    try:
+        data = await request.json()
+        result = service.predict_match_result(data.get('team_stats', {}), data.get('opponent_stats', {}))
+        return json_response(result)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@routes.get('/api/pro-benchmarks')
+async def get_pro_benchmarks(request):
+    """Get professional player benchmarks"""
+    return json_response(service.professional_benchmarks)
+
+
+@web.middleware
+async def cors(request, handler):
+    """Answer preflight requests for any origin, as flask_cors does for the Flask app"""
+    if request.method != 'OPTIONS':
+        return await handler(request)
+    response = web.Response()
+    response.headers['Access-Control-Allow-Methods'] = 'GET, HEAD, POST, OPTIONS, PUT, PATCH, DELETE'
+    requested = request.headers.get('Access-Control-Request-Headers')
+    if requested:
+        response.headers['Access-Control-Allow-Headers'] = requested
+    return response
+
+
+async def allow_origin(request: web.Request, response: web.StreamResponse):
+    # Set on prepare rather than in the middleware, so streamed responses have it before their headers go out
+    response.headers['Access-Control-Allow-Origin'] = '*'
+
+
+async def on_startup(app: web.Application):
+    # Frame-socket requests share this loop with the HTTP handlers
+    if pa.frame_server is not None:
+        await pa.frame_server.start()
+
+
+async def on_shutdown(app: web.Application):
+    service.shutdown()
+    if pa.frame_server is not None:
+        await pa.frame_server.close()
+
+
+async def on_cleanup(app: web.Application):
+    await service.detector.aclose()
+
+
+def create_app() -> web.Application:
+    # Streams and job uploads are read incrementally; this only bounds buffered (urlencoded and JSON) bodies
+    application = web.Application(middlewares=[cors], client_max_size=pa.MAX_UPLOAD_BYTES)
+    application.add_routes(routes)
+    application.on_response_prepare.append(allow_origin)
+    application.on_startup.append(on_startup)
+    application.on_shutdown.append(on_shutdown)
+    application.on_cleanup.append(on_cleanup)
+    return application
+
+
+app = create_app()
+
+if __name__ == '__main__':
+    port = int(os.getenv('ANALYTICS_PORT', 5001))
+    print(f"Starting Player Analytics Service (asyncio) on port {port}")
+    web.run_app(app, host='0.0.0.0', port=port)
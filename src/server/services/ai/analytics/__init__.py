@@ -0,0 +1,3 @@
+"""
+Analytics pipeline components used by the Player Analytics Service
+"""
@@ -0,0 +1,223 @@
+"""
+Request parsing shared by the Flask and asyncio apps
+
+player-analytics.py and aio.py serve the same endpoints with the same
+requests and responses. Everything that doesn't depend on the web
+framework lives here. That covers reading session, stream, job and
+heatmap options out of a JSON body or a query string, checking them, and
+building the response documents. Both apps pass query strings and forms
+in as werkzeug MultiDicts. A failed check raises RequestError, which
+carries the status and JSON body to answer with, and each app turns it
+into a response in its own way.
+"""
+
+import os
+import math
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from werkzeug.datastructures import MultiDict
+
+from analytics import streaming
+from analytics.sessions import MatchSession
+from analytics.homography import PITCH_LENGTH, PITCH_WIDTH
+from analytics.heatmaps import parse_resolution
+from analytics.teams import parse_color
+from analytics.postprocess import DetectionFilter
+from analytics.jobs import Job, FINISHED
+from analytics.live import DEFAULT_KEYFRAME_INTERVAL
+
+
+class RequestError(Exception):
+    """A request the API turns away; status and body are the response to send"""
+
+    def __init__(self, message: str, status: int = 400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {'error': message, **extra}
+
+
+def number(value: Any, name: str, kind: type = float, minimum: Optional[float] = None,
+           positive: bool = False) -> Any:
+    """value as a finite int or float; RequestError (400) naming the field when it isn't one or is out of range"""
+    try:
+        parsed = kind(value)
+    except (TypeError, ValueError):
+        raise RequestError(f"{name} must be {'an integer' if kind is int else 'a number'}")
+    if not math.isfinite(parsed):
+        raise RequestError(f'{name} must be finite')
+    if positive and parsed <= 0:
+        raise RequestError(f'{name} must be positive')
+    if minimum is not None and parsed < minimum:
+        raise RequestError(f'{name} must be at least {minimum}')
+    return parsed
+
+
+def job_limit(requested: Optional[float], ceiling: float) -> float:
+    """A job's own limit, never looser than the server's (0 is unlimited for both)"""
+    if not requested or requested < 0:
+        return ceiling
+    return min(requested, ceiling) if ceiling else requested
+
+
+def heatmap_filename(session_id: str) -> str:
+    return f'{session_id}-heatmaps.npz'
+
+
+def job_result_path(job: Job) -> str:
+    """The NDJSON results of a finished job; 409 while it runs, 404 if it wrote none"""
+    if job.state not in FINISHED:
+        raise RequestError(f"Job is {job.state}", 409, state=job.state)
+    if not os.path.exists(job.result_path):
+        raise RequestError('Job produced no results', 404, state=job.state)
+    return job.result_path
+
+
+class RequestParser:
+    """Options and limits for the API's requests, with the server's configured defaults"""
+
+    def __init__(self, default_filter: DetectionFilter, heatmap_resolution: Tuple[int, int],
+                 formation_window: int = 25, motion_threshold: float = 0.005, max_gap: int = 5,
+                 live_keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL, max_batch_frames: int = 64,
+                 ffmpeg_path: Optional[str] = None, job_max_bytes: int = 0, job_max_frames: int = 0,
+                 job_max_seconds: float = 0.0):
+        self.default_filter = default_filter
+        self.heatmap_resolution = heatmap_resolution
+        self.formation_window = formation_window
+        self.motion_threshold = motion_threshold
+        self.max_gap = max_gap
+        self.live_keyframe_interval = live_keyframe_interval
+        self.max_batch_frames = max_batch_frames
+        self.ffmpeg_path = ffmpeg_path
+        self.job_max_bytes = job_max_bytes
+        self.job_max_frames = job_max_frames
+        self.job_max_seconds = job_max_seconds
+
+    def detection_filter(self, values: MultiDict) -> Optional[DetectionFilter]:
+        """Optional confidence/overlap (0-100) and comma-separated classes from a form or query"""
+        confidence = values.get('confidence', type=float)
+        overlap = values.get('overlap', type=float)
+        classes = values.get('classes')
+        if confidence is None and overlap is None and not classes:
+            return None
+        default = self.default_filter
+        return DetectionFilter(
+            confidence if confidence is not None else default.confidence,
+            overlap if overlap is not None else default.overlap,
+            classes.split(',') if classes else default.classes
+        )
+
+    def frame(self, frames: Sequence) -> Any:
+        """The frame of an analyze-frame request"""
+        if not frames:
+            raise RequestError('No image provided')
+        return frames[0]
+
+    def batch(self, frames: Sequence) -> Sequence:
+        """The frames of an analyze-frames request, within max_batch_frames"""
+        if not frames:
+            raise RequestError('No images provided')
+        if len(frames) > self.max_batch_frames:
+            raise RequestError(f'Too many images (max {self.max_batch_frames})')
+        return frames
+
+    def timestamps(self, values: Optional[Sequence], count: int) -> Optional[List[float]]:
+        """Per-frame timestamps, one for each of count frames, or None when none were given"""
+        timestamps = [float(t) for t in values or ()] or None
+        if timestamps and len(timestamps) != count:
+            raise RequestError('timestamps must match images')
+        return timestamps
+
+    def session_options(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """SessionRegistry.create() arguments from a create-session body"""
+        try:
+            heatmap_resolution = parse_resolution(data.get('heatmap_resolution'), self.heatmap_resolution)
+        except ValueError:
+            raise RequestError('heatmap_resolution must look like 48x32')
+        team_colors = data.get('team_colors')
+        try:
+            if team_colors:
+                for team in ('home', 'away'):
+                    parse_color(team_colors[team])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise RequestError('team_colors must give home and away as #rrggbb')
+        metres_per_pixel = data.get('metres_per_pixel')
+        if metres_per_pixel:
+            metres_per_pixel = number(metres_per_pixel, 'metres_per_pixel', positive=True)
+        return {
+            'fps': number(data.get('fps', 25.0), 'fps', positive=True),
+            'camera_id': data.get('camera_id'),
+            'metres_per_pixel': metres_per_pixel or None,
+            'heatmap_resolution': heatmap_resolution,
+            'formation_window': number(data.get('formation_window', self.formation_window), 'formation_window', int, 1),
+            'team_colors': team_colors,
+            'motion_threshold': number(data.get('motion_threshold', self.motion_threshold), 'motion_threshold'),
+            'max_gap': number(data.get('max_gap', self.max_gap), 'max_gap', int, 1),
+            'live_keyframe_interval': number(
+                data.get('live_keyframe_interval', self.live_keyframe_interval), 'live_keyframe_interval', int, 1
+            )
+        }
+
+    def one_off_session(self, args: MultiDict) -> MatchSession:
+        """Throwaway session for a single video, configured from the query string"""
+        return MatchSession(
+            uuid.uuid4().hex,
+            fps=number(args.get('fps', 25.0), 'fps', positive=True),
+            camera_id=args.get('camera_id'),
+            heatmap_resolution=self.heatmap_resolution,
+            formation_window=self.formation_window,
+            motion_threshold=number(args.get('motion_threshold', self.motion_threshold), 'motion_threshold'),
+            max_gap=number(args.get('max_gap', self.max_gap), 'max_gap', int, 1)
+        )
+
+    def stream_options(self, mimetype: str, args: MultiDict) -> Dict[str, Any]:
+        """analyze_stream() arguments for a video upload of this type; 415 when it can't be decoded"""
+        if not streaming.supported(mimetype, self.ffmpeg_path):
+            raise RequestError(f"Unsupported stream type: {mimetype or 'none'}", 415)
+        every = args.get('every', 1, type=int)
+        if every < 1:
+            raise RequestError('every must be at least 1')
+        fps = args.get('fps')
+        return {
+            'fps': number(fps, 'fps', positive=True) if fps is not None else None,
+            'every': every,
+            'detection_filter': self.detection_filter(args)
+        }
+
+    def job_limits(self, args: MultiDict, content_length: Optional[int]) -> Tuple[int, int, float]:
+        """A job's (max_bytes, max_frames, max_seconds); 413 when the declared upload is already too big"""
+        max_bytes = int(job_limit(args.get('max_bytes', type=int), self.job_max_bytes))
+        if max_bytes and content_length and content_length > max_bytes:
+            raise RequestError(f"Upload exceeds the {max_bytes} byte job limit", 413)
+        return (
+            max_bytes,
+            int(job_limit(args.get('max_frames', type=int), self.job_max_frames)),
+            job_limit(args.get('max_seconds', type=float), self.job_max_seconds)
+        )
+
+    def calibration(self, data: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], float, float]:
+        """(points, pitch length, pitch width) from a calibration body"""
+        return (data.get('points', []), float(data.get('pitch_length', PITCH_LENGTH)),
+                float(data.get('pitch_width', PITCH_WIDTH)))
+
+    def min_tracked_seconds(self, data: Dict[str, Any]) -> float:
+        min_tracked_seconds = float(data.get('min_tracked_seconds', 5.0))
+        if not min_tracked_seconds > 0:
+            raise RequestError('min_tracked_seconds must be positive')
+        return min_tracked_seconds
+
+    def heatmaps(self, session: MatchSession, args: MultiDict) -> Tuple[Optional[bytes], Optional[Dict[str, Any]]]:
+        """npz bytes or the JSON document of a session's heatmaps, selected by the query string"""
+        players = args.get('players')
+        teams = args.get('teams')
+        resolution = args.get('resolution')
+        with session.lock:
+            grids = session.heatmaps.grids(
+                players=[int(p.replace('player_', '')) for p in players.split(',')] if players else None,
+                teams=teams.split(',') if teams else None
+            )
+            if args.get('format', 'json') == 'npz':
+                return session.heatmaps.to_npz(grids), None
+            result = session.heatmaps.to_json(grids, parse_resolution(resolution) if resolution else None)
+        result['session_id'] = session.session_id
+        return None, result
@@ -0,0 +1,91 @@
+"""
+Vectorized tactical metrics over batches of frames
+
+Columnar detections for a batch are stacked into an N×P×2 array (N frames,
+P player slots) padded with NaN, so every metric runs as a single NumPy
+pass instead of a Python loop per frame. With a pitch calibration the whole
+array goes through one homography product and metrics run in metres.
+"""
+
+from typing import Dict, List, Tuple, Optional
+import numpy as np
+
+from analytics import compactness, formations
+from analytics.compactness import COMPACTNESS_MAX_DISTANCE, TEAMS
+from analytics.homography import PitchCalibration
+from analytics.detections import FrameDetections, stack_positions
+
+GRID_SIZE = 20
+
+
+def field_coverage(positions: np.ndarray, frame_sizes: np.ndarray, grid_size: int = GRID_SIZE) -> np.ndarray:
+    """Fraction of grid cells occupied by at least one player, per frame"""
+    n_frames, n_slots = positions.shape[:2]
+    if n_frames == 0 or n_slots == 0:
+        return np.zeros(n_frames)
+
+    valid = ~np.isnan(positions[..., 0])
+    scaled = positions / frame_sizes[:, None, :] * grid_size
+    # Truncate toward zero to match int() on scalar positions
+    cells = np.trunc(np.nan_to_num(scaled, nan=-1.0)).astype(np.int64)
+    grid_x, grid_y = cells[..., 0], cells[..., 1]
+    inside = valid & (grid_x >= 0) & (grid_x < grid_size) & (grid_y >= 0) & (grid_y < grid_size)
+
+    occupied = np.zeros((n_frames, grid_size * grid_size), dtype=bool)
+    frame_idx = np.broadcast_to(np.arange(n_frames)[:, None], inside.shape)
+    occupied[frame_idx[inside], (grid_y * grid_size + grid_x)[inside]] = True
+
+    return occupied.sum(axis=1) / float(grid_size * grid_size)
+
+
+def to_pitch_space(frames: List[FrameDetections], positions: np.ndarray,
+                   calibration: PitchCalibration) -> np.ndarray:
+    """Transform a stacked batch into pitch metres and store each frame's pitch column"""
+    pitch = calibration.to_pitch(positions)
+    for i, frame in enumerate(frames):
+        frame.pitch = pitch[i, :len(frame)]
+    return pitch
+
+
+def analyze_batch(frames: List[FrameDetections], frame_sizes: List[Tuple[int, int]],
+                  calibration: Optional[PitchCalibration] = None,
+                  smoothers: Optional[Dict[str, formations.FormationSmoother]] = None) -> List[Dict]:
+    """Compute per-frame tactical analytics for a batch of frames in one pass"""
+    if not frames:
+        return []
+
+    positions, teams = stack_positions(frames)
+    team_masks = {team: teams == code for code, team in enumerate(TEAMS)}
+
+    if calibration is not None:
+        # Real units: the pitch replaces the frame and depth runs along its length
+        positions = to_pitch_space(frames, positions, calibration)
+        sizes = np.tile(calibration.frame_size, (len(frames), 1))
+        max_distance, depth_axis, area_unit, units = calibration.length, 0, 100.0, 'metres'
+    else:
+        sizes = np.asarray(frame_sizes, dtype=float).reshape(-1, 2)
+        max_distance, depth_axis, area_unit, units = COMPACTNESS_MAX_DISTANCE, 1, 10000.0, 'pixels'
+
+    coverage = field_coverage(positions, sizes)
+    team_shape = compactness.analyze(positions, team_masks, max_distance, depth_axis)
+    team_slots = {team: compactness.team_slots(positions, mask) for team, mask in team_masks.items()}
+    team_formations = formations.analyze(team_slots, depth_axis, smoothers)
+
+    detected = np.array([len(frame) for frame in frames], dtype=float)
+    density = detected / (sizes[:, 0] * sizes[:, 1]) * area_unit
+
+    analytics = []
+    for i, frame in enumerate(frames):
+        if len(frame) == 0:
+            analytics.append({'error': 'No players detected'})
+            continue
+        analytics.append({
+            'field_coverage': float(coverage[i]),
+            'formation': team_formations[i]['home'],
+            'formations': team_formations[i],
+            'team_compactness': team_shape[i]['home']['score'],
+            'compactness': team_shape[i],
+            'player_density': float(density[i]),
+            'units': units
+        })
+    return analytics
@@ -0,0 +1,155 @@
+"""
+Vectorized team compactness
+
+Every metric works on a whole batch at once. Each team's players are first
+gathered into their own N×K×2 slot array (K = largest squad seen in the
+batch), so pairwise work is K² rather than P² over all detections. Variants:
+
+- mean pairwise distance (the 0-1 compactness score is derived from it)
+- convex hull area: gift wrapping run for all frames in lockstep (at most
+  K steps of (N, K) array work), with the shoelace sum taken along the way
+- width / depth spread (extent across and along the pitch)
+- mean distance to the team centroid, and centroid separation between teams
+"""
+
+from typing import Dict, List, Any, Tuple
+import numpy as np
+
+COMPACTNESS_MAX_DISTANCE = 1000.0
+TEAMS = ('home', 'away')
+
+
+def team_slots(positions: np.ndarray, team_mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Gather the masked players of each frame into (N, K, 2) NaN-padded slots"""
+    n_frames = team_mask.shape[0]
+    k = int(team_mask.sum(axis=1).max()) if team_mask.size else 0
+    # Stable sort puts each frame's team members first, in detection order
+    order = np.argsort(~team_mask, axis=1, kind='stable')[:, :k]
+    valid = np.take_along_axis(team_mask, order, axis=1)
+    pts = np.take_along_axis(positions, order[..., None], axis=1)
+    pts = np.where(valid[..., None], pts, np.nan)
+    return pts.reshape(n_frames, k, 2), valid
+
+
+def mean_pairwise_distance(pts: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Mean distance over all player pairs, per frame (0 with fewer than 2 players)"""
+    n_frames, k = valid.shape
+    if k < 2:
+        return np.zeros(n_frames)
+    filled = np.where(valid[..., None], pts, 0.0)
+    diff = filled[:, :, None, :] - filled[:, None, :, :]
+    dist = np.sqrt(np.sum(diff * diff, axis=-1))
+
+    pair_mask = valid[:, :, None] & valid[:, None, :]
+    pair_mask &= np.triu(np.ones((k, k), dtype=bool), k=1)
+    pair_count = pair_mask.sum(axis=(1, 2))
+    total = np.where(pair_mask, dist, 0.0).sum(axis=(1, 2))
+    return np.divide(total, pair_count, out=np.zeros(n_frames), where=pair_count > 0)
+
+
+def convex_hull_area(pts: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Area enclosed by each frame's players (0 with fewer than 3 distinct points)"""
+    n_frames, k = valid.shape
+    area = np.zeros(n_frames)
+    if k < 3:
+        return area
+    x = np.where(valid, pts[..., 0], 0.0)
+    y = np.where(valid, pts[..., 1], 0.0)
+    rows = np.arange(n_frames)
+
+    # Gift wrapping from the lowest leftmost player, all frames in lockstep
+    start = np.lexsort((np.where(valid, y, np.inf), np.where(valid, x, np.inf)), axis=1)[:, 0]
+    current = start.copy()
+    heading = np.full(n_frames, -np.pi / 2)
+    active = valid.sum(axis=1) >= 3
+
+    for _ in range(k):
+        if not active.any():
+            break
+        dx = x - x[rows, current][:, None]
+        dy = y - y[rows, current][:, None]
+        dist = np.hypot(dx, dy)
+        # Smallest counter-clockwise turn wins; on a tie take the farthest point
+        turn = np.mod(np.arctan2(dy, dx) - heading[:, None], 2 * np.pi)
+        turn = np.where(valid & (dist > 0), turn, np.inf)
+        best = turn.min(axis=1)
+        nxt = np.argmax(np.where(turn <= best[:, None] + 1e-12, dist, -1.0), axis=1)
+
+        active &= np.isfinite(best)
+        cx, cy, nx, ny = x[rows, current], y[rows, current], x[rows, nxt], y[rows, nxt]
+        area += np.where(active, cx * ny - cy * nx, 0.0)
+        heading = np.where(active, np.arctan2(ny - cy, nx - cx), heading)
+        active &= nxt != start
+        current = np.where(active, nxt, current)
+
+    return np.abs(area) / 2
+
+
+def spread(pts: np.ndarray, valid: np.ndarray, depth_axis: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Width (across) and depth (along depth_axis) extent of the team, per frame"""
+    n_frames = valid.shape[0]
+    if valid.shape[1] == 0:
+        return np.zeros(n_frames), np.zeros(n_frames)
+    lo = np.min(np.where(valid[..., None], pts, np.inf), axis=1)
+    hi = np.max(np.where(valid[..., None], pts, -np.inf), axis=1)
+    extent = np.where(valid.any(axis=1)[:, None], hi - lo, 0.0)
+    return extent[:, 1 - depth_axis], extent[:, depth_axis]
+
+
+def centroids(pts: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Team centroid (N, 2) and mean player distance to it (N,)"""
+    count = valid.sum(axis=1)
+    filled = np.where(valid[..., None], pts, 0.0)
+    centroid = np.divide(filled.sum(axis=1), count[:, None],
+                         out=np.full((len(count), 2), np.nan), where=count[:, None] > 0)
+    offset = np.linalg.norm(filled - np.nan_to_num(centroid)[:, None, :], axis=-1)
+    mean_offset = np.divide(np.where(valid, offset, 0.0).sum(axis=1), count,
+                            out=np.zeros(len(count)), where=count > 0)
+    return centroid, mean_offset
+
+
+def analyze(positions: np.ndarray, team_masks: Dict[str, np.ndarray],
+            max_distance: float = COMPACTNESS_MAX_DISTANCE, depth_axis: int = 1) -> List[Dict[str, Any]]:
+    """All compactness variants for every team, per frame"""
+    n_frames = positions.shape[0]
+    per_team = {}
+    team_centroids = {}
+    for team, mask in team_masks.items():
+        pts, valid = team_slots(positions, mask)
+        count = valid.sum(axis=1)
+        mean_distance = mean_pairwise_distance(pts, valid)
+        width, depth = spread(pts, valid, depth_axis)
+        centroid, centroid_distance = centroids(pts, valid)
+        team_centroids[team] = centroid
+        per_team[team] = {
+            'players': count,
+            'score': np.where(count >= 2, np.maximum(0.0, 1.0 - mean_distance / max_distance), 0.0),
+            'mean_pairwise_distance': mean_distance,
+            'hull_area': convex_hull_area(pts, valid),
+            'width': width,
+            'depth': depth,
+            'centroid_distance': centroid_distance,
+        }
+
+    separation = None
+    if len(team_centroids) == 2:
+        first, second = team_centroids.values()
+        separation = np.linalg.norm(first - second, axis=1)
+
+    # Convert once to Python lists; per-element NumPy scalar access dominates otherwise
+    columns = {team: {name: values.tolist() for name, values in metrics.items()}
+               for team, metrics in per_team.items()}
+    centroid_lists = {team: [None if np.isnan(c).any() else c for c in centroid.tolist()]
+                      for team, centroid in team_centroids.items()}
+    separation = separation.tolist() if separation is not None else None
+
+    results = []
+    for i in range(n_frames):
+        frame = {}
+        for team, metrics in columns.items():
+            frame[team] = {name: values[i] for name, values in metrics.items()}
+            frame[team]['centroid'] = centroid_lists[team][i]
+        if separation is not None:
+            frame['separation'] = None if np.isnan(separation[i]) else separation[i]
+        results.append(frame)
+    return results
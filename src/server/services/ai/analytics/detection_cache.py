@@ -0,0 +1,205 @@
+"""
+Content-addressed cache for detector responses
+
+Entries are keyed by a SHA-256 of the frame bytes plus the detection
+parameters. The in-memory tier is a bounded LRU with TTL; an optional
+on-disk tier survives restarts and is shared between workers. In
+near-duplicate mode a 64-bit difference hash of each frame is kept so
+static-camera frames with almost no motion can reuse a recent result.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from analytics.uploads import buffer_file
+
+PHASH_SIZE = 8
+
+
+def make_key(frame_bytes: bytes, model: str, **params) -> str:
+    """Hash frame content together with the model and detection parameters"""
+    digest = hashlib.sha256()
+    digest.update(model.encode())
+    for name in sorted(params):
+        digest.update(f"|{name}={params[name]}".encode())
+    digest.update(b'|')
+    digest.update(frame_bytes)
+    return digest.hexdigest()
+
+
+def perceptual_hash(frame_bytes: bytes) -> int:
+    """64-bit difference hash of a frame, decoded at reduced scale where possible"""
+    image = Image.open(buffer_file(frame_bytes))
+    # JPEG draft mode decodes straight to a fraction of full resolution
+    image.draft('L', (PHASH_SIZE * 8, PHASH_SIZE * 8))
+    small = np.asarray(image.convert('L').resize((PHASH_SIZE + 1, PHASH_SIZE), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+class DetectionCache:
+    """Bounded LRU + TTL cache with an optional disk tier and near-duplicate lookup"""
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600.0,
+                 disk_dir: Optional[str] = None, phash_distance: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.phash_distance = phash_distance
+
+        self._entries: 'OrderedDict[str, Tuple[Any, float, Optional[int]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._phash_index: Optional[Tuple[list, np.ndarray]] = None
+        self._counters = {
+            'hits': 0,
+            'disk_hits': 0,
+            'near_duplicate_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str, frame_bytes: Optional[bytes] = None) -> Optional[Any]:
+        """Look up a cached response, falling back to disk and near-duplicates"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, _ = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return value
+                self._drop(key)
+                self._counters['expirations'] += 1
+
+        value = self._disk_get(key)
+        if value is not None:
+            self._store(key, value, None)
+            self._count('disk_hits')
+            return value
+
+        if self.phash_distance is not None and frame_bytes is not None:
+            value = self._near_duplicate(frame_bytes, now)
+            if value is not None:
+                self._count('near_duplicate_hits')
+                return value
+
+        self._count('misses')
+        return None
+
+    def put(self, key: str, value: Any, frame_bytes: Optional[bytes] = None):
+        """Store a response in memory (and on disk when configured)"""
+        phash = None
+        if self.phash_distance is not None and frame_bytes is not None:
+            try:
+                phash = perceptual_hash(frame_bytes)
+            except Exception:
+                phash = None
+        self._store(key, value, phash)
+        self._disk_put(key, value)
+
+    def _store(self, key: str, value: Any, phash: Optional[int]):
+        with self._lock:
+            if key in self._entries and phash is None:
+                phash = self._entries[key][2]
+            self._entries[key] = (value, time.monotonic() + self.ttl, phash)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._counters['evictions'] += 1
+            self._phash_index = None
+
+    def _drop(self, key: str):
+        del self._entries[key]
+        self._phash_index = None
+
+    def _near_duplicate(self, frame_bytes: bytes, now: float) -> Optional[Any]:
+        try:
+            target = np.uint64(perceptual_hash(frame_bytes))
+        except Exception:
+            return None
+
+        with self._lock:
+            if self._phash_index is None:
+                keys = [k for k, (_, _, h) in self._entries.items() if h is not None]
+                hashes = np.array([self._entries[k][2] for k in keys], dtype=np.uint64)
+                self._phash_index = (keys, hashes)
+            keys, hashes = self._phash_index
+            if not keys:
+                return None
+
+            # Vectorized Hamming distance against every indexed frame
+            distances = np.unpackbits((hashes ^ target).view(np.uint8)).reshape(-1, 64).sum(axis=1)
+            best = int(np.argmin(distances))
+            if distances[best] > self.phash_distance:
+                return None
+
+            value, expires_at, _ = self._entries[keys[best]]
+            if expires_at <= now:
+                return None
+            self._entries.move_to_end(keys[best])
+            return value
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[Any]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                self._count('expirations')
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, value: Any):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(value, f)
+            # Atomic so concurrent workers never read a partial file
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            print(f"Detection cache disk write error: {e}")
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['near_duplicate_hits'] + stats['misses']
+        stats['hit_rate'] = (lookups - stats['misses']) / lookups if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        stats['disk_tier'] = bool(self.disk_dir)
+        stats['near_duplicate_mode'] = self.phash_distance is not None
+        return stats
@@ -0,0 +1,132 @@
+"""
+Columnar detections
+
+One frame's detections are held as parallel NumPy arrays (boxes,
+confidence, class and team codes, track IDs, pitch positions) rather than
+a dict per player. Post-processing fills them straight from the packed
+detector arrays, tracking and the analytics read and write whole columns,
+and stacking frames for a batch is a slice assignment per frame. Player
+dicts are only built by to_dicts(), at the JSON boundary.
+"""
+
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+import numpy as np
+
+from analytics.compactness import TEAMS
+
+OTHER = 'other'
+# Team codes index into TEAM_LABELS; 0/1 match TEAMS
+TEAM_LABELS = TEAMS + (OTHER,)
+TEAM_CODES = {label: code for code, label in enumerate(TEAM_LABELS)}
+OTHER_CODE = TEAM_CODES[OTHER]
+
+
+class FrameDetections:
+    """Parallel per-detection arrays for one frame"""
+
+    __slots__ = ('boxes', 'confidence', 'class_ids', 'class_names', 'teams', 'track_ids', 'pitch')
+
+    def __init__(self, boxes: np.ndarray, confidence: np.ndarray, class_ids: np.ndarray,
+                 class_names: Sequence[str], teams: Optional[np.ndarray] = None):
+        # boxes are (D, 4) cx/cy/w/h in frame pixels; class_ids index into class_names
+        self.boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        self.confidence = np.asarray(confidence, dtype=float)
+        self.class_ids = np.asarray(class_ids, dtype=np.int64)
+        self.class_names = tuple(class_names)
+        if teams is None:
+            teams = self.fallback_teams()
+        self.teams = np.asarray(teams, dtype=np.int8)
+        self.track_ids: Optional[np.ndarray] = None
+        self.pitch: Optional[np.ndarray] = None
+
+    @classmethod
+    def empty(cls) -> 'FrameDetections':
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=np.int64), ())
+
+    @classmethod
+    def from_predictions(cls, predictions: List[Dict[str, Any]]) -> 'FrameDetections':
+        """Build from Roboflow-style prediction dicts"""
+        if not predictions:
+            return cls.empty()
+        names: Dict[str, int] = {}
+        class_ids = [names.setdefault(p.get('class', 'player'), len(names)) for p in predictions]
+        return cls(
+            [[p['x'], p['y'], p['width'], p['height']] for p in predictions],
+            [p['confidence'] for p in predictions],
+            class_ids,
+            tuple(names)
+        )
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """(D, 2) box centres"""
+        return self.boxes[:, :2]
+
+    @property
+    def players(self) -> np.ndarray:
+        """(D,) mask of 'player' detections, the only ones that wear a team's kit"""
+        player = self.class_names.index('player') if 'player' in self.class_names else -1
+        return self.class_ids == player
+
+    def fallback_teams(self) -> np.ndarray:
+        """Team codes before jersey colours are known: 'player' detections home, everything else away"""
+        return np.where(self.players, TEAM_CODES['home'], TEAM_CODES['away']).astype(np.int8)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Compactly typed columns for binary encodings; track/pitch columns only once they are known"""
+        columns = {
+            'x': self.boxes[:, 0].astype(np.float32),
+            'y': self.boxes[:, 1].astype(np.float32),
+            'width': self.boxes[:, 2].astype(np.float32),
+            'height': self.boxes[:, 3].astype(np.float32),
+            'confidence': self.confidence.astype(np.float32),
+            'class_id': self.class_ids.astype(np.uint8),
+            'team': self.teams
+        }
+        if self.track_ids is not None:
+            columns['track_id'] = self.track_ids.astype(np.int32)
+        if self.pitch is not None:
+            columns['pitch_x'] = self.pitch[:, 0].astype(np.float32)
+            columns['pitch_y'] = self.pitch[:, 1].astype(np.float32)
+        return columns
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Player dicts for the JSON response"""
+        # One tolist() per column; per-element NumPy scalar access dominates otherwise
+        boxes = self.boxes.tolist()
+        confidence = self.confidence.tolist()
+        classes = [self.class_names[c] for c in self.class_ids.tolist()]
+        teams = [TEAM_LABELS[t] for t in self.teams.tolist()]
+        track_ids = self.track_ids.tolist() if self.track_ids is not None else None
+        pitch = self.pitch.tolist() if self.pitch is not None else None
+
+        players = []
+        for idx, (x, y, width, height) in enumerate(boxes):
+            player = {
+                'player_id': f"player_{track_ids[idx] if track_ids is not None else idx}",
+                'position': {'x': x, 'y': y},
+                'bbox': {'x': x, 'y': y, 'width': width, 'height': height},
+                'confidence': confidence[idx],
+                'class': classes[idx],
+                'team': teams[idx]
+            }
+            if track_ids is not None:
+                player['track_id'] = track_ids[idx]
+            if pitch is not None:
+                player['pitch_position'] = {'x': pitch[idx][0], 'y': pitch[idx][1]}
+            players.append(player)
+        return players
+
+
+def stack_positions(frames: List[FrameDetections]) -> Tuple[np.ndarray, np.ndarray]:
+    """(N, P, 2) NaN-padded positions and (N, P) team codes (-1 in padding) for a batch"""
+    n_slots = max((len(frame) for frame in frames), default=0)
+    positions = np.full((len(frames), n_slots, 2), np.nan)
+    teams = np.full((len(frames), n_slots), -1, dtype=np.int8)
+    for i, frame in enumerate(frames):
+        positions[i, :len(frame)] = frame.positions
+        teams[i, :len(frame)] = frame.teams
+    return positions, teams
@@ -0,0 +1,371 @@
+"""
+Pooled, deadline-aware client for the Roboflow hosted detection API
+
+One requests.Session is shared per process so TCP/TLS connections are
+reused. Every call has an overall deadline that covers queueing, retries
+and backoff, concurrency is bounded by a semaphore, and a circuit breaker
+fails fast while the upstream is unhealthy so callers can fall back
+without waiting for a timeout.
+
+AsyncRoboflowClient applies the same rules on an asyncio event loop with
+aiohttp. There a request in flight costs a coroutine rather than a thread,
+so its concurrency limit can be far higher.
+"""
+
+import time
+import random
+import asyncio
+import threading
+from typing import Dict, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class DetectorUnavailable(Exception):
+    """Raised when a detection request cannot be served"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a half-open probe"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent upstream now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # Half-open: let exactly one probe through
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Free the half-open probe slot after a request that neither succeeded nor failed (e.g. cancelled)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'failure_threshold': self.failure_threshold,
+            'reset_timeout': self.reset_timeout
+        }
+
+
+class RoboflowClient:
+    """Roboflow detection client with pooling, deadlines, retries and a breaker"""
+
+    def __init__(self, api_key: str, model: str, version: int = 1,
+                 base_url: str = 'https://detect.roboflow.com',
+                 deadline: float = 5.0, connect_timeout: float = 2.0,
+                 max_retries: int = 2, backoff_base: float = 0.1, backoff_max: float = 1.0,
+                 max_concurrency: int = 8, breaker: Optional[CircuitBreaker] = None):
+        self.api_key = api_key
+        self.model = model
+        self.version = version
+        self.url = f"{base_url.rstrip('/')}/{model}/{version}"
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'successes': 0, 'failures': 0, 'retries': 0,
+                       'short_circuited': 0, 'saturated': 0}
+
+    def detect(self, image_base64: bytes, confidence: int = 40, overlap: int = 30) -> Dict[str, Any]:
+        """POST a base64 frame and return the raw Roboflow JSON response"""
+        self._count('requests')
+        # Fail fast without queueing for a slot while the breaker is open
+        if self.breaker.state == CircuitBreaker.OPEN:
+            self._count('short_circuited')
+            raise DetectorUnavailable('circuit breaker open')
+
+        expires_at = time.monotonic() + self.deadline
+        if not self._semaphore.acquire(timeout=self.deadline):
+            # Local saturation says nothing about upstream health
+            self._count('saturated')
+            raise DetectorUnavailable('detector concurrency limit reached')
+
+        if not self.breaker.allow_request():
+            self._semaphore.release()
+            self._count('short_circuited')
+            raise DetectorUnavailable('circuit breaker open')
+
+        try:
+            result = self._post_with_retries(image_base64, confidence, overlap, expires_at)
+        except DetectorUnavailable:
+            self.breaker.record_failure()
+            self._count('failures')
+            raise
+        except Exception as e:
+            # Anything else from the request (redirect loops, bad URLs, broken bodies) is an upstream failure too
+            self.breaker.record_failure()
+            self._count('failures')
+            raise DetectorUnavailable(f'{type(e).__name__}: {e}') from e
+        except BaseException:
+            # Interrupted, not failed: the next caller gets the half-open probe
+            self.breaker.release_probe()
+            raise
+        finally:
+            self._semaphore.release()
+
+        self.breaker.record_success()
+        self._count('successes')
+        return result
+
+    def _post_with_retries(self, image_base64: bytes, confidence: int, overlap: int,
+                           expires_at: float) -> Dict[str, Any]:
+        params = {
+            "api_key": self.api_key,
+            "confidence": confidence,
+            "overlap": overlap
+        }
+        last_error = 'deadline exceeded'
+
+        for attempt in range(self.max_retries + 1):
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                response = self.session.post(
+                    self.url,
+                    params=params,
+                    data=image_base64,
+                    headers={"Content-Type": "application/x-www-form-urlencoded"},
+                    timeout=(min(self.connect_timeout, remaining), remaining)
+                )
+                if response.status_code == 200:
+                    try:
+                        return response.json()
+                    except ValueError as e:
+                        raise DetectorUnavailable(f'malformed upstream response: {e}')
+                last_error = f'upstream returned {response.status_code}'
+                if response.status_code not in RETRYABLE_STATUS:
+                    break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = f'{type(e).__name__}: {e}'
+
+            if attempt < self.max_retries:
+                # Full jitter, but never sleep past the deadline
+                backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                remaining = expires_at - time.monotonic()
+                if backoff >= remaining:
+                    break
+                self._count('retries')
+                time.sleep(backoff)
+
+        raise DetectorUnavailable(last_error)
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['breaker'] = self.breaker.snapshot()
+        stats['deadline'] = self.deadline
+        stats['max_concurrency'] = self.max_concurrency
+        return stats
+
+
+def async_supported() -> bool:
+    return aiohttp is not None
+
+
+class AsyncRoboflowClient:
+    """asyncio counterpart of RoboflowClient: same deadline, retries and breaker, one aiohttp session per loop"""
+
+    def __init__(self, api_key: str, model: str, version: int = 1,
+                 base_url: str = 'https://detect.roboflow.com',
+                 deadline: float = 5.0, connect_timeout: float = 2.0,
+                 max_retries: int = 2, backoff_base: float = 0.1, backoff_max: float = 1.0,
+                 max_concurrency: int = 256, breaker: Optional[CircuitBreaker] = None):
+        if aiohttp is None:
+            raise ValueError('aiohttp is not installed')
+        self.api_key = api_key
+        self.model = model
+        self.version = version
+        self.url = f"{base_url.rstrip('/')}/{model}/{version}"
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        # Share the threaded client's breaker so both paths agree on upstream health
+        self.breaker = breaker or CircuitBreaker()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Only touched from the event loop
+        self._stats = {'requests': 0, 'successes': 0, 'failures': 0, 'retries': 0,
+                       'short_circuited': 0, 'saturated': 0}
+
+    def _bind(self):
+        # aiohttp sessions and asyncio primitives belong to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.max_concurrency)
+            )
+        return self._session
+
+    async def detect(self, image_base64: bytes, confidence: int = 40, overlap: int = 30) -> Dict[str, Any]:
+        """POST a base64 frame and return the raw Roboflow JSON response"""
+        self._stats['requests'] += 1
+        if self.breaker.state == CircuitBreaker.OPEN:
+            self._stats['short_circuited'] += 1
+            raise DetectorUnavailable('circuit breaker open')
+
+        session = self._bind()
+        expires_at = time.monotonic() + self.deadline
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.deadline)
+        except asyncio.TimeoutError:
+            self._stats['saturated'] += 1
+            raise DetectorUnavailable('detector concurrency limit reached')
+
+        if not self.breaker.allow_request():
+            self._semaphore.release()
+            self._stats['short_circuited'] += 1
+            raise DetectorUnavailable('circuit breaker open')
+
+        try:
+            result = await self._post_with_retries(session, image_base64, confidence, overlap, expires_at)
+        except DetectorUnavailable:
+            self.breaker.record_failure()
+            self._stats['failures'] += 1
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            self._stats['failures'] += 1
+            raise DetectorUnavailable(f'{type(e).__name__}: {e}') from e
+        except BaseException:
+            # Cancelled (usually the client went away): says nothing about upstream, but must free the probe
+            self.breaker.release_probe()
+            raise
+        finally:
+            self._semaphore.release()
+
+        self.breaker.record_success()
+        self._stats['successes'] += 1
+        return result
+
+    async def _post_with_retries(self, session, image_base64: bytes, confidence: int, overlap: int,
+                                 expires_at: float) -> Dict[str, Any]:
+        params = {
+            "api_key": self.api_key,
+            "confidence": confidence,
+            "overlap": overlap
+        }
+        last_error = 'deadline exceeded'
+
+        for attempt in range(self.max_retries + 1):
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                async with session.post(
+                    self.url,
+                    params=params,
+                    data=image_base64,
+                    headers={"Content-Type": "application/x-www-form-urlencoded"},
+                    timeout=aiohttp.ClientTimeout(total=remaining, connect=min(self.connect_timeout, remaining))
+                ) as response:
+                    if response.status == 200:
+                        try:
+                            return await response.json(content_type=None)
+                        except ValueError as e:
+                            raise DetectorUnavailable(f'malformed upstream response: {e}')
+                    last_error = f'upstream returned {response.status}'
+                    if response.status not in RETRYABLE_STATUS:
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = f'{type(e).__name__}: {e}'
+
+            if attempt < self.max_retries:
+                backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                remaining = expires_at - time.monotonic()
+                if backoff >= remaining:
+                    break
+                self._stats['retries'] += 1
+                await asyncio.sleep(backoff)
+
+        raise DetectorUnavailable(last_error)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._loop = None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['breaker'] = self.breaker.snapshot()
+        stats['deadline'] = self.deadline
+        stats['max_concurrency'] = self.max_concurrency
+        return stats
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the Roboflow detector client
+
+Starts the local stand-in server in-process and drives RoboflowClient from
+a pool of threads, reporting latency percentiles, fallbacks and breaker
+state:
+
+    python -m analytics.detector_loadtest --requests 500 --threads 32 --error-rate 0.2
+"""
+
+import json
+import time
+import base64
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from analytics.detector_client import RoboflowClient, CircuitBreaker, DetectorUnavailable
+from analytics.roboflow_stub import StubConfig, serve
+
+
+def run(args) -> dict:
+    server = serve('127.0.0.1', 0, StubConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                                               args.stall_rate, args.stall_ms, args.seed))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = RoboflowClient(
+        api_key='stub',
+        model='football-player-detection',
+        base_url=f"http://127.0.0.1:{server.server_address[1]}",
+        deadline=args.deadline,
+        max_retries=args.retries,
+        max_concurrency=args.concurrency,
+        breaker=CircuitBreaker(args.breaker_threshold, args.breaker_reset)
+    )
+    body = base64.b64encode(b'\xff\xd8\xff' + b'\0' * args.payload_bytes)
+
+    def one_call(_):
+        started = time.perf_counter()
+        try:
+            client.detect(body)
+            ok = True
+        except DetectorUnavailable:
+            ok = False
+        return ok, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        outcomes = list(pool.map(one_call, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    latencies = np.array([latency for _, latency in outcomes]) * 1000
+    ok = np.array([success for success, _ in outcomes])
+    return {
+        'requests': args.requests,
+        'succeeded': int(ok.sum()),
+        'fell_back': int((~ok).sum()),
+        'throughput_rps': args.requests / elapsed,
+        'latency_ms': {
+            'p50': float(np.percentile(latencies, 50)),
+            'p95': float(np.percentile(latencies, 95)),
+            'p99': float(np.percentile(latencies, 99)),
+            'max': float(latencies.max())
+        },
+        'fallback_latency_ms_p95': float(np.percentile(latencies[~ok], 95)) if (~ok).any() else 0.0,
+        'client': client.stats()
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load-test the detector client against the local stand-in')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--deadline', type=float, default=2.0)
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--breaker-threshold', type=int, default=5)
+    parser.add_argument('--breaker-reset', type=float, default=5.0)
+    parser.add_argument('--latency-ms', type=float, default=80.0)
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--stall-rate', type=float, default=0.0)
+    parser.add_argument('--stall-ms', type=float, default=10000.0)
+    parser.add_argument('--payload-bytes', type=int, default=150000)
+    parser.add_argument('--seed', type=int, default=None)
+
+    print(json.dumps(run(parser.parse_args()), indent=2))
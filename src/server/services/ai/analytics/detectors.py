@@ -0,0 +1,408 @@
+"""
+Pluggable player detector backends
+
+Every backend takes a batch of JPEG frames and returns one Roboflow-style
+response per frame ({'predictions': [{'x', 'y', 'width', 'height',
+'confidence', 'class'}, ...]}), or None for a frame that failed, so the
+rest of the pipeline doesn't care where detections came from. Backends
+return raw, loosely-thresholded detections; NMS and the caller's
+thresholds are applied afterwards by analytics.postprocess.
+
+- RoboflowBackend: the hosted API, one pooled request per frame in parallel
+  (awaited concurrently on an event loop when it has an async client)
+- LocalModelBackend: a YOLO-style ONNX model on the CPU via onnxruntime or
+  OpenCV DNN, loaded once per worker process and run as one forward pass
+  per batch
+- ReplayBackend: recorded responses looked up by frame hash; a frame that
+  was never recorded is a miss (None), unless synthetic detections are
+  switched on for load testing
+- RecordingBackend: wraps another backend and appends its responses to a
+  replay file
+
+detect_batch_async() is the event-loop entry point. Backends without
+non-blocking I/O of their own run detect_batch() on the loop's default
+executor.
+"""
+
+import os
+import asyncio
+import json
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from analytics.detector_client import RoboflowClient, AsyncRoboflowClient, DetectorUnavailable
+from analytics.uploads import buffer_file
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+DEFAULT_CLASSES = ('ball', 'goalkeeper', 'player', 'referee')
+LETTERBOX_FILL = 114
+
+
+def frame_hash(jpeg_data: bytes) -> str:
+    return hashlib.sha256(jpeg_data).hexdigest()
+
+
+class DetectorBackend:
+    """Batch detector interface"""
+
+    name = 'base'
+
+    @property
+    def model_id(self) -> str:
+        """Identifies the model for cache keys"""
+        return self.name
+
+    def detect_batch(self, frames: List[bytes]) -> List[Optional[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def detect(self, frame: bytes) -> Optional[Dict[str, Any]]:
+        return self.detect_batch([frame])[0]
+
+    async def detect_batch_async(self, frames: List[bytes]) -> List[Optional[Dict[str, Any]]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.detect_batch, frames)
+
+    async def aclose(self):
+        """Release event-loop resources (client sessions) before the loop closes"""
+
+    def preload(self):
+        """Load whatever pre-forked workers can share copy-on-write; called once before fork"""
+
+    def ready(self) -> bool:
+        """True once this process can serve detections"""
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name}
+
+
+class RoboflowBackend(DetectorBackend):
+    """Hosted Roboflow API; frames of a batch are sent concurrently"""
+
+    name = 'roboflow'
+
+    def __init__(self, client: RoboflowClient, confidence: int = 10, overlap: int = 100, concurrency: int = 8,
+                 async_client: Optional[AsyncRoboflowClient] = None):
+        # Defaults ask for raw detections: low confidence floor, upstream NMS off
+        self.client = client
+        self.async_client = async_client
+        self.confidence = confidence
+        self.overlap = overlap
+        self._pool = ThreadPoolExecutor(max_workers=concurrency)
+
+    @property
+    def model_id(self) -> str:
+        return f"roboflow:{self.client.model}/{self.client.version}"
+
+    def _detect_one(self, frame: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            # Roboflow accepts the base64 body as bytes, so skip the str round trip
+            return self.client.detect(base64.b64encode(frame), confidence=self.confidence, overlap=self.overlap)
+        except DetectorUnavailable as e:
+            print(f"Roboflow unavailable: {e}")
+        except Exception as e:
+            print(f"Roboflow detection error: {e}")
+        return None
+
+    def detect_batch(self, frames: List[bytes]) -> List[Optional[Dict[str, Any]]]:
+        if len(frames) == 1:
+            return [self._detect_one(frames[0])]
+        return list(self._pool.map(self._detect_one, frames))
+
+    async def _detect_one_async(self, frame: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.async_client.detect(base64.b64encode(frame), confidence=self.confidence,
+                                                  overlap=self.overlap)
+        except DetectorUnavailable as e:
+            print(f"Roboflow unavailable: {e}")
+        except Exception as e:
+            print(f"Roboflow detection error: {e}")
+        return None
+
+    async def detect_batch_async(self, frames: List[bytes]) -> List[Optional[Dict[str, Any]]]:
+        if self.async_client is None:
+            return await super().detect_batch_async(frames)
+        return list(await asyncio.gather(*(self._detect_one_async(frame) for frame in frames)))
+
+    async def aclose(self):
+        if self.async_client is not None:
+            await self.async_client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.client.stats()
+        stats['backend'] = self.name
+        if self.async_client is not None:
+            stats['async'] = self.async_client.stats()
+        return stats
+
+
+def letterbox(frame: bytes, size: int) -> Tuple[np.ndarray, float, Tuple[float, float], Tuple[int, int]]:
+    """Decode and fit a frame into a size×size canvas; returns CHW float32, scale, padding and original size"""
+    image = Image.open(buffer_file(frame))
+    original = image.size
+    # Let the JPEG decoder do most of the downscale
+    image.draft('RGB', (size, size))
+    image = image.convert('RGB')
+    scale = min(size / original[0], size / original[1])
+    resized = (max(1, round(original[0] * scale)), max(1, round(original[1] * scale)))
+    image = image.resize(resized, Image.BILINEAR)
+
+    canvas = np.full((size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+    pad = ((size - resized[0]) / 2, (size - resized[1]) / 2)
+    left, top = int(pad[0]), int(pad[1])
+    canvas[top:top + resized[1], left:left + resized[0]] = np.asarray(image)
+    return canvas.transpose(2, 0, 1).astype(np.float32) / 255.0, scale, (left, top), original
+
+
+class LocalModelBackend(DetectorBackend):
+    """YOLO-style ONNX model on the CPU, one forward pass per batch"""
+
+    name = 'local'
+
+    def __init__(self, model_path: str, input_size: int = 640, classes: Tuple[str, ...] = DEFAULT_CLASSES,
+                 confidence: float = 0.1, engine: Optional[str] = None):
+        if not os.path.exists(model_path):
+            raise ValueError(f"Detector model not found: {model_path}")
+        self.model_path = model_path
+        self.input_size = input_size
+        self.classes = tuple(classes)
+        # Raw-output floor only; anchors below it are never worth suppressing
+        self.confidence = confidence
+        self.engine = engine or ('onnxruntime' if onnxruntime is not None else 'opencv')
+        if self.engine == 'onnxruntime' and onnxruntime is None:
+            raise ValueError('onnxruntime is not installed')
+        if self.engine == 'opencv' and cv2 is None:
+            raise ValueError('Neither onnxruntime nor opencv-python is installed')
+        self._model = None
+        self._model_pid = None
+        self._model_bytes: Optional[bytes] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+
+    @property
+    def model_id(self) -> str:
+        return f"local:{os.path.basename(self.model_path)}@{self.input_size}"
+
+    def preload(self):
+        # The serialized model is read once in the master; every worker builds its session from the shared pages
+        with open(self.model_path, 'rb') as f:
+            self._model_bytes = f.read()
+
+    def ready(self) -> bool:
+        try:
+            with self._lock:
+                self._load()
+            return True
+        except Exception as e:
+            print(f"Detector model failed to load: {e}")
+            return False
+
+    def _load(self):
+        # Loaded lazily and per process: inference sessions don't survive fork()
+        if self._model is not None and self._model_pid == os.getpid():
+            return self._model
+        source = self._model_bytes if self._model_bytes is not None else self.model_path
+        if self.engine == 'onnxruntime':
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self._model = onnxruntime.InferenceSession(source, options, providers=['CPUExecutionProvider'])
+        elif self._model_bytes is not None:
+            self._model = cv2.dnn.readNetFromONNX(np.frombuffer(self._model_bytes, dtype=np.uint8))
+        else:
+            self._model = cv2.dnn.readNetFromONNX(self.model_path)
+        self._model_pid = os.getpid()
+        return self._model
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            model = self._load()
+            if self.engine == 'onnxruntime':
+                return model.run(None, {model.get_inputs()[0].name: batch})[0]
+            model.setInput(batch)
+            return model.forward()
+
+    def _decode(self, output: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(A, 4) cx/cy/w/h, scores and class ids from one frame's raw output"""
+        n_classes = len(self.classes)
+        # YOLOv8 exports (4 + C, A); YOLOv5 exports (A, 5 + C) with objectness
+        if output.shape[0] == 4 + n_classes and output.shape[1] != 4 + n_classes:
+            output = output.T
+        if output.shape[1] == 5 + n_classes:
+            class_scores = output[:, 5:] * output[:, 4:5]
+        else:
+            class_scores = output[:, 4:4 + n_classes]
+        class_ids = np.argmax(class_scores, axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        return output[:, :4], scores, class_ids
+
+    def detect_batch(self, frames: List[bytes]) -> List[Optional[Dict[str, Any]]]:
+        if not frames:
+            return []
+        prepared = [letterbox(frame, self.input_size) for frame in frames]
+        outputs = self._forward(np.stack([tensor for tensor, _, _, _ in prepared]))
+        self.batches += 1
+        self.frames += len(frames)
+
+        responses = []
+        for output, (_, scale, (left, top), original) in zip(outputs, prepared):
+            boxes, scores, class_ids = self._decode(output)
+            keep = scores >= self.confidence
+            boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+            # Back from letterboxed model input to original frame pixels
+            boxes = boxes.copy()
+            boxes[:, 0] = (boxes[:, 0] - left) / scale
+            boxes[:, 1] = (boxes[:, 1] - top) / scale
+            boxes[:, 2:] /= scale
+
+            responses.append({
+                'image': {'width': original[0], 'height': original[1]},
+                'predictions': [
+                    {
+                        'x': float(boxes[i, 0]), 'y': float(boxes[i, 1]),
+                        'width': float(boxes[i, 2]), 'height': float(boxes[i, 3]),
+                        'confidence': float(scores[i]),
+                        'class': self.classes[class_ids[i]],
+                        'class_id': int(class_ids[i])
+                    }
+                    for i in range(len(scores))
+                ]
+            })
+        return responses
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'engine': self.engine,
+            'model': self.model_id,
+            'loaded': self._model is not None,
+            'batches': self.batches,
+            'frames': self.frames
+        }
+
+
+def synthetic_response(frame: bytes, players: int = 22) -> Dict[str, Any]:
+    """Plausible detections seeded by the frame content, identical on every run"""
+    width, height = Image.open(buffer_file(frame)).size
+    rng = np.random.default_rng(int(frame_hash(frame)[:16], 16))
+    box_h = height * rng.uniform(0.08, 0.12)
+    centres = rng.uniform((0.05 * width, 0.15 * height), (0.95 * width, 0.95 * height), (players, 2))
+    return {
+        'image': {'width': width, 'height': height},
+        'predictions': [
+            {
+                'x': float(x), 'y': float(y),
+                'width': float(box_h * 0.45), 'height': float(box_h),
+                'confidence': float(c),
+                'class': 'player'
+            }
+            for (x, y), c in zip(centres, rng.uniform(0.6, 0.95, players))
+        ]
+    }
+
+
+class ReplayBackend(DetectorBackend):
+    """Recorded responses by frame hash (JSON lines: {"frame": sha256, "response": {...}})"""
+
+    name = 'replay'
+
+    def __init__(self, path: Optional[str] = None, synthetic: bool = False):
+        self.path = path
+        # Made-up detections for unrecorded frames; only for load tests, never for real analysis
+        self.synthetic = synthetic
+        self.responses: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.synthesized = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.responses[record['frame']] = record['response']
+
+    def detect_batch(self, frames: List[bytes]) -> List[Optional[Dict[str, Any]]]:
+        responses = []
+        for frame in frames:
+            response = self.responses.get(frame_hash(frame))
+            if response is not None:
+                self.hits += 1
+            elif self.synthetic:
+                self.synthesized += 1
+                response = synthetic_response(frame)
+            else:
+                self.misses += 1
+            responses.append(response)
+        return responses
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'recorded_frames': len(self.responses),
+            'hits': self.hits,
+            'misses': self.misses,
+            'synthetic': self.synthetic,
+            'synthesized': self.synthesized
+        }
+
+
+class RecordingBackend(DetectorBackend):
+    """Passes through to another backend and appends its responses to a replay file"""
+
+    def __init__(self, inner: DetectorBackend, path: str):
+        self.inner = inner
+        self.path = path
+        self.name = inner.name
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        return self.inner.model_id
+
+    def detect_batch(self, frames: List[bytes]) -> List[Optional[Dict[str, Any]]]:
+        responses = self.inner.detect_batch(frames)
+        self._record(frames, responses)
+        return responses
+
+    async def detect_batch_async(self, frames: List[bytes]) -> List[Optional[Dict[str, Any]]]:
+        responses = await self.inner.detect_batch_async(frames)
+        self._record(frames, responses)
+        return responses
+
+    def _record(self, frames: List[bytes], responses: List[Optional[Dict[str, Any]]]):
+        lines = [
+            json.dumps({'frame': frame_hash(frame), 'response': response})
+            for frame, response in zip(frames, responses) if response is not None
+        ]
+        if lines:
+            with self._lock, open(self.path, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+
+    def preload(self):
+        self.inner.preload()
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+    def ready(self) -> bool:
+        return self.inner.ready()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.inner.stats()
+        stats['recording'] = self.path
+        return stats
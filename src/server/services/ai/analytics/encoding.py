@@ -0,0 +1,203 @@
+"""
+Response encodings for analytics results
+
+Analysis results keep each frame's players as a FrameDetections until the
+response is written; the encoding chosen from the Accept header decides
+what they become:
+
+- application/json (default): player dicts, serialized with orjson when it
+  is installed (NaN becomes null) and the stdlib json module otherwise
+- application/msgpack: the same document, with each frame's players as
+  packed little-endian columns ({'count', 'classes', 'teams', 'columns':
+  {name: {'dtype', 'data'}}}) that map straight onto typed arrays
+- application/vnd.apache.arrow.stream: an Arrow IPC stream with one row per
+  detection across all frames ('frame' indexes the detection sets in
+  document order); the rest of the document is JSON in the schema metadata
+  under 'analytics', with each frame's players replaced by its row range
+
+Binary formats are only offered when msgpack / pyarrow are installed.
+"""
+
+import json
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+from analytics.detections import FrameDetections, TEAM_LABELS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+ARROW = 'application/vnd.apache.arrow.stream'
+ALIASES = {'application/x-msgpack': MSGPACK}
+
+
+def _default(obj):
+    """Fallback for types neither serializer handles natively"""
+    if isinstance(obj, FrameDetections):
+        return obj.to_dicts()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_json(obj: Any, sort_keys: bool = False, indent: Optional[int] = None) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    separators = None if indent else (',', ':')
+    return json.dumps(obj, default=_default, sort_keys=sort_keys, indent=indent, separators=separators).encode()
+
+
+class AnalyticsJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dumps_json, so every jsonify() gets the fast path"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps_json(obj, kwargs.get('sort_keys', self.sort_keys), kwargs.get('indent')).decode()
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if (self.compact is None and self._app.debug) or self.compact is False else None
+        # Bytes straight into the response, without the str round trip
+        return self._app.response_class(dumps_json(obj, self.sort_keys, indent) + b'\n', mimetype=self.mimetype)
+
+
+def available() -> List[str]:
+    """Encodings this process can produce, JSON first so it wins ties"""
+    formats = [JSON]
+    if msgpack is not None:
+        formats.append(MSGPACK)
+    if pyarrow is not None:
+        formats.append(ARROW)
+    return formats
+
+
+def negotiate(accept) -> str:
+    """Best encoding for a werkzeug MIMEAccept; JSON when nothing better matches"""
+    offered = available()
+    for alias, mimetype in ALIASES.items():
+        if mimetype in offered and alias in accept.values():
+            offered.append(alias)
+    best = accept.best_match(offered, default=JSON)
+    return ALIASES.get(best, best)
+
+
+def _buffer(column: np.ndarray) -> Dict[str, Any]:
+    little = column.astype(column.dtype.newbyteorder('<'), copy=False)
+    return {'dtype': little.dtype.str, 'data': little.tobytes()}
+
+
+def packed_columns(detections: FrameDetections) -> Dict[str, Any]:
+    """One frame's detections as little-endian column buffers"""
+    return {
+        'count': len(detections),
+        'classes': list(detections.class_names),
+        'teams': list(TEAM_LABELS),
+        'columns': {name: _buffer(column) for name, column in detections.columns().items()}
+    }
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, FrameDetections):
+        return packed_columns(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+
+
+def encode_msgpack(result: Dict[str, Any]) -> bytes:
+    return msgpack.packb(result, default=_msgpack_default)
+
+
+def _dictionary(codes: np.ndarray, names: List[str]):
+    return pyarrow.DictionaryArray.from_arrays(pyarrow.array(codes, type=pyarrow.int16()), pyarrow.array(names))
+
+
+def detection_table(frames: List[FrameDetections]):
+    """One Arrow table covering every detection of every frame"""
+    counts = np.array([len(frame) for frame in frames], dtype=np.int64)
+    columns = [frame.columns() for frame in frames]
+
+    # Frames may carry different class vocabularies; remap onto their union
+    class_names: Dict[str, int] = {}
+    class_codes = [np.zeros(0, dtype=np.int16)]
+    for frame in frames:
+        lookup = [class_names.setdefault(name, len(class_names)) for name in frame.class_names]
+        class_codes.append(np.array(lookup, dtype=np.int16)[frame.class_ids])
+
+    def stacked(name: str, dtype) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        values = np.zeros(int(counts.sum()), dtype=dtype)
+        present = np.zeros(len(values), dtype=bool)
+        offset = 0
+        for count, frame_columns in zip(counts.tolist(), columns):
+            if name in frame_columns:
+                values[offset:offset + count] = frame_columns[name]
+                present[offset:offset + count] = True
+            offset += count
+        return values, None if present.all() else ~present
+
+    table = {'frame': pyarrow.array(np.repeat(np.arange(len(frames), dtype=np.int32), counts))}
+    for name in ('x', 'y', 'width', 'height', 'confidence'):
+        table[name] = pyarrow.array(stacked(name, np.float32)[0])
+    table['class'] = _dictionary(np.concatenate(class_codes), list(class_names))
+    table['team'] = _dictionary(stacked('team', np.int16)[0], list(TEAM_LABELS))
+    for name, dtype in (('track_id', np.int32), ('pitch_x', np.float32), ('pitch_y', np.float32)):
+        values, missing = stacked(name, dtype)
+        table[name] = pyarrow.array(values, mask=missing)
+    return pyarrow.table(table)
+
+
+def encode_arrow(result: Dict[str, Any]) -> bytes:
+    frames: List[FrameDetections] = []
+    rows = [0]
+
+    def collect(obj):
+        if isinstance(obj, FrameDetections):
+            frames.append(obj)
+            rows.append(rows[-1] + len(obj))
+            return {'frame': len(frames) - 1, 'rows': rows[-2:]}
+        return _default(obj)
+
+    if orjson is not None:
+        metadata = orjson.dumps(result, default=collect, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    else:
+        metadata = json.dumps(result, default=collect, separators=(',', ':')).encode()
+    table = detection_table(frames)
+    table = table.replace_schema_metadata({'analytics': metadata})
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode(result: Dict[str, Any], mimetype: str) -> bytes:
+    """Serialize an analysis result in a negotiated encoding"""
+    if mimetype == MSGPACK:
+        return encode_msgpack(result)
+    if mimetype == ARROW:
+        return encode_arrow(result)
+    return dumps_json(result)
@@ -0,0 +1,169 @@
+"""
+Template-indexed formation recognition
+
+Each formation is a precomputed template of eleven slots (keeper plus
+outfield lines) in a normalized (depth, width) layout. A team's detected
+players are centred and scaled the same way, then scored against every
+template in both attacking directions at once. The assignment cost is a
+symmetric nearest-slot distance: every player to its closest slot, plus
+the best-covered slots back to their closest player, trimmed to the number
+of players actually detected so missing players are not penalized. That is
+a single tensor operation for the whole batch, where an exact Hungarian
+solve per template and frame would not be. Costs become a probability per
+template; FormationSmoother averages those probabilities over a sliding
+window so per-frame noise (and who happens to be out of shot) doesn't flip
+the answer.
+"""
+
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+
+MIN_FORMATION_PLAYERS = 7
+OUTFIELD_PLAYERS = 10
+# Softmax temperature over assignment costs, in normalized layout units
+TEMPERATURE = 0.03
+
+FORMATIONS = (
+    '4-4-2', '4-3-3', '4-2-3-1', '4-1-4-1', '4-5-1', '4-4-1-1', '4-3-2-1',
+    '3-5-2', '3-4-3', '3-4-2-1', '5-3-2', '5-4-1',
+)
+
+
+def _normalize(points: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Centre each layout on its centroid and scale each axis by its spread"""
+    count = np.maximum(valid.sum(axis=-1, keepdims=True), 1)[..., None]
+    filled = np.where(valid[..., None], points, 0.0)
+    centre = filled.sum(axis=-2, keepdims=True) / count
+    offset = np.where(valid[..., None], points - centre, 0.0)
+    scale = np.sqrt((offset * offset).sum(axis=-2, keepdims=True) / count)
+    return offset / np.maximum(scale, 1e-9)
+
+
+def build_template(formation: str) -> np.ndarray:
+    """Eleven (depth, width) slots, keeper then defence first, for a formation like '4-2-3-1'"""
+    lines = [int(n) for n in formation.split('-')]
+    if sum(lines) != OUTFIELD_PLAYERS:
+        raise ValueError(f"{formation} does not have {OUTFIELD_PLAYERS} outfield players")
+    slots = [(0.0, 0.0)]
+    for depth, count in enumerate(lines, start=1):
+        # Wider lines stretch further towards the touchlines
+        half_width = min(0.4, 0.1 * count)
+        for width in np.linspace(-half_width, half_width, count) if count > 1 else [0.0]:
+            slots.append((depth / (len(lines) + 1), width))
+    return np.array(slots)
+
+
+def build_index(formations: Tuple[str, ...] = FORMATIONS) -> np.ndarray:
+    """(F, 2, 11, 2) normalized templates, second orientation attacking the other way"""
+    templates = np.stack([build_template(name) for name in formations])
+    flipped = templates * np.array([-1.0, 1.0])
+    both = np.stack([templates, flipped], axis=1)
+    return _normalize(both, np.ones(both.shape[:-1], dtype=bool))
+
+
+TEMPLATE_INDEX = build_index()
+
+
+def assignment_costs(layout: np.ndarray, valid: np.ndarray,
+                     index: np.ndarray = TEMPLATE_INDEX) -> np.ndarray:
+    """(N, F) nearest-slot cost of each frame's (depth, width) layout against each template (best orientation)"""
+    points = _normalize(layout, valid)
+    # (N, F, O, K, S) distances from every player to every slot
+    diff = points[:, None, None, :, None, :] - index[None, :, :, None, :, :]
+    dist = np.sqrt((diff * diff).sum(axis=-1))
+    mask = valid[:, None, None, :, None]
+    count = valid.sum(axis=1)
+    denominator = np.maximum(count, 1)[:, None, None]
+
+    player_to_slot = np.where(mask[..., 0], dist.min(axis=-1), 0.0).sum(axis=-1) / denominator
+    # Slots nobody is near are assumed out of shot: keep only the best-covered `count`
+    slot_to_player = np.sort(np.where(mask, dist, np.inf).min(axis=-2), axis=-1)
+    covered = np.arange(index.shape[-2]) < count[:, None, None, None]
+    slot_to_player = np.where(covered, slot_to_player, 0.0).sum(axis=-1) / denominator
+    return (player_to_slot + slot_to_player).min(axis=-1)
+
+
+def probabilities(costs: np.ndarray, temperature: float = TEMPERATURE) -> np.ndarray:
+    """Softmax over templates of negative assignment cost"""
+    logits = -(costs - costs.min(axis=-1, keepdims=True)) / temperature
+    weights = np.exp(logits)
+    return weights / weights.sum(axis=-1, keepdims=True)
+
+
+def recognize(pts: np.ndarray, valid: np.ndarray, depth_axis: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """(N, F) template probabilities and costs for one team's slot array; rows are NaN when too few players"""
+    layout = pts[..., [depth_axis, 1 - depth_axis]]
+    n_frames = valid.shape[0]
+    probs = np.full((n_frames, len(FORMATIONS)), np.nan)
+    costs = np.full((n_frames, len(FORMATIONS)), np.nan)
+
+    enough = valid.sum(axis=1) >= MIN_FORMATION_PLAYERS
+    if enough.any():
+        costs[enough] = assignment_costs(layout[enough], valid[enough])
+        probs[enough] = probabilities(costs[enough])
+    return probs, costs
+
+
+def describe(probs: np.ndarray, costs: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """Formation dict for one frame's (F,) probabilities"""
+    if np.isnan(probs).any():
+        return {'formation': 'unknown', 'confidence': 0.0}
+    best = int(np.argmax(probs))
+    runner_up = int(np.argsort(probs)[-2])
+    result = {
+        'formation': FORMATIONS[best],
+        'lines': len(FORMATIONS[best].split('-')),
+        'confidence': float(probs[best]),
+        'alternative': FORMATIONS[runner_up]
+    }
+    if costs is not None:
+        result['fit'] = float(costs[best])
+    return result
+
+
+class FormationSmoother:
+    """Sliding-window average of per-frame template probabilities"""
+
+    def __init__(self, window: int = 25):
+        self.window = window
+        self._history: deque = deque(maxlen=window)
+
+    def update(self, probs: np.ndarray) -> np.ndarray:
+        """Add one frame's (F,) probabilities (NaN rows are skipped) and return the window mean"""
+        if not np.isnan(probs).any():
+            self._history.append(probs)
+        if not self._history:
+            return probs
+        return np.mean(self._history, axis=0)
+
+    @property
+    def frames(self) -> int:
+        return len(self._history)
+
+    def summary(self) -> Dict[str, Any]:
+        if not self._history:
+            return {'formation': 'unknown', 'confidence': 0.0, 'frames': 0}
+        result = describe(np.mean(self._history, axis=0))
+        result['frames'] = self.frames
+        return result
+
+
+def analyze(team_slots: Dict[str, Tuple[np.ndarray, np.ndarray]], depth_axis: int = 1,
+            smoothers: Optional[Dict[str, FormationSmoother]] = None) -> List[Dict[str, Dict[str, Any]]]:
+    """Per-frame formation per team; with smoothers, frames are folded into each team's window in order"""
+    per_team = {}
+    for team, (pts, valid) in team_slots.items():
+        probs, costs = recognize(pts, valid, depth_axis)
+        smoother = smoothers.get(team) if smoothers else None
+        frames = []
+        for i in range(len(probs)):
+            if smoother is not None:
+                frames.append(describe(smoother.update(probs[i])))
+                frames[-1]['window'] = smoother.frames
+            else:
+                frames.append(describe(probs[i], costs[i]))
+        per_team[team] = frames
+
+    n_frames = len(next(iter(per_team.values()), []))
+    return [{team: frames[i] for team, frames in per_team.items()} for i in range(n_frames)]
@@ -0,0 +1,87 @@
+"""
+Frame preparation for detection
+
+JPEG uploads are passed through untouched: PIL only parses the header to
+read the frame size, so there is no decode/re-encode pass. Other formats
+are converted to JPEG once.
+
+The detector then gets a smaller copy. The model only sees its input size
+(640 px for the usual YOLO export), so anything bigger is encoded, base64'd
+and uploaded just to be resized remotely. detection_input() decodes in
+JPEG draft mode, which scales by 1/2, 1/4 or 1/8 inside the DCT and never
+builds the full-resolution image. It optionally crops to the calibrated
+pitch region first, then resizes the rest of the way to the model size.
+The returned InputTransform maps detections back to frame pixels.
+"""
+
+from typing import Optional, Tuple
+from io import BytesIO
+from PIL import Image
+
+from analytics.detections import FrameDetections
+from analytics.uploads import buffer_file
+
+JPEG_QUALITY = 90
+
+
+def prepare_frame(image_data: bytes) -> Tuple[bytes, Tuple[int, int]]:
+    """Return JPEG bytes ready for detection and the frame size"""
+    image = Image.open(buffer_file(image_data))
+
+    # Already JPEG: send the original bytes, size comes from the header
+    if image.format == 'JPEG':
+        return image_data, image.size
+
+    # Anything else is decoded and encoded exactly once
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffered = BytesIO()
+    image.save(buffered, format='JPEG', quality=JPEG_QUALITY)
+    return buffered.getvalue(), image.size
+
+
+class InputTransform:
+    """Maps detector-input pixels back to frame pixels: frame = input * scale + offset"""
+
+    __slots__ = ('scale', 'offset_x', 'offset_y')
+
+    def __init__(self, scale: float, offset_x: float = 0.0, offset_y: float = 0.0):
+        self.scale = scale
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+
+    def to_frame(self, detections: FrameDetections) -> FrameDetections:
+        """Rescale and shift boxes in place"""
+        detections.boxes *= self.scale
+        detections.boxes[:, 0] += self.offset_x
+        detections.boxes[:, 1] += self.offset_y
+        return detections
+
+
+def detection_input(jpeg_data: bytes, frame_size: Tuple[int, int], max_size: int = 0,
+                    region: Optional[Tuple[int, int, int, int]] = None) -> Tuple[bytes, Optional[InputTransform]]:
+    """JPEG for the detector, at most max_size on its longer side and cropped to region (left, top, right, bottom)
+
+    Returns the original bytes and no transform when there is nothing to shrink.
+    """
+    width, height = frame_size
+    left, top, right, bottom = region or (0, 0, width, height)
+    crop_width, crop_height = right - left, bottom - top
+    longest = max(crop_width, crop_height)
+    scale = max(1.0, longest / max_size) if max_size > 0 else 1.0
+    if scale == 1.0 and (crop_width, crop_height) == (width, height):
+        return jpeg_data, None
+
+    target = (max(1, round(crop_width / scale)), max(1, round(crop_height / scale)))
+    image = Image.open(buffer_file(jpeg_data))
+    # Draft picks the smallest DCT scale that still covers the target; only the remainder is resampled
+    image.draft('RGB', (max(1, round(width / scale)), max(1, round(height / scale))))
+    reduction = image.size[0] / width
+    box = (left * reduction, top * reduction, right * reduction, bottom * reduction)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    resized = image.resize(target, Image.BILINEAR, box=box)
+
+    buffered = BytesIO()
+    resized.save(buffered, format='JPEG', quality=JPEG_QUALITY)
+    return buffered.getvalue(), InputTransform(crop_width / target[0], left, top)
@@ -0,0 +1,129 @@
+"""
+Incremental occupancy heatmaps
+
+A session keeps one occupancy grid per tracked player and per team for the
+whole match. Each frame is folded in with a single np.add.at over the
+normalized positions, so whole-match heatmaps are available at any time
+without replaying frames. Grids can be exported as a compressed .npz or
+block-summed down to a coarser resolution for JSON.
+"""
+
+import io
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+
+from analytics.compactness import TEAMS
+from analytics.tracking import TrackSlots
+
+DEFAULT_RESOLUTION = (48, 32)
+
+
+def parse_resolution(value: Optional[str], default: Tuple[int, int] = DEFAULT_RESOLUTION) -> Tuple[int, int]:
+    """Parse 'COLSxROWS' (e.g. '48x32') into a (cols, rows) tuple"""
+    if not value:
+        return default
+    cols, rows = (int(part) for part in str(value).lower().split('x'))
+    if cols < 1 or rows < 1:
+        raise ValueError('Heatmap resolution must be positive')
+    return cols, rows
+
+
+def downsample(grid: np.ndarray, resolution: Tuple[int, int]) -> np.ndarray:
+    """Block-sum a (rows, cols) grid down to (cols, rows) resolution"""
+    cols, rows = resolution
+    cols, rows = min(cols, grid.shape[1]), min(rows, grid.shape[0])
+    row_edges = np.linspace(0, grid.shape[0], rows + 1).astype(np.int64)[:-1]
+    col_edges = np.linspace(0, grid.shape[1], cols + 1).astype(np.int64)[:-1]
+    return np.add.reduceat(np.add.reduceat(grid, row_edges, axis=0), col_edges, axis=1)
+
+
+class HeatmapAccumulator:
+    """Per-player and per-team occupancy grids for one match"""
+
+    def __init__(self, resolution: Tuple[int, int] = DEFAULT_RESOLUTION, capacity: int = 64):
+        self.cols, self.rows = resolution
+        # One grid per track that has landed inside the extent, in slots order
+        self.slots = TrackSlots()
+        self.players = np.zeros((capacity, self.rows, self.cols), dtype=np.uint32)
+        self.teams = np.zeros((len(TEAMS), self.rows, self.cols), dtype=np.uint32)
+        self.samples = 0
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        return (self.cols, self.rows)
+
+    def _ensure_capacity(self, count: int):
+        capacity = len(self.players)
+        if count <= capacity:
+            return
+        grown = np.zeros((max(count, capacity * 2), self.rows, self.cols), dtype=self.players.dtype)
+        grown[:capacity] = self.players
+        self.players = grown
+
+    def update(self, track_ids: np.ndarray, teams: np.ndarray, positions: np.ndarray, extent: Tuple[float, float]):
+        """Fold one frame of (D,) track IDs, team codes (index into TEAMS, others ignored) and (D, 2) positions within extent"""
+        ids = np.asarray(track_ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+
+        scaled = positions / np.asarray(extent, dtype=float) * (self.cols, self.rows)
+        col = np.floor(scaled[:, 0]).astype(np.int64)
+        row = np.floor(scaled[:, 1]).astype(np.int64)
+        inside = (col >= 0) & (col < self.cols) & (row >= 0) & (row < self.rows)
+        ids, col, row = ids[inside], col[inside], row[inside]
+        slots = self.slots.assign(ids)
+        self._ensure_capacity(len(self.slots))
+
+        # add.at accumulates repeated indices, unlike fancy-index +=
+        np.add.at(self.players, (slots, row, col), 1)
+
+        team_idx = np.asarray(teams, dtype=np.int64)[inside]
+        known = (team_idx >= 0) & (team_idx < len(TEAMS))
+        np.add.at(self.teams, (team_idx[known], row[known], col[known]), 1)
+        self.samples += 1
+
+    def grids(self, players: Optional[List[int]] = None, teams: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Selected grids keyed 'home'/'away'/'player_N'; defaults to every team and seen player"""
+        if teams is None:
+            teams = list(TEAMS)
+        if players is None:
+            players = sorted(self.slots.track_ids)
+
+        selected = {}
+        for team in teams:
+            if team not in TEAMS:
+                raise KeyError(team)
+            selected[team] = self.teams[TEAMS.index(team)]
+        for track_id in players:
+            slot = self.slots.get(track_id)
+            if slot is None:
+                raise KeyError(f"player_{track_id}")
+            selected[f"player_{track_id}"] = self.players[slot]
+        return selected
+
+    def to_npz(self, grids: Dict[str, np.ndarray]) -> bytes:
+        """Compressed .npz with one (rows, cols) array per key"""
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **grids)
+        return buffer.getvalue()
+
+    def to_json(self, grids: Dict[str, np.ndarray], resolution: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        """Row-major count lists, optionally downsampled"""
+        heatmaps = {}
+        for key, grid in grids.items():
+            if resolution is not None:
+                grid = downsample(grid, resolution)
+            heatmaps[key] = grid.tolist()
+        shape = next(iter(heatmaps.values()), None)
+        return {
+            'resolution': [len(shape[0]), len(shape)] if shape else list(self.resolution),
+            'samples': self.samples,
+            'heatmaps': heatmaps
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'resolution': list(self.resolution),
+            'samples': self.samples
+        }
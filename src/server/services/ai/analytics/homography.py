@@ -0,0 +1,231 @@
+"""
+Pitch calibration and pixel-to-metre transform
+
+A per-camera homography is estimated from image/pitch landmark pairs with
+a normalized DLT, then cached. Pitch coordinates are in metres with the
+origin at a corner flag, x along the touchline (length) and y along the
+goal line (width). Transforming a whole batch of detections is a single
+3x3 matrix product.
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+PITCH_LENGTH = 105.0
+PITCH_WIDTH = 68.0
+
+
+def pitch_landmarks(length: float = PITCH_LENGTH, width: float = PITCH_WIDTH) -> Dict[str, Tuple[float, float]]:
+    """Named pitch markings in metres"""
+    mid_y = width / 2
+    box_half, box_depth = 20.16, 16.5
+    area_half, area_depth = 9.16, 5.5
+    return {
+        'corner_top_left': (0.0, 0.0),
+        'corner_top_right': (length, 0.0),
+        'corner_bottom_left': (0.0, width),
+        'corner_bottom_right': (length, width),
+        'halfway_top': (length / 2, 0.0),
+        'halfway_bottom': (length / 2, width),
+        'centre_spot': (length / 2, mid_y),
+        'centre_circle_top': (length / 2, mid_y - 9.15),
+        'centre_circle_bottom': (length / 2, mid_y + 9.15),
+        'penalty_spot_left': (11.0, mid_y),
+        'penalty_spot_right': (length - 11.0, mid_y),
+        'penalty_box_left_top': (box_depth, mid_y - box_half),
+        'penalty_box_left_bottom': (box_depth, mid_y + box_half),
+        'penalty_box_left_goalline_top': (0.0, mid_y - box_half),
+        'penalty_box_left_goalline_bottom': (0.0, mid_y + box_half),
+        'penalty_box_right_top': (length - box_depth, mid_y - box_half),
+        'penalty_box_right_bottom': (length - box_depth, mid_y + box_half),
+        'penalty_box_right_goalline_top': (length, mid_y - box_half),
+        'penalty_box_right_goalline_bottom': (length, mid_y + box_half),
+        'goal_area_left_top': (area_depth, mid_y - area_half),
+        'goal_area_left_bottom': (area_depth, mid_y + area_half),
+        'goal_area_right_top': (length - area_depth, mid_y - area_half),
+        'goal_area_right_bottom': (length - area_depth, mid_y + area_half),
+    }
+
+
+def _normalization(points: np.ndarray) -> np.ndarray:
+    """Similarity transform moving points to zero mean and mean distance sqrt(2)"""
+    centroid = points.mean(axis=0)
+    spread = np.sqrt(((points - centroid) ** 2).sum(axis=1)).mean()
+    scale = np.sqrt(2) / spread if spread > 0 else 1.0
+    return np.array([
+        [scale, 0, -scale * centroid[0]],
+        [0, scale, -scale * centroid[1]],
+        [0, 0, 1]
+    ])
+
+
+def apply_homography(matrix: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Map (..., 2) points through a 3x3 homography"""
+    points = np.asarray(points, dtype=float)
+    flat = points.reshape(-1, 2)
+    mapped = flat @ matrix[:, :2].T + matrix[:, 2]
+    return (mapped[:, :2] / mapped[:, 2:3]).reshape(points.shape)
+
+
+def compute_homography(image_points: np.ndarray, pitch_points: np.ndarray) -> np.ndarray:
+    """Normalized DLT estimate of the image -> pitch homography from >= 4 pairs"""
+    src = np.asarray(image_points, dtype=float).reshape(-1, 2)
+    dst = np.asarray(pitch_points, dtype=float).reshape(-1, 2)
+    if len(src) < 4 or len(src) != len(dst):
+        raise ValueError('At least 4 matching image/pitch points are required')
+
+    t_src, t_dst = _normalization(src), _normalization(dst)
+    s = apply_homography(t_src, src)
+    d = apply_homography(t_dst, dst)
+
+    n = len(s)
+    a = np.zeros((2 * n, 9))
+    a[0::2, 0:2] = -s
+    a[0::2, 2] = -1
+    a[0::2, 6:8] = s * d[:, 0:1]
+    a[0::2, 8] = d[:, 0]
+    a[1::2, 3:5] = -s
+    a[1::2, 5] = -1
+    a[1::2, 6:8] = s * d[:, 1:2]
+    a[1::2, 8] = d[:, 1]
+
+    _, singular, vt = np.linalg.svd(a)
+    if singular[-2] < 1e-10:
+        raise ValueError('Calibration points are degenerate (collinear or repeated)')
+    h = np.linalg.inv(t_dst) @ vt[-1].reshape(3, 3) @ t_src
+    return h / h[2, 2]
+
+
+class PitchCalibration:
+    """Cached image <-> pitch transform for one camera"""
+
+    def __init__(self, camera_id: str, matrix: np.ndarray, length: float = PITCH_LENGTH,
+                 width: float = PITCH_WIDTH, rmse: float = 0.0, points: int = 0,
+                 created_at: Optional[float] = None):
+        self.camera_id = camera_id
+        self.matrix = np.asarray(matrix, dtype=float)
+        self.inverse = np.linalg.inv(self.matrix)
+        self.length = length
+        self.width = width
+        self.rmse = rmse
+        self.points = points
+        self.created_at = created_at or time.time()
+
+    @classmethod
+    def from_points(cls, camera_id: str, points: List[Dict[str, Any]],
+                    length: float = PITCH_LENGTH, width: float = PITCH_WIDTH) -> 'PitchCalibration':
+        """Build from [{'image': [x, y], 'pitch': [x, y]} | {'image': [x, y], 'landmark': name}]"""
+        landmarks = pitch_landmarks(length, width)
+        image_points, pitch_points = [], []
+        for point in points:
+            if 'landmark' in point:
+                if point['landmark'] not in landmarks:
+                    raise ValueError(f"Unknown landmark: {point['landmark']}")
+                pitch_points.append(landmarks[point['landmark']])
+            else:
+                pitch_points.append(point['pitch'])
+            image_points.append(point['image'])
+
+        image_points = np.asarray(image_points, dtype=float)
+        pitch_points = np.asarray(pitch_points, dtype=float)
+        matrix = compute_homography(image_points, pitch_points)
+        error = apply_homography(matrix, image_points) - pitch_points
+        rmse = float(np.sqrt((error ** 2).sum(axis=1).mean()))
+        return cls(camera_id, matrix, length, width, rmse, len(points))
+
+    @property
+    def frame_size(self) -> Tuple[float, float]:
+        """Pitch extent in metres, used in place of the frame size for metrics"""
+        return (self.length, self.width)
+
+    def to_pitch(self, points: np.ndarray) -> np.ndarray:
+        return apply_homography(self.matrix, points)
+
+    def to_image(self, points: np.ndarray) -> np.ndarray:
+        return apply_homography(self.inverse, points)
+
+    def image_region(self, frame_size: Tuple[int, int], margin: float = 0.0) -> Optional[Tuple[int, int, int, int]]:
+        """Pixel bounding box (left, top, right, bottom) of the pitch plus margin metres, clipped to the frame
+
+        None when part of that area maps behind the camera, where the box is meaningless.
+        """
+        corners = np.array([
+            [-margin, -margin], [self.length + margin, -margin],
+            [self.length + margin, self.width + margin], [-margin, self.width + margin]
+        ])
+        mapped = corners @ self.inverse[:, :2].T + self.inverse[:, 2]
+        if not (np.all(mapped[:, 2] > 0) or np.all(mapped[:, 2] < 0)):
+            return None
+        points = mapped[:, :2] / mapped[:, 2:3]
+        width, height = frame_size
+        left, top = np.clip(np.floor(points.min(axis=0)), 0, [width, height]).astype(int)
+        right, bottom = np.clip(np.ceil(points.max(axis=0)), 0, [width, height]).astype(int)
+        if right <= left or bottom <= top:
+            return None
+        return int(left), int(top), int(right), int(bottom)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'camera_id': self.camera_id,
+            'matrix': self.matrix.tolist(),
+            'pitch_length': self.length,
+            'pitch_width': self.width,
+            'rmse': self.rmse,
+            'points': self.points,
+            'created_at': self.created_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PitchCalibration':
+        return cls(data['camera_id'], np.asarray(data['matrix']), data['pitch_length'],
+                   data['pitch_width'], data.get('rmse', 0.0), data.get('points', 0), data.get('created_at'))
+
+
+class CalibrationStore:
+    """Per-camera calibrations, optionally persisted to a JSON file"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._calibrations: Dict[str, PitchCalibration] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    for data in json.load(f):
+                        calibration = PitchCalibration.from_dict(data)
+                        self._calibrations[calibration.camera_id] = calibration
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Calibration store load error: {e}")
+
+    def get(self, camera_id: Optional[str]) -> Optional[PitchCalibration]:
+        if not camera_id:
+            return None
+        with self._lock:
+            return self._calibrations.get(camera_id)
+
+    def put(self, calibration: PitchCalibration):
+        with self._lock:
+            self._calibrations[calibration.camera_id] = calibration
+            self._save()
+
+    def remove(self, camera_id: str) -> Optional[PitchCalibration]:
+        with self._lock:
+            calibration = self._calibrations.pop(camera_id, None)
+            self._save()
+            return calibration
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump([c.to_dict() for c in self._calibrations.values()], f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Calibration store save error: {e}")
@@ -0,0 +1,352 @@
+"""
+Background analysis jobs
+
+A whole match is too long to analyze inside one request, so the upload is
+spooled to disk and queued. A fixed pool of worker threads takes jobs from
+a bounded queue: when it is full, submit() refuses straight away rather
+than letting the backlog grow without limit. Each job writes its per-frame
+results as NDJSON next to its input and reports progress as it goes.
+Cancellation and the per-job limits (frames, wall-clock seconds) are
+checked between frames, so a running job stops within one frame of being
+cancelled. Job state lives in the process that accepted the job and is
+mirrored to a status file in the job directory. Another worker process
+sharing the directory can therefore report the job and serve its results,
+and it cancels the job by leaving a marker file for the owner to notice.
+Finished jobs and their files are dropped after a TTL.
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Iterable, Iterator, Optional
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+STATUS_FILE = 'status.json'
+CANCEL_FILE = 'cancel'
+# Progress is written to the status file at most this often
+SAVE_INTERVAL = 1.0
+
+
+class JobNotFound(KeyError):
+    """Raised when a job ID is unknown or has expired"""
+
+
+class QueueFull(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled"""
+
+
+class JobLimitExceeded(Exception):
+    """Raised inside a running job that went over one of its limits"""
+
+
+class Job:
+    """One queued video analysis: spooled input, NDJSON results, progress and limits"""
+
+    def __init__(self, job_id: str, directory: str, mimetype: str, params: Optional[Dict[str, Any]] = None,
+                 max_frames: int = 0, max_seconds: float = 0.0):
+        self.job_id = job_id
+        self.directory = directory
+        self.input_path = os.path.join(directory, 'input')
+        self.result_path = os.path.join(directory, 'results.ndjson')
+        self.status_path = os.path.join(directory, STATUS_FILE)
+        self.cancel_path = os.path.join(directory, CANCEL_FILE)
+        self.mimetype = mimetype
+        self.params = params or {}
+        # 0 means unlimited
+        self.max_frames = max_frames
+        self.max_seconds = max_seconds
+        # Objects the runner needs that don't belong in the status report (session, filters)
+        self.context: Dict[str, Any] = {}
+        self.state = QUEUED
+        self.error: Optional[str] = None
+        self.summary: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.input_bytes = 0
+        self.bytes_read = 0
+        self.frames_received = 0
+        self.frames_analyzed = 0
+        self._cancel = threading.Event()
+        self._deadline: Optional[float] = None
+        self._saved_at = 0.0
+
+    @classmethod
+    def load(cls, directory: str) -> 'Job':
+        """Read-only view of a job owned by another process, from its status file"""
+        with open(os.path.join(directory, STATUS_FILE)) as f:
+            status = json.load(f)
+        job = cls(status['job_id'], directory, status['mimetype'], status['params'],
+                  status['limits']['max_frames'], status['limits']['max_seconds'])
+        for key in ('state', 'error', 'summary', 'created_at', 'started_at', 'finished_at'):
+            setattr(job, key, status[key])
+        for key in ('input_bytes', 'bytes_read', 'frames_received', 'frames_analyzed'):
+            setattr(job, key, status['progress'][key])
+        return job
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set() or os.path.exists(self.cancel_path)
+
+    def save(self):
+        """Mirror the status to the job directory for other worker processes"""
+        self._saved_at = time.monotonic()
+        temporary = f"{self.status_path}.{os.getpid()}"
+        try:
+            with open(temporary, 'w') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(temporary, self.status_path)
+        except OSError:
+            # The directory is gone once the job is discarded
+            pass
+
+    def start(self):
+        self.state = RUNNING
+        self.started_at = time.time()
+        if self.max_seconds > 0:
+            self._deadline = time.monotonic() + self.max_seconds
+
+    def check(self):
+        """Raise if the job was cancelled or has run past its time limit"""
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise JobLimitExceeded(f"Job exceeded its {self.max_seconds:g} s time limit")
+
+    def spool(self, chunks: Iterable[bytes], max_bytes: int = 0):
+        """Write the upload to the job directory, refusing more than max_bytes (0: unlimited)"""
+        with open(self.input_path, 'wb') as f:
+            for chunk in chunks:
+                self.input_bytes += len(chunk)
+                if max_bytes and self.input_bytes > max_bytes:
+                    raise JobLimitExceeded(f"Upload exceeds the {max_bytes} byte job limit")
+                f.write(chunk)
+
+    def read_chunks(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """The spooled input, counting bytes for progress"""
+        with open(self.input_path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                self.bytes_read += len(chunk)
+                yield chunk
+
+    def limit(self, frames: Iterable[bytes]) -> Iterator[bytes]:
+        """Pass frames through until the job is cancelled or reaches a limit"""
+        for frame in frames:
+            self.check()
+            if self.max_frames and self.frames_received >= self.max_frames:
+                raise JobLimitExceeded(f"Job exceeded its {self.max_frames} frame limit")
+            self.frames_received += 1
+            if time.monotonic() - self._saved_at > SAVE_INTERVAL:
+                self.save()
+            yield frame
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'state': self.state,
+            'mimetype': self.mimetype,
+            'params': self.params,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': {
+                'input_bytes': self.input_bytes,
+                'bytes_read': self.bytes_read,
+                'fraction': self.bytes_read / self.input_bytes if self.input_bytes else 0.0,
+                'frames_received': self.frames_received,
+                'frames_analyzed': self.frames_analyzed
+            },
+            'limits': {'max_frames': self.max_frames, 'max_seconds': self.max_seconds},
+            'error': self.error,
+            'summary': self.summary
+        }
+
+
+class JobQueue:
+    """Bounded job queue drained by a fixed pool of worker threads"""
+
+    def __init__(self, runner: Callable[[Job], Dict[str, Any]], directory: str, workers: int = 2,
+                 max_queued: int = 16, ttl: float = 3600.0):
+        self.runner = runner
+        self.directory = directory
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._queue: queue.Queue = queue.Queue()
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.workers = workers
+        self._workers_pid: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _start_workers(self):
+        # Threads don't survive fork(); a queue built before a pre-forking server forks starts its own in each worker
+        if self._workers_pid != os.getpid():
+            for _ in range(self.workers):
+                threading.Thread(target=self._work, daemon=True).start()
+            self._workers_pid = os.getpid()
+
+    def create(self, mimetype: str, params: Optional[Dict[str, Any]] = None, max_frames: int = 0,
+               max_seconds: float = 0.0) -> Job:
+        """Reserve a job and its directory; the caller spools the input, then submit()s it"""
+        with self._lock:
+            self._expire()
+            self._check_capacity()
+        job_id = uuid.uuid4().hex
+        directory = os.path.join(self.directory, job_id)
+        os.makedirs(directory)
+        return Job(job_id, directory, mimetype, params, max_frames, max_seconds)
+
+    def submit(self, job: Job) -> Job:
+        with self._lock:
+            try:
+                self._check_capacity()
+            except QueueFull:
+                self.discard(job)
+                raise
+            self._start_workers()
+            self._queued += 1
+            self._jobs[job.job_id] = job
+            job.save()
+        self._queue.put(job)
+        return job
+
+    def _check_capacity(self):
+        if self._closed:
+            raise QueueFull('Job queue is shutting down')
+        if self._queued >= self.max_queued:
+            raise QueueFull(f"Job queue is full ({self.max_queued} waiting)")
+
+    def discard(self, job: Job):
+        """Delete a job's files; also drops one that was never submitted (e.g. its upload failed)"""
+        shutil.rmtree(job.directory, ignore_errors=True)
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._load(job_id)
+
+    def _load(self, job_id: str) -> Job:
+        # Job IDs are hex; anything else can't name a directory of ours
+        if not job_id.isalnum():
+            raise JobNotFound(job_id)
+        try:
+            return Job.load(os.path.join(self.directory, job_id))
+        except (OSError, ValueError, KeyError):
+            raise JobNotFound(job_id)
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a queued or running job; a finished one is removed along with its results"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return self._cancel_elsewhere(job_id)
+            if job.state in FINISHED:
+                del self._jobs[job_id]
+                self.discard(job)
+                return job
+            job._cancel.set()
+            if job.state == QUEUED:
+                # Workers skip it when they reach it; it no longer counts against the queue
+                self._queued -= 1
+                self._finish(job, CANCELLED)
+            return job
+
+    def _cancel_elsewhere(self, job_id: str) -> Job:
+        """Cancel a job owned by another worker process through its marker file"""
+        job = self._load(job_id)
+        if job.state in FINISHED:
+            self.discard(job)
+        else:
+            open(job.cancel_path, 'w').close()
+        return job
+
+    def shutdown(self):
+        """Refuse new jobs, fail the queued ones and cancel the running ones"""
+        with self._lock:
+            self._closed = True
+            for job in self._jobs.values():
+                if job.state == QUEUED:
+                    self._queued -= 1
+                    job.error = 'Service shut down before the job started'
+                    self._finish(job, FAILED)
+                elif job.state == RUNNING:
+                    job.error = 'Service shut down while the job was running'
+                    job._cancel.set()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.state != QUEUED:
+                    continue
+                self._queued -= 1
+                if job.cancelled:
+                    self._finish(job, CANCELLED)
+                    continue
+                job.start()
+                job.save()
+            try:
+                summary = self.runner(job)
+                with self._lock:
+                    job.summary = summary
+                    self._finish(job, SUCCEEDED)
+            except JobCancelled:
+                with self._lock:
+                    self._finish(job, CANCELLED)
+            except Exception as e:
+                with self._lock:
+                    job.error = str(e)
+                    self._finish(job, FAILED)
+
+    def _finish(self, job: Job, state: str):
+        job.state = state
+        job.finished_at = time.time()
+        # Only the results are worth keeping
+        try:
+            os.remove(job.input_path)
+        except OSError:
+            pass
+        job.save()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.state in FINISHED and job.finished_at < cutoff]
+        for job_id in expired:
+            self.discard(self._jobs.pop(job_id))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            states: Dict[str, int] = {}
+            for job in self._jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            return {
+                'workers': self.workers,
+                'closed': self._closed,
+                'queued': self._queued,
+                'max_queued': self.max_queued,
+                'jobs': states
+            }
+
+    def __len__(self) -> int:
+        return len(self._jobs)
@@ -0,0 +1,122 @@
+"""
+Incremental per-player kinematics
+
+Running distance, speed and sprint counters are kept in flat NumPy arrays
+with one compact row per track (TrackSlots), so each tracked frame is one
+vectorized update costing O(1) per detection. finalize() produces player_data in the
+units PlayerAnalyticsService.analyze_performance expects (km/h, km).
+"""
+
+from typing import Dict, Any
+import numpy as np
+
+from analytics.tracking import TrackSlots
+
+MPS_TO_KMH = 3.6
+
+
+class KinematicsEngine:
+    """Per-track distance, speed and sprint accumulation"""
+
+    def __init__(self, sprint_speed_kmh: float = 25.2, min_sprint_seconds: float = 1.0,
+                 max_speed_kmh: float = 45.0, min_interval_seconds: float = 0.2,
+                 max_gap_seconds: float = 2.0, speed_smoothing: float = 0.5, capacity: int = 64):
+        self.sprint_speed = sprint_speed_kmh / MPS_TO_KMH
+        self.min_sprint_seconds = min_sprint_seconds
+        self.max_speed = max_speed_kmh / MPS_TO_KMH
+        self.min_interval_seconds = min_interval_seconds
+        self.max_gap_seconds = max_gap_seconds
+        self.speed_smoothing = speed_smoothing
+        self.slots = TrackSlots()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self.last_position = np.zeros((capacity, 2))
+        self.last_time = np.full(capacity, -np.inf)
+        self.distance = np.zeros(capacity)
+        self.moving_time = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.top_speed = np.zeros(capacity)
+        self.sprint_time = np.zeros(capacity)
+        self.sprint_count = np.zeros(capacity, dtype=np.int64)
+        self.samples = np.zeros(capacity, dtype=np.int64)
+
+    def _ensure_capacity(self, count: int):
+        capacity = len(self.distance)
+        if count <= capacity:
+            return
+        new_capacity = max(count, capacity * 2)
+        for name in ('last_position', 'last_time', 'distance', 'moving_time', 'speed',
+                     'top_speed', 'sprint_time', 'sprint_count', 'samples'):
+            old = getattr(self, name)
+            fill = -np.inf if name == 'last_time' else 0
+            grown = np.full((new_capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            grown[:capacity] = old
+            setattr(self, name, grown)
+
+    def update(self, track_ids: np.ndarray, positions: np.ndarray, timestamp: float, metres_per_unit: float = 1.0):
+        """Fold one frame of (D,) track IDs and (D, 2) positions into the running counters"""
+        ids = np.asarray(track_ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        ids = self.slots.assign(ids)
+        self._ensure_capacity(len(self.slots))
+
+        # Measure over at least min_interval so per-frame jitter doesn't add up as distance
+        dt = timestamp - self.last_time[ids]
+        due = ~(dt < self.min_interval_seconds)
+        ids, positions, dt = ids[due], positions[due], dt[due]
+
+        step = np.linalg.norm(positions - self.last_position[ids], axis=1) * metres_per_unit
+        valid = (dt > 0) & (dt <= self.max_gap_seconds)
+        raw_speed = np.divide(step, dt, out=np.zeros_like(step), where=valid)
+        # Detector jitter and ID switches show up as impossible speeds
+        valid &= raw_speed <= self.max_speed
+
+        moving = ids[valid]
+        dt_v = dt[valid]
+        speed = self.speed_smoothing * raw_speed[valid] + (1 - self.speed_smoothing) * self.speed[moving]
+        self.distance[moving] += step[valid]
+        self.moving_time[moving] += dt_v
+        self.speed[moving] = speed
+        self.top_speed[moving] = np.maximum(self.top_speed[moving], speed)
+
+        # A sprint counts once, when smoothed speed has stayed above threshold long enough
+        previous = self.sprint_time[moving]
+        current = np.where(speed >= self.sprint_speed, previous + dt_v, 0.0)
+        self.sprint_time[moving] = current
+        self.sprint_count[moving] += (previous < self.min_sprint_seconds) & (current >= self.min_sprint_seconds)
+
+        self.samples[ids] += 1
+        self.last_position[ids] = positions
+        self.last_time[ids] = timestamp
+
+    def finalize(self, min_tracked_seconds: float = 5.0) -> Dict[str, Dict[str, Any]]:
+        """player_data per track, ready for analyze_performance"""
+        if not min_tracked_seconds > 0:
+            raise ValueError('min_tracked_seconds must be positive')
+        # Only rows a track has written to; the rest of the capacity is spare
+        active = np.flatnonzero(self.samples)
+        tracked = active[self.moving_time[active] >= min_tracked_seconds]
+        track_ids = np.asarray(self.slots.track_ids, dtype=np.int64)[tracked]
+        order = np.argsort(track_ids)
+        tracked, track_ids = tracked[order], track_ids[order]
+        avg_speed = self.distance[tracked] / self.moving_time[tracked] * MPS_TO_KMH
+
+        player_data = {}
+        for i, (row, track_id) in enumerate(zip(tracked.tolist(), track_ids.tolist())):
+            player_data[f"player_{track_id}"] = {
+                'avg_speed': float(avg_speed[i]),
+                'distance_per_match': float(self.distance[row] / 1000),
+                'sprint_count': int(self.sprint_count[row]),
+                'max_speed': float(self.top_speed[row] * MPS_TO_KMH),
+                'time_tracked': float(self.moving_time[row])
+            }
+        return player_data
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'players_tracked': int(np.count_nonzero(self.samples)),
+            'total_distance_km': float(self.distance.sum() / 1000)
+        }
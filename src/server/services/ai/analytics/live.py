@@ -0,0 +1,245 @@
+"""
+Live analytics feed for a match session
+
+Viewers subscribe to a session and are sent its analytics as Server-Sent
+Events while frames are processed. Each update is encoded once into the
+SSE bytes that every subscriber receives, however many are watching.
+
+Most updates are deltas against the previous frame. The analytics carry
+only the fields whose value changed: nested objects are diffed field by
+field, and null marks a field that went away, so a client deep-merges
+them into its copy. Player positions are quantized to a grid (decimetres
+on a calibrated pitch, whole pixels otherwise) and sent as integer cells.
+Summing the deltas therefore gives exactly the server's state, with no
+drift. Players that stayed in their cell are left out. New players, and
+players whose team changed, are sent in full. Players no longer tracked
+are listed by ID.
+
+    event: delta
+    id: 121
+    data: {"seq":121,"match_time":4.84,"moved":[[7,1,-2]],"left":[12],"analytics":{"team_compactness":0.61}}
+
+Every keyframe_interval updates, a keyframe carries the whole state. A
+viewer who joins late is sent the latest keyframe and the deltas since.
+A viewer who falls max_pending events behind is skipped forward the same
+way, so a slow connection never buffers without bound. With nobody
+watching, publishing costs nothing and the next update is a keyframe.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import numpy as np
+
+from analytics import encoding
+from analytics.detections import FrameDetections, TEAM_LABELS
+
+DEFAULT_KEYFRAME_INTERVAL = 50
+DEFAULT_MAX_PENDING = 200
+# Position grid: metres on a calibrated pitch, pixels otherwise
+PITCH_STEP = 0.1
+PIXEL_STEP = 1.0
+
+# track ID -> (x cell, y cell, team code)
+Cells = Dict[int, Tuple[int, int, int]]
+
+
+def player_cells(detections: FrameDetections, step: float) -> Cells:
+    """Quantized positions of a frame's tracked players, in pitch metres when they are known"""
+    positions = detections.pitch if detections.pitch is not None else detections.positions
+    cells = np.rint(positions / step).astype(np.int64).tolist()
+    track_ids = detections.track_ids if detections.track_ids is not None else np.arange(len(detections))
+    return {track_id: (x, y, team) for track_id, (x, y), team in zip(track_ids.tolist(), cells, detections.teams.tolist())}
+
+
+def changed_fields(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields of current that differ from previous, recursing into objects; removed fields are None"""
+    changed = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = changed_fields(old, value)
+            if nested:
+                changed[key] = nested
+        elif key not in previous or old != value:
+            changed[key] = value
+    for key in previous.keys() - current.keys():
+        changed[key] = None
+    return changed
+
+
+def sse_event(event: str, seq: int, payload: Dict[str, Any]) -> bytes:
+    return b'event: %s\nid: %d\ndata: %s\n\n' % (event.encode(), seq, encoding.dumps_json(payload))
+
+
+class Subscription:
+    """One viewer's queue of encoded events"""
+
+    def __init__(self, feed: 'LiveFeed'):
+        self.feed = feed
+        self.closed = False
+        self.skipped = 0
+        self._pending: Deque[bytes] = deque()
+        self._ready = threading.Event()
+        self._waiter: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = None
+
+    def _push(self, event: bytes, backlog: List[bytes]):
+        # Called with the feed lock held
+        if len(self._pending) >= self.feed.max_pending:
+            # Too far behind: restart from the latest keyframe rather than buffer more
+            self._pending = deque(backlog)
+            self.skipped += 1
+        else:
+            self._pending.append(event)
+        self._wake()
+
+    def _wake(self):
+        self._ready.set()
+        if self._waiter is not None:
+            loop, ready = self._waiter
+            self._waiter = None
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # The viewer's event loop has already shut down
+                pass
+
+    def _take(self) -> List[bytes]:
+        with self.feed._lock:
+            events = list(self._pending)
+            self._pending.clear()
+            self._ready.clear()
+            return events
+
+    def get(self, timeout: Optional[float] = None) -> List[bytes]:
+        """Wait up to timeout for events and return all that are queued ([] on timeout or once closed)"""
+        self._ready.wait(timeout)
+        return self._take()
+
+    async def get_async(self, timeout: Optional[float] = None) -> List[bytes]:
+        """get() for an event loop"""
+        ready = asyncio.Event()
+        with self.feed._lock:
+            if self._pending or self.closed:
+                ready.set()
+            else:
+                self._waiter = (asyncio.get_running_loop(), ready)
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.feed._lock:
+                self._waiter = None
+        return self._take()
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class LiveFeed:
+    """Delta-encoded analytics updates for one session, fanned out to its subscribers"""
+
+    def __init__(self, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING):
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.max_pending = max(1, max_pending)
+        self.seq = 0
+        self.keyframes = 0
+        self.closed = False
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscription] = []
+        # Last published state; None sends a keyframe next
+        self._cells: Optional[Cells] = None
+        self._analytics: Dict[str, Any] = {}
+        self._step = PIXEL_STEP
+        self._since_keyframe = 0
+        # Latest keyframe and the deltas after it, for late joiners
+        self._backlog: List[bytes] = []
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self)
+        with self._lock:
+            if self.closed:
+                subscription.closed = True
+            else:
+                subscription._pending.extend(self._backlog)
+                if self._backlog:
+                    subscription._ready.set()
+                self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+            subscription.closed = True
+            subscription._wake()
+
+    def publish(self, detections: FrameDetections, analytics: Dict[str, Any], match_time: float):
+        """Send one processed frame to every subscriber, as a delta or a keyframe"""
+        with self._lock:
+            if not self._subscribers:
+                self._cells = None
+                self._backlog = []
+                return
+            self.seq += 1
+            step = PITCH_STEP if detections.pitch is not None else PIXEL_STEP
+            cells = player_cells(detections, step)
+
+            if self._cells is None or step != self._step or self._since_keyframe + 1 >= self.keyframe_interval:
+                event = sse_event('keyframe', self.seq, {
+                    'seq': self.seq,
+                    'match_time': match_time,
+                    'units': 'metres' if step == PITCH_STEP else 'pixels',
+                    'step': step,
+                    'players': [[track_id, x, y, TEAM_LABELS[team]] for track_id, (x, y, team) in cells.items()],
+                    'analytics': analytics
+                })
+                self._backlog = [event]
+                self._since_keyframe = 0
+                self.keyframes += 1
+            else:
+                event = sse_event('delta', self.seq, self._delta(cells, analytics, match_time))
+                self._backlog.append(event)
+                self._since_keyframe += 1
+
+            self._cells, self._analytics, self._step = cells, analytics, step
+            for subscription in self._subscribers:
+                subscription._push(event, self._backlog)
+
+    def _delta(self, cells: Cells, analytics: Dict[str, Any], match_time: float) -> Dict[str, Any]:
+        moved, entered = [], []
+        for track_id, (x, y, team) in cells.items():
+            previous = self._cells.get(track_id)
+            if previous is None or previous[2] != team:
+                entered.append([track_id, x, y, TEAM_LABELS[team]])
+            elif previous[:2] != (x, y):
+                moved.append([track_id, x - previous[0], y - previous[1]])
+        left = [track_id for track_id in self._cells if track_id not in cells]
+        delta = {'seq': self.seq, 'match_time': match_time}
+        # Empty parts are left out entirely
+        for name, value in (('moved', moved), ('entered', entered), ('left', left),
+                            ('analytics', changed_fields(self._analytics, analytics))):
+            if value:
+                delta[name] = value
+        return delta
+
+    def close(self):
+        """End every subscription, for a session that was removed or expired"""
+        with self._lock:
+            self.closed = True
+            for subscription in self._subscribers:
+                subscription.closed = True
+                subscription._wake()
+            self._subscribers = []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'updates': self.seq,
+                'keyframes': self.keyframes,
+                'keyframe_interval': self.keyframe_interval,
+                'skipped': sum(subscription.skipped for subscription in self._subscribers)
+            }
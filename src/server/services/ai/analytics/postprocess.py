@@ -0,0 +1,145 @@
+"""
+Local detection post-processing
+
+Detectors are asked for raw, loosely-thresholded detections; confidence
+filtering, class filtering and non-maximum suppression happen here, on
+NumPy arrays covering a whole batch of frames. Because the raw responses
+don't depend on the thresholds, cached detections can be re-filtered at
+any confidence/overlap without another detection call. Survivors come
+out as columnar FrameDetections sliced from the packed arrays, so no
+per-player dict is built on the way.
+
+NMS is exact greedy NMS, vectorized across frames: boxes are ranked per
+frame, the (N, K, K) same-class IoU matrix is computed once, and the
+greedy pass walks the K ranks with every frame advancing in lockstep.
+"""
+
+from typing import Dict, Any, List, Optional, Sequence
+import numpy as np
+
+from analytics.detections import FrameDetections
+
+# Bounded candidate count per frame keeps the IoU matrix small
+MAX_CANDIDATES = 300
+# Frames per NMS chunk are sized to keep the IoU matrix near this many entries
+MAX_IOU_ENTRIES = 4_000_000
+
+
+class DetectionFilter:
+    """Thresholds applied to raw detections (Roboflow's 0-100 scale for confidence and overlap)"""
+
+    __slots__ = ('confidence', 'overlap', 'classes')
+
+    def __init__(self, confidence: float = 40, overlap: float = 30, classes: Optional[Sequence[str]] = None):
+        if not 0 <= confidence <= 100 or not 0 <= overlap <= 100:
+            raise ValueError('confidence and overlap must be between 0 and 100')
+        self.confidence = confidence
+        self.overlap = overlap
+        self.classes = frozenset(classes) if classes else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'confidence': self.confidence,
+            'overlap': self.overlap,
+            'classes': sorted(self.classes) if self.classes else None
+        }
+
+
+def pack(responses: List[Optional[Dict[str, Any]]], max_candidates: int = MAX_CANDIDATES):
+    """Pack per-frame predictions into (N, K) arrays; returns boxes, scores, class ids, valid, source index, class names"""
+    predictions = [response.get('predictions', []) if response else [] for response in responses]
+    n_frames = len(predictions)
+    k = min(max((len(p) for p in predictions), default=0), max_candidates)
+
+    boxes = np.zeros((n_frames, k, 4))
+    scores = np.full((n_frames, k), -np.inf)
+    class_ids = np.zeros((n_frames, k), dtype=np.int64)
+    source = np.full((n_frames, k), -1, dtype=np.int64)
+    names: Dict[str, int] = {}
+
+    for i, frame in enumerate(predictions):
+        if not frame:
+            continue
+        frame_scores = np.array([p['confidence'] for p in frame], dtype=float)
+        top = np.argsort(-frame_scores, kind='stable')[:k]
+        count = len(top)
+        boxes[i, :count] = [[frame[j]['x'], frame[j]['y'], frame[j]['width'], frame[j]['height']] for j in top]
+        scores[i, :count] = frame_scores[top]
+        class_ids[i, :count] = [names.setdefault(frame[j].get('class', 'player'), len(names)) for j in top]
+        source[i, :count] = top
+
+    return boxes, scores, class_ids, source >= 0, source, names
+
+
+def suppress(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, valid: np.ndarray,
+             iou_threshold: float) -> np.ndarray:
+    """Exact greedy per-class NMS for every frame at once; returns the (N, K) keep mask"""
+    n_frames, k = valid.shape
+    if k == 0:
+        return valid.copy()
+
+    # Rank boxes by score within each frame
+    order = np.argsort(-np.where(valid, scores, -np.inf), axis=1, kind='stable')
+    ranked = np.take_along_axis(boxes, order[..., None], axis=1)
+    ranked_valid = np.take_along_axis(valid, order, axis=1)
+    ranked_class = np.take_along_axis(class_ids, order, axis=1)
+
+    lo = ranked[..., :2] - ranked[..., 2:] / 2
+    hi = ranked[..., :2] + ranked[..., 2:] / 2
+    size = np.clip(np.minimum(hi[:, :, None], hi[:, None]) - np.maximum(lo[:, :, None], lo[:, None]), 0, None)
+    inter = size[..., 0] * size[..., 1]
+    area = ranked[..., 2] * ranked[..., 3]
+    iou = inter / np.maximum(area[:, :, None] + area[:, None, :] - inter, 1e-9)
+
+    # overlaps[n, a, b]: higher-ranked a would suppress lower-ranked b
+    overlaps = (iou > iou_threshold) & (ranked_class[:, :, None] == ranked_class[:, None, :])
+    overlaps &= ranked_valid[:, :, None] & ranked_valid[:, None, :]
+    overlaps &= np.triu(np.ones((k, k), dtype=bool), k=1)
+
+    keep = ranked_valid.copy()
+    # Only ranks that overlap something in some frame can change the outcome
+    for rank in np.nonzero(overlaps.any(axis=(0, 2)))[0]:
+        keep &= ~(keep[:, rank, None] & overlaps[:, rank, :])
+
+    result = np.zeros_like(keep)
+    np.put_along_axis(result, order, keep, axis=1)
+    return result
+
+
+def filter_batch(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, valid: np.ndarray,
+                 names: Dict[str, int], detection_filter: DetectionFilter) -> np.ndarray:
+    """Confidence, class and NMS filtering over packed arrays; returns the (N, K) keep mask"""
+    keep = valid & (scores >= detection_filter.confidence / 100)
+    if detection_filter.classes is not None:
+        allowed = np.array([name in detection_filter.classes for name in names], dtype=bool)
+        keep &= allowed[class_ids] if len(allowed) else False
+
+    n_frames, k = keep.shape
+    if k == 0:
+        return keep
+    # Chunk frames so the IoU matrix stays bounded for dense raw outputs
+    chunk = max(1, MAX_IOU_ENTRIES // (k * k))
+    for start in range(0, n_frames, chunk):
+        window = slice(start, start + chunk)
+        keep[window] = suppress(boxes[window], scores[window], class_ids[window], keep[window],
+                                detection_filter.overlap / 100)
+    return keep
+
+
+def filter_detections(responses: List[Optional[Dict[str, Any]]],
+                      detection_filter: DetectionFilter) -> List[Optional[FrameDetections]]:
+    """Apply a DetectionFilter to raw per-frame responses; None stays None for failed frames"""
+    boxes, scores, class_ids, valid, source, names = pack(responses)
+    keep = filter_batch(boxes, scores, class_ids, valid, names, detection_filter)
+    class_names = tuple(names)
+
+    filtered = []
+    for i, response in enumerate(responses):
+        if response is None:
+            filtered.append(None)
+            continue
+        # Preserve the detector's original order among the survivors
+        slots = np.nonzero(keep[i])[0]
+        slots = slots[np.argsort(source[i, slots])]
+        filtered.append(FrameDetections(boxes[i, slots], scores[i, slots], class_ids[i, slots], class_names))
+    return filtered
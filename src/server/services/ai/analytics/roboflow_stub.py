@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for detect.roboflow.com
+
+Serves Roboflow-shaped detection responses with configurable latency,
+error and stall rates so the detector client can be load-tested offline:
+
+    python -m analytics.roboflow_stub --port 9001 --latency-ms 120 --error-rate 0.05
+    ROBOFLOW_API_URL=http://localhost:9001 ROBOFLOW_API_KEY=stub python player-analytics.py
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+
+class StubConfig:
+    """Latency and failure profile for the stand-in server"""
+
+    def __init__(self, latency_ms: float = 80.0, jitter_ms: float = 20.0,
+                 error_rate: float = 0.0, stall_rate: float = 0.0, stall_ms: float = 30000.0,
+                 seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_ms = stall_ms
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self) -> Dict[str, Any]:
+        """Pick the outcome for one request"""
+        with self.lock:
+            roll = self.random.random()
+            latency = max(0.0, self.random.gauss(self.latency_ms, self.jitter_ms))
+            players = self.random.randint(10, 22)
+            seed = self.random.getrandbits(32)
+
+        if roll < self.stall_rate:
+            return {'kind': 'stall', 'delay': self.stall_ms / 1000}
+        if roll < self.stall_rate + self.error_rate:
+            return {'kind': 'error', 'delay': latency / 1000}
+        return {'kind': 'ok', 'delay': latency / 1000, 'players': players, 'seed': seed}
+
+
+def make_predictions(count: int, seed: int, width: int = 1280, height: int = 720) -> Dict[str, Any]:
+    """Build a Roboflow-shaped response body"""
+    rng = random.Random(seed)
+    predictions = []
+    for i in range(count):
+        predictions.append({
+            'x': rng.uniform(40, width - 40),
+            'y': rng.uniform(40, height - 40),
+            'width': rng.uniform(25, 60),
+            'height': rng.uniform(60, 120),
+            'confidence': rng.uniform(0.45, 0.98),
+            'class': 'referee' if i == 0 else ('goalkeeper' if i in (1, 2) else 'player'),
+            'class_id': 0
+        })
+    return {
+        'time': 0.0,
+        'image': {'width': width, 'height': height},
+        'predictions': predictions
+    }
+
+
+def make_handler(config: StubConfig):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(length)
+
+            outcome = config.draw()
+            time.sleep(outcome['delay'])
+
+            if outcome['kind'] == 'error':
+                self._send(503, {'message': 'stub upstream error'})
+                return
+            if outcome['kind'] == 'stall':
+                self._send(504, {'message': 'stub upstream stalled'})
+                return
+
+            body = make_predictions(outcome['players'], outcome['seed'])
+            body['time'] = outcome['delay']
+            self._send(200, body)
+
+        def _send(self, status: int, body: Dict[str, Any]):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def serve(host: str, port: int, config: StubConfig) -> ThreadingHTTPServer:
+    """Create the stand-in server (call serve_forever() to run it)"""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for detect.roboflow.com')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9001)
+    parser.add_argument('--latency-ms', type=float, default=80.0)
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--stall-rate', type=float, default=0.0, help='fraction of requests held for --stall-ms')
+    parser.add_argument('--stall-ms', type=float, default=30000.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                        args.stall_rate, args.stall_ms, args.seed)
+    server = serve(args.host, args.port, config)
+    print(f"Roboflow stand-in listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,93 @@
+"""
+Motion-adaptive frame sampling
+
+Before a frame goes to the detector it is compared with the last frame
+that did: both are decoded as small greyscale thumbnails (JPEG draft mode
+decodes at 1/8 scale directly, so this costs a fraction of a full decode)
+and the share of thumbnail pixels that changed noticeably is the motion
+score. Comparing against the last detected frame rather than the previous
+one means slow movement still accumulates into a detection. A frame is
+detected when motion exceeds the threshold or the last detection is
+max_gap frames back; the rest are filled in from the tracker's prediction.
+"""
+
+import threading
+from typing import Dict, Any, Optional
+import numpy as np
+from PIL import Image
+
+from analytics.uploads import buffer_file
+
+THUMBNAIL_WIDTH = 160
+# Per-pixel change (0-1 grey level) that counts as motion rather than compression noise
+PIXEL_DELTA = 0.08
+DEFAULT_THRESHOLD = 0.005
+DEFAULT_MAX_GAP = 5
+
+
+def thumbnail(jpeg_data: bytes, width: int = THUMBNAIL_WIDTH) -> np.ndarray:
+    """Small greyscale version of a frame, 0-1 float32"""
+    image = Image.open(buffer_file(jpeg_data))
+    height = max(1, round(width * image.size[1] / max(image.size[0], 1)))
+    image.draft('L', (width, height))
+    image = image.convert('L').resize((width, height), Image.BILINEAR)
+    return np.asarray(image, dtype=np.float32) / 255.0
+
+
+def motion(previous: np.ndarray, current: np.ndarray, pixel_delta: float = PIXEL_DELTA) -> float:
+    """Fraction of thumbnail pixels that changed by more than pixel_delta"""
+    return float(np.mean(np.abs(current - previous) > pixel_delta))
+
+
+class MotionSampler:
+    """Decides per frame whether detection is needed; threshold <= 0 detects every frame"""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, max_gap: int = DEFAULT_MAX_GAP):
+        if max_gap < 1:
+            raise ValueError('max_gap must be at least 1')
+        self.threshold = threshold
+        self.max_gap = max_gap
+        self._keyframe: Optional[np.ndarray] = None
+        self._gap = 0
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.detected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def select(self, jpeg_data: bytes, current: Optional[np.ndarray] = None) -> bool:
+        """True if this frame should go to the detector; current is its thumbnail when already computed"""
+        if not self.enabled:
+            current = None
+        elif current is None:
+            current = thumbnail(jpeg_data)
+        with self._lock:
+            self.frames += 1
+            detect = (
+                current is None
+                or self._keyframe is None
+                or self._keyframe.shape != current.shape
+                or self._gap + 1 >= self.max_gap
+                or motion(self._keyframe, current) > self.threshold
+            )
+            if detect:
+                self._keyframe = current
+                self._gap = 0
+                self.detected += 1
+            else:
+                self._gap += 1
+            return detect
+
+    def summary(self) -> Dict[str, Any]:
+        skipped = self.frames - self.detected
+        return {
+            'enabled': self.enabled,
+            'threshold': self.threshold,
+            'max_gap': self.max_gap,
+            'frames': self.frames,
+            'detector_calls': self.detected,
+            'skipped': skipped,
+            'reduction_ratio': skipped / self.frames if self.frames else 0.0
+        }
@@ -0,0 +1,168 @@
+"""
+Match sessions
+
+A session holds the per-match state that must survive across frames
+(player tracker, kit colours, motion sampler, kinematics, heatmaps,
+formation windows). Frames for one session are processed under the
+session lock so tracking always sees them in order. A session bound to a
+calibrated camera measures in pitch metres instead of pixels. Each
+session also has a live feed that viewers can subscribe to. The feed is
+closed when the session is removed, evicted or expires.
+"""
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+
+from analytics.tracking import PlayerTracker
+from analytics.kinematics import KinematicsEngine
+from analytics.heatmaps import HeatmapAccumulator, DEFAULT_RESOLUTION
+from analytics.formations import FormationSmoother
+from analytics.compactness import TEAMS
+from analytics.teams import TeamClassifier
+from analytics.sampling import MotionSampler, DEFAULT_THRESHOLD, DEFAULT_MAX_GAP
+from analytics.detections import FrameDetections
+from analytics.live import LiveFeed, DEFAULT_KEYFRAME_INTERVAL
+
+# Without calibration, assume a wide shot spans roughly the pitch length
+DEFAULT_VISIBLE_PITCH_M = 105.0
+
+
+class SessionNotFound(KeyError):
+    """Raised when a session ID is unknown or has expired"""
+
+
+class MatchSession:
+    """Per-match analysis state"""
+
+    def __init__(self, session_id: str, fps: float = 25.0, camera_id: Optional[str] = None,
+                 metres_per_pixel: Optional[float] = None,
+                 heatmap_resolution: Tuple[int, int] = DEFAULT_RESOLUTION, formation_window: int = 25,
+                 team_colors: Optional[Dict[str, str]] = None, motion_threshold: float = DEFAULT_THRESHOLD,
+                 max_gap: int = DEFAULT_MAX_GAP, live_keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL):
+        self.session_id = session_id
+        self.fps = fps
+        self.camera_id = camera_id
+        self.metres_per_pixel = metres_per_pixel
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+        self.frames_processed = 0
+        self.match_time = 0.0
+        self.lock = threading.Lock()
+        self.tracker = PlayerTracker()
+        self.teams = TeamClassifier(team_colors)
+        self.sampler = MotionSampler(motion_threshold, max_gap)
+        self.last_detections: Optional[FrameDetections] = None
+        self.kinematics = KinematicsEngine()
+        self.heatmaps = HeatmapAccumulator(heatmap_resolution)
+        self.formations = {team: FormationSmoother(formation_window) for team in TEAMS}
+        self.live = LiveFeed(live_keyframe_interval)
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def advance(self, frame_size: Tuple[int, int], timestamp: Optional[float] = None) -> float:
+        """Move the match clock to the next frame and return its timestamp in seconds"""
+        if self.metres_per_pixel is None:
+            self.metres_per_pixel = DEFAULT_VISIBLE_PITCH_M / frame_size[0]
+        if not self.frames_processed:
+            self.match_time = timestamp if timestamp is not None else 0.0
+        else:
+            # Untimed frames follow the clock wherever streams or timestamps left it, and it never runs backwards
+            following = timestamp if timestamp is not None else self.match_time + 1 / self.fps
+            self.match_time = max(self.match_time, following)
+        self.frames_processed += 1
+        return self.match_time
+
+    def predicted_detections(self) -> FrameDetections:
+        """The last detected frame's players moved along the tracker's prediction, for a frame that skipped detection"""
+        live = self.tracker.predict()
+        last = self.last_detections
+        if last is None or last.track_ids is None:
+            predicted = FrameDetections.empty()
+            predicted.track_ids = np.zeros(0, dtype=np.int64)
+            return predicted
+        keep = np.isin(last.track_ids, live)
+        track_ids = last.track_ids[keep]
+        predicted = FrameDetections(
+            self.tracker.boxes_for(track_ids), last.confidence[keep], last.class_ids[keep],
+            last.class_names, last.teams[keep]
+        )
+        predicted.track_ids = track_ids
+        return predicted
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'fps': self.fps,
+            'camera_id': self.camera_id,
+            'created_at': self.created_at,
+            'frames_processed': self.frames_processed,
+            'match_time': self.match_time,
+            'metres_per_pixel': self.metres_per_pixel,
+            'tracking': self.tracker.summary(),
+            'sampling': self.sampler.summary(),
+            'teams': self.teams.summary(),
+            'kinematics': self.kinematics.summary(),
+            'heatmaps': self.heatmaps.summary(),
+            'formations': {team: smoother.summary() for team, smoother in self.formations.items()},
+            'live': self.live.stats()
+        }
+
+
+class SessionRegistry:
+    """Thread-safe registry of live sessions with idle expiry"""
+
+    def __init__(self, idle_timeout: float = 1800.0, max_sessions: int = 256):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: 'OrderedDict[str, MatchSession]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, session_id: Optional[str] = None, **config) -> MatchSession:
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            if session_id in self._sessions:
+                raise ValueError(f"Session {session_id} already exists")
+            # Evict the least recently used session rather than refusing work
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)[1].live.close()
+            session = MatchSession(session_id, **config)
+            self._sessions[session_id] = session
+            return session
+
+    def get(self, session_id: str) -> MatchSession:
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise SessionNotFound(session_id)
+            self._sessions.move_to_end(session_id)
+            session.touch()
+            return session
+
+    def remove(self, session_id: str) -> MatchSession:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                raise SessionNotFound(session_id)
+            session.live.close()
+            return session
+
+    def close_feeds(self):
+        """End every session's live feed, for a worker that is shutting down"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.live.close()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_active < cutoff]:
+            self._sessions.pop(session_id).live.close()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
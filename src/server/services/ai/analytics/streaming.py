@@ -0,0 +1,237 @@
+"""
+Streaming video ingestion
+
+An upload is consumed while it arrives. JPEG frames are cut out of the
+byte stream incrementally: MJPEG (multipart/x-mixed-replace or plain
+concatenated JPEGs) is split on JPEG markers directly, and other
+containers are transcoded to MJPEG by an ffmpeg subprocess when one is
+available. Frames then flow through a chain of stages, each on its own
+thread, linked by bounded queues. A full queue blocks whatever feeds it,
+all the way back to reading the upload, so memory stays flat however long
+the clip is, and a slow reader of the results slows the upload down
+instead of buffering it. Each stage takes whatever is waiting (up to a
+batch size) in one call, so batching costs no latency when lightly loaded.
+"""
+
+import re
+import queue
+import threading
+import subprocess
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+CHUNK_SIZE = 64 * 1024
+MAX_FRAME_BYTES = 8 * 1024 * 1024
+QUEUE_SIZE = 8
+BATCH_SIZE = 8
+MJPEG_TYPES = ('image/jpeg', 'video/x-motion-jpeg', 'video/mjpeg', 'application/octet-stream')
+
+SOI = b'\xff\xd8\xff'
+# Entropy-coded data byte-stuffs 0xFF, so FFD8/FFD9 there can only be a new image or the end of this one
+SCAN_END = re.compile(b'\xff[\xd8\xd9]')
+SOS = 0xDA
+# Markers without a length field
+STANDALONE = {0x01} | set(range(0xD0, 0xD8))
+
+
+def read_chunks(stream, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_jpegs(chunks: Iterable[bytes], max_frame_bytes: int = MAX_FRAME_BYTES) -> Iterator[bytes]:
+    """Yield complete JPEG frames from a byte stream, skipping anything between them (multipart headers, junk)"""
+    buffer = bytearray()
+    pos = 0
+    in_frame = False
+    in_scan = False
+
+    for chunk in chunks:
+        buffer += chunk
+        while True:
+            if not in_frame:
+                start = buffer.find(SOI)
+                if start < 0:
+                    # Keep a possible partial marker for the next chunk
+                    del buffer[:max(0, len(buffer) - 2)]
+                    break
+                del buffer[:start]
+                pos, in_frame, in_scan = 2, True, False
+
+            if in_scan:
+                match = SCAN_END.search(buffer, pos)
+                if match is None:
+                    pos = max(pos, len(buffer) - 1)
+                elif match.group() == b'\xff\xd8':
+                    # Truncated frame: start over at the next image
+                    del buffer[:match.start()]
+                    in_frame = False
+                    continue
+                else:
+                    end = match.end()
+                    frame = bytes(buffer[:end]) if end <= max_frame_bytes else None
+                    del buffer[:end]
+                    in_frame = False
+                    if frame is not None:
+                        yield frame
+                    continue
+            elif len(buffer) >= pos + 4 or (len(buffer) >= pos + 2 and buffer[pos + 1] in STANDALONE):
+                # Walk header segments by their lengths, so embedded thumbnails are skipped whole
+                if buffer[pos] != 0xFF:
+                    del buffer[:1]
+                    in_frame = False
+                    continue
+                marker = buffer[pos + 1]
+                if marker == 0xFF:
+                    pos += 1
+                elif marker in STANDALONE:
+                    pos += 2
+                else:
+                    pos += 2 + int.from_bytes(buffer[pos + 2:pos + 4], 'big')
+                    in_scan = marker == SOS
+                continue
+
+            if pos > max_frame_bytes:
+                # Oversized or corrupt: drop it and resynchronize on the next SOI
+                del buffer[:pos]
+                in_frame = False
+                continue
+            break
+
+
+def transcode(chunks: Iterable[bytes], ffmpeg: str, max_frame_bytes: int = MAX_FRAME_BYTES) -> Iterator[bytes]:
+    """Decode any container ffmpeg can read from a pipe (WebM, MPEG-TS, fragmented MP4) into JPEG frames"""
+    process = subprocess.Popen(
+        [ffmpeg, '-loglevel', 'error', '-i', 'pipe:0', '-f', 'image2pipe', '-c:v', 'mjpeg', '-q:v', '3', 'pipe:1'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+
+    def pump():
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    threading.Thread(target=pump, daemon=True).start()
+    try:
+        yield from iter_jpegs(read_chunks(process.stdout), max_frame_bytes)
+    finally:
+        process.kill()
+        process.wait()
+
+
+def supported(mimetype: str, ffmpeg: Optional[str] = None) -> bool:
+    return mimetype in MJPEG_TYPES or mimetype.startswith('multipart/') or (
+        ffmpeg is not None and mimetype.startswith('video/'))
+
+
+def frames_from_upload(chunks: Iterable[bytes], mimetype: str, ffmpeg: Optional[str] = None,
+                       max_frame_bytes: int = MAX_FRAME_BYTES) -> Iterator[bytes]:
+    """JPEG frames of an uploaded stream, decoded lazily"""
+    if mimetype in MJPEG_TYPES or mimetype.startswith('multipart/'):
+        return iter_jpegs(chunks, max_frame_bytes)
+    if ffmpeg is not None and mimetype.startswith('video/'):
+        return transcode(chunks, ffmpeg, max_frame_bytes)
+    raise ValueError(f"Unsupported stream type: {mimetype}")
+
+
+class _Failure:
+    __slots__ = ('error',)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+_STOPPED = object()
+
+
+def pipeline(source: Iterable[Any], stages: List[Callable[[List[Any]], List[Any]]],
+             queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE) -> Iterator[Any]:
+    """Run the source and each stage on its own thread behind bounded queues; yields the last stage's items in order"""
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def put(target: queue.Queue, item) -> bool:
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(source_queue: queue.Queue):
+        while not stop.is_set():
+            try:
+                return source_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _STOPPED
+
+    def feed():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+        except Exception as e:
+            put(queues[0], _Failure(e))
+            return
+        put(queues[0], _DONE)
+
+    def work(stage, inbox: queue.Queue, outbox: queue.Queue):
+        while True:
+            item = get(inbox)
+            if item is _STOPPED:
+                return
+            batch, final = [], None
+            while True:
+                if item is _DONE or isinstance(item, _Failure):
+                    final = item
+                    break
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    break
+                try:
+                    item = inbox.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    outputs = stage(batch)
+                except Exception as e:
+                    put(outbox, _Failure(e))
+                    return
+                for output in outputs:
+                    if not put(outbox, output):
+                        return
+            if final is not None:
+                put(outbox, final)
+                return
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    threads += [threading.Thread(target=work, args=(stage, queues[i], queues[i + 1]), daemon=True)
+                for i, stage in enumerate(stages)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # Also reached when the consumer goes away early; unblocks every stage
+        stop.set()
@@ -0,0 +1,229 @@
+"""
+Jersey-colour team classification
+
+Every player box of a frame is sampled at once: a fixed grid of points
+over each player's torso is gathered from the decoded frame with a single
+fancy-index, grass-coloured samples are masked out, and the rest average
+into one RGB feature per player. Features are clustered into two teams,
+with referees and goalkeepers left as outliers ('other'). Within a match
+session the team centroids are cached, so later frames only need a
+nearest-centroid lookup; the centroids drift slowly with lighting and are
+refitted if most players stop matching them.
+"""
+
+import threading
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+from analytics.detections import FrameDetections, TEAMS, OTHER_CODE
+from analytics.uploads import buffer_file
+# Decode at roughly this width; jersey colour doesn't need full resolution
+DECODE_WIDTH = 640
+# Torso sample grid, as fractions of the box (x across, y down from the top)
+GRID = 6
+TORSO_X = (0.3, 0.7)
+TORSO_Y = (0.15, 0.5)
+MIN_PLAYERS = 6
+# Clusters closer than this (RGB in 0-1) are not two different kits
+MIN_SEPARATION = 0.12
+OUTLIER_FACTOR = 3.0
+MIN_OUTLIER_DISTANCE = 0.08
+CENTROID_DRIFT = 0.05
+REFIT_OUTLIER_RATIO = 0.5
+
+
+def decode_frame(jpeg_data: bytes, width: int = DECODE_WIDTH) -> Tuple[np.ndarray, float]:
+    """Decode a frame at reduced scale (JPEG draft mode) and return it with the scale factor"""
+    image = Image.open(buffer_file(jpeg_data))
+    full_width = image.size[0]
+    image.draft('RGB', (width, int(width * image.size[1] / max(full_width, 1))))
+    pixels = np.asarray(image.convert('RGB'))
+    return pixels, pixels.shape[1] / full_width
+
+
+def jersey_features(pixels: np.ndarray, boxes: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    """(D, 3) mean torso colour in 0-1 RGB for (D, 4) cx/cy/w/h boxes; NaN where the box shows only grass"""
+    if len(boxes) == 0:
+        return np.zeros((0, 3))
+    boxes = np.asarray(boxes, dtype=float) * scale
+    height, width = pixels.shape[:2]
+
+    steps = (np.arange(GRID) + 0.5) / GRID
+    fx = TORSO_X[0] + steps * (TORSO_X[1] - TORSO_X[0])
+    fy = TORSO_Y[0] + steps * (TORSO_Y[1] - TORSO_Y[0])
+    left = boxes[:, 0] - boxes[:, 2] / 2
+    top = boxes[:, 1] - boxes[:, 3] / 2
+    xs = left[:, None, None] + fx[None, None, :] * boxes[:, 2, None, None]
+    ys = top[:, None, None] + fy[None, :, None] * boxes[:, 3, None, None]
+    xs = np.clip(xs, 0, width - 1).astype(np.int64)
+    ys = np.clip(ys, 0, height - 1).astype(np.int64)
+
+    # (D, GRID, GRID, 3) samples for every player in one gather
+    samples = pixels[ys, xs].reshape(len(boxes), -1, 3).astype(float) / 255.0
+    r, g, b = samples[..., 0], samples[..., 1], samples[..., 2]
+    kit = ~((g > r + 0.05) & (g > b + 0.05))
+    weights = kit[..., None].astype(float)
+    count = weights.sum(axis=1)
+    return np.divide((samples * weights).sum(axis=1), count,
+                     out=np.full((len(boxes), 3), np.nan), where=count > 0)
+
+
+def kmeans(features: np.ndarray, k: int, iterations: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """Deterministic k-means: farthest-point seeding from the sample nearest the median"""
+    median = np.median(features, axis=0)
+    seeds = [int(np.argmin(np.linalg.norm(features - median, axis=1)))]
+    for _ in range(1, k):
+        dist = np.min(np.linalg.norm(features[:, None, :] - features[seeds][None], axis=2), axis=1)
+        seeds.append(int(np.argmax(dist)))
+    centroids = features[seeds].copy()
+
+    for _ in range(iterations):
+        dist = np.linalg.norm(features[:, None, :] - centroids[None], axis=2)
+        labels = np.argmin(dist, axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, features)
+        updated = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centroids)
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    return centroids, labels
+
+
+def fit_teams(features: np.ndarray) -> Optional[Tuple[np.ndarray, float]]:
+    """Two kit centroids (brighter kit first) and an outlier radius, or None if kits aren't separable"""
+    if len(features) < MIN_PLAYERS:
+        return None
+
+    # A third cluster soaks up referees and keepers when they're few
+    centroids, labels = kmeans(features, 3)
+    counts = np.bincount(labels, minlength=3)
+    if counts.min() <= max(3, len(features) // 5):
+        keep = np.argsort(counts)[1:]
+        inliers = np.isin(labels, keep)
+        centroids, _ = kmeans(features[inliers], 2)
+    else:
+        centroids, _ = kmeans(features, 2)
+
+    if np.linalg.norm(centroids[0] - centroids[1]) < MIN_SEPARATION:
+        return None
+    centroids = centroids[np.argsort(-centroids.sum(axis=1))]
+    dist = np.min(np.linalg.norm(features[:, None, :] - centroids[None], axis=2), axis=1)
+    radius = max(MIN_OUTLIER_DISTANCE, OUTLIER_FACTOR * float(np.median(dist)))
+    return centroids, radius
+
+
+def assign(features: np.ndarray, centroids: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Nearest-centroid team index per player (-1 for outliers) and the distances"""
+    dist = np.linalg.norm(features[:, None, :] - centroids[None], axis=2)
+    nearest = np.argmin(dist, axis=1)
+    distance = dist[np.arange(len(features)), nearest]
+    return np.where(distance <= radius, nearest, -1), distance
+
+
+def parse_color(value: str) -> np.ndarray:
+    """'#rrggbb' -> 0-1 RGB"""
+    value = value.lstrip('#')
+    if len(value) != 6:
+        raise ValueError(f"Invalid colour: {value}")
+    return np.array([int(value[i:i + 2], 16) for i in (0, 2, 4)]) / 255.0
+
+
+class TeamClassifier:
+    """Kit centroids for one match; fitted on the first usable frame, then looked up"""
+
+    def __init__(self, team_colors: Optional[Dict[str, str]] = None):
+        self.centroids: Optional[np.ndarray] = None
+        self.radius = MIN_OUTLIER_DISTANCE
+        self.seed_colors = None
+        if team_colors:
+            self.seed_colors = np.stack([parse_color(team_colors[team]) for team in TEAMS])
+        self.fits = 0
+        self.frames = 0
+        self._lock = threading.Lock()
+
+    def classify(self, features: np.ndarray) -> Optional[np.ndarray]:
+        """Team code per player (index into TEAM_LABELS, -1 where no kit is visible), or None while kits can't be told apart"""
+        seen = ~np.isnan(features).any(axis=1)
+        codes = self._classify(features[seen])
+        if codes is None:
+            return None
+        result = np.full(len(features), -1, dtype=np.int8)
+        result[seen] = codes
+        return result
+
+    def _classify(self, features: np.ndarray) -> Optional[np.ndarray]:
+        if len(features) == 0:
+            return np.zeros(0, dtype=np.int8)
+        with self._lock:
+            self.frames += 1
+            if self.centroids is not None:
+                labels, distance = assign(features, self.centroids, self.radius)
+                if np.mean(labels < 0) <= REFIT_OUTLIER_RATIO:
+                    self._drift(features, labels)
+                    return np.where(labels >= 0, labels, OTHER_CODE)
+
+            fitted = fit_teams(features)
+            if fitted is None:
+                return None
+            centroids, radius = fitted
+            if self.seed_colors is not None:
+                # Name the kits after the closest configured colours
+                cost = np.linalg.norm(centroids[:, None, :] - self.seed_colors[None], axis=2)
+                if cost[0, 1] + cost[1, 0] < cost[0, 0] + cost[1, 1]:
+                    centroids = centroids[::-1]
+            self.centroids, self.radius = centroids, radius
+            self.fits += 1
+            labels, _ = assign(features, centroids, radius)
+            return np.where(labels >= 0, labels, OTHER_CODE)
+
+    def _drift(self, features: np.ndarray, labels: np.ndarray):
+        for team in range(len(TEAMS)):
+            members = labels == team
+            if members.any():
+                self.centroids[team] += CENTROID_DRIFT * (features[members].mean(axis=0) - self.centroids[team])
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'fitted': self.centroids is not None,
+            'fits': self.fits,
+            'frames': self.frames,
+            'centroids': {team: self.centroids[i].round(3).tolist() for i, team in enumerate(TEAMS)}
+                         if self.centroids is not None else None
+        }
+
+
+def frame_features(jpeg_data: bytes, boxes: np.ndarray) -> np.ndarray:
+    """Jersey features for one frame's boxes; pure, so it can run in a worker process"""
+    if len(boxes) == 0:
+        return np.zeros((0, 3))
+    pixels, scale = decode_frame(jpeg_data)
+    return jersey_features(pixels, boxes, scale)
+
+
+def assign_teams(detections: FrameDetections, features: np.ndarray,
+                 classifier: Optional[TeamClassifier] = None) -> bool:
+    """Relabel team codes from the player rows' jersey features, the rest 'other'; False (untouched) if kits can't be separated"""
+    players = detections.players
+    if not players.any():
+        return False
+    # Throwaway classifier when there's no session to cache centroids in
+    codes = (classifier or TeamClassifier()).classify(features)
+    if codes is None:
+        return False
+    teams = detections.teams[players]
+    seen = codes >= 0
+    teams[seen] = codes[seen]
+    detections.teams[players] = teams
+    # The ball and referees are on neither team, so they stay out of team metrics
+    detections.teams[~players] = OTHER_CODE
+    return True
+
+
+def classify_frame(jpeg_data: bytes, detections: FrameDetections,
+                   classifier: Optional[TeamClassifier] = None) -> bool:
+    """Relabel detections' team codes from jersey colour; False (codes untouched) if kits can't be separated"""
+    if len(detections) == 0:
+        return False
+    return assign_teams(detections, frame_features(jpeg_data, detections.boxes[detections.players]), classifier)
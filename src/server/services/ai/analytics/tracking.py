@@ -0,0 +1,189 @@
+"""
+Multi-object player tracker
+
+Keeps persistent player IDs across a frame sequence. Tracks carry a
+constant-velocity prediction; detections are associated with tracks by a
+cost that combines IoU and centroid distance, using mutual best matches
+first and a Hungarian assignment only for the contested remainder. Tracks
+are born for unmatched detections and die after max_age missed frames.
+Frames that skip detection only advance the prediction (predict()).
+All per-frame work is vectorized over the track and detection arrays.
+"""
+
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+from analytics.assignment import linear_sum_assignment
+
+GATE_COST = 1e6
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (cx, cy, w, h) boxes: (T, 4) x (D, 4) -> (T, D)"""
+    a_min = a[:, None, :2] - a[:, None, 2:] / 2
+    a_max = a[:, None, :2] + a[:, None, 2:] / 2
+    b_min = b[None, :, :2] - b[None, :, 2:] / 2
+    b_max = b[None, :, :2] + b[None, :, 2:] / 2
+
+    overlap = np.clip(np.minimum(a_max, b_max) - np.maximum(a_min, b_min), 0, None)
+    intersection = overlap[..., 0] * overlap[..., 1]
+    area_a = (a[:, 2] * a[:, 3])[:, None]
+    area_b = (b[:, 2] * b[:, 3])[None, :]
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-9)
+
+
+class TrackSlots:
+    """Compact array rows for track IDs, handed out in first-seen order
+
+    The tracker never reuses an ID, so arrays indexed by raw ID would grow
+    with every track born over a match. Accumulators index by row instead,
+    and only grow with the tracks they have actually been given.
+    """
+
+    def __init__(self):
+        self.rows: Dict[int, int] = {}
+        self.track_ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.track_ids)
+
+    def assign(self, track_ids: np.ndarray) -> np.ndarray:
+        """Rows of (D,) track IDs, giving IDs not seen before the next free rows"""
+        rows = self.rows
+        for track_id in track_ids.tolist():
+            if track_id not in rows:
+                rows[track_id] = len(self.track_ids)
+                self.track_ids.append(track_id)
+        return np.fromiter((rows[track_id] for track_id in track_ids.tolist()), dtype=np.int64, count=len(track_ids))
+
+    def get(self, track_id: int) -> Optional[int]:
+        return self.rows.get(track_id)
+
+
+class PlayerTracker:
+    """IoU/centroid tracker with Hungarian assignment and track birth/death"""
+
+    def __init__(self, iou_threshold: float = 0.1, max_distance: float = 1.5,
+                 max_age: int = 25, position_gain: float = 0.85, velocity_gain: float = 0.4):
+        # max_distance is in box heights, so gating is resolution independent
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.position_gain = position_gain
+        self.velocity_gain = velocity_gain
+
+        self.boxes = np.zeros((0, 4))
+        self.velocity = np.zeros((0, 2))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self.next_id = 1
+        self.frames = 0
+
+    def update(self, detections: np.ndarray) -> np.ndarray:
+        """Associate (D, 4) cx/cy/w/h detections with tracks; return a track ID per detection"""
+        detections = np.asarray(detections, dtype=float).reshape(-1, 4)
+        self.frames += 1
+
+        # Constant-velocity prediction for every live track
+        self.boxes[:, :2] += self.velocity
+
+        track_idx, det_idx = self._associate(detections)
+        assigned = np.full(len(detections), -1, dtype=np.int64)
+
+        if len(track_idx):
+            residual = detections[det_idx, :2] - self.boxes[track_idx, :2]
+            self.boxes[track_idx, :2] += self.position_gain * residual
+            self.boxes[track_idx, 2:] = 0.5 * self.boxes[track_idx, 2:] + 0.5 * detections[det_idx, 2:]
+            self.velocity[track_idx] += self.velocity_gain * residual
+            self.hits[track_idx] += 1
+            assigned[det_idx] = self.ids[track_idx]
+
+        matched = np.zeros(len(self.ids), dtype=bool)
+        matched[track_idx] = True
+        self.misses[matched] = 0
+        self.misses[~matched] += 1
+        # Unmatched tracks coast on their prediction but slow down
+        self.velocity[~matched] *= 0.5
+
+        # Death: drop tracks that have been missing too long
+        alive = self.misses <= self.max_age
+        if not alive.all():
+            self._keep(alive)
+
+        # Birth: every unmatched detection starts a new track
+        unmatched = np.nonzero(assigned < 0)[0]
+        if len(unmatched):
+            new_ids = np.arange(self.next_id, self.next_id + len(unmatched), dtype=np.int64)
+            self.next_id += len(unmatched)
+            self.boxes = np.vstack([self.boxes, detections[unmatched]])
+            self.velocity = np.vstack([self.velocity, np.zeros((len(unmatched), 2))])
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.hits = np.concatenate([self.hits, np.ones(len(unmatched), dtype=np.int64)])
+            self.misses = np.concatenate([self.misses, np.zeros(len(unmatched), dtype=np.int64)])
+            assigned[unmatched] = new_ids
+
+        return assigned
+
+    def predict(self) -> np.ndarray:
+        """Advance every track by one frame without observations; return the live track IDs"""
+        self.frames += 1
+        self.boxes[:, :2] += self.velocity
+        return self.ids.copy()
+
+    def boxes_for(self, track_ids: np.ndarray) -> np.ndarray:
+        """Filtered (cx, cy, w, h) for live track IDs"""
+        # IDs are issued in increasing order and removal keeps order, so they stay sorted
+        rows = np.searchsorted(self.ids, np.asarray(track_ids, dtype=np.int64))
+        return self.boxes[rows].copy()
+
+    def positions(self, track_ids: np.ndarray) -> np.ndarray:
+        """Filtered (cx, cy) for live track IDs"""
+        return self.boxes_for(track_ids)[:, :2]
+
+    def _associate(self, detections: np.ndarray):
+        n_tracks, n_dets = len(self.ids), len(detections)
+        empty = np.zeros(0, dtype=np.int64)
+        if n_tracks == 0 or n_dets == 0:
+            return empty, empty
+
+        iou = iou_matrix(self.boxes, detections)
+        offset = self.boxes[:, None, :2] - detections[None, :, :2]
+        scale = np.maximum(self.boxes[:, None, 3], detections[None, :, 3])
+        distance = np.sqrt(np.sum(offset * offset, axis=-1)) / np.maximum(scale, 1e-9)
+
+        gate = (iou >= self.iou_threshold) | (distance <= self.max_distance)
+        cost = np.where(gate, (1.0 - iou) + distance, GATE_COST)
+
+        # Mutual best matches need no solver; only contested pairs go to Hungarian
+        best_det = np.argmin(cost, axis=1)
+        best_track = np.argmin(cost, axis=0)
+        rows = np.arange(n_tracks)
+        mutual = (best_track[best_det] == rows) & gate[rows, best_det]
+        track_idx, det_idx = rows[mutual], best_det[mutual]
+
+        free_tracks = np.setdiff1d(rows, track_idx, assume_unique=True)
+        free_dets = np.setdiff1d(np.arange(n_dets), det_idx, assume_unique=True)
+        if len(free_tracks) and len(free_dets):
+            sub = cost[np.ix_(free_tracks, free_dets)]
+            if (sub < GATE_COST).any():
+                sub_rows, sub_cols = linear_sum_assignment(sub)
+                valid = sub[sub_rows, sub_cols] < GATE_COST
+                track_idx = np.concatenate([track_idx, free_tracks[sub_rows[valid]]])
+                det_idx = np.concatenate([det_idx, free_dets[sub_cols[valid]]])
+
+        return track_idx, det_idx
+
+    def _keep(self, mask: np.ndarray):
+        self.boxes = self.boxes[mask]
+        self.velocity = self.velocity[mask]
+        self.ids = self.ids[mask]
+        self.hits = self.hits[mask]
+        self.misses = self.misses[mask]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'active_tracks': int(len(self.ids)),
+            'tracks_created': int(self.next_id - 1),
+            'frames': self.frames
+        }
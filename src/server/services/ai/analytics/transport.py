@@ -0,0 +1,235 @@
+"""
+Co-located frame transport over a Unix domain socket
+
+When the Node API and this service share a host, frames don't need
+multipart encoding or HTTP parsing. A client connects to
+ANALYTICS_FRAME_SOCKET and writes length-prefixed messages:
+
+    u32 header length | u32 body length | header (UTF-8 JSON) | body
+
+Both lengths are big-endian. A request header names the operation and its
+parameters ({"id": 7, "op": "analyze-frame", "session_id": ...,
+"sizes": [...]}). The body is the JPEG frames back to back, split by
+"sizes". Each frame reaches the service as a memoryview of the one buffer
+the message was read into, not as a copy. A response uses the same framing:
+its header carries the request id, an HTTP-style status and the body's
+content type.
+
+Requests on a connection are pipelined. A client may send the next frame
+before the previous answer arrives, and responses can come back out of
+order. Requests for the same session from one connection are run in the
+order they were sent, so tracking always sees frames in sequence. At most
+max_in_flight requests per connection are read ahead of their answers.
+Past that the server stops reading, the socket buffer fills and the
+client's writes wait, so a fast client can't queue unbounded work.
+
+The listening socket can be opened before a pre-forking server forks, and
+then every worker accepts on it. serve_in_thread() runs the server on its
+own event loop for threaded servers. start() runs it on the current loop.
+"""
+
+import os
+import json
+import stat
+import socket
+import struct
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+PREFIX = struct.Struct('>II')
+MAX_HEADER_BYTES = 64 * 1024
+JSON = 'application/json'
+DEFAULT_MAX_IN_FLIGHT = 16
+
+Handler = Callable[[Dict[str, Any], List[memoryview]], Awaitable[Tuple[int, str, bytes]]]
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends a message that can't be framed"""
+
+
+async def read_message(reader: asyncio.StreamReader, max_body_bytes: int) -> Optional[Tuple[Dict[str, Any], memoryview]]:
+    """Next (header, body) from the stream; None once the peer has closed it cleanly"""
+    try:
+        prefix = await reader.readexactly(PREFIX.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ProtocolError('Truncated message prefix')
+    header_length, body_length = PREFIX.unpack(prefix)
+    if header_length > MAX_HEADER_BYTES:
+        raise ProtocolError(f"Header of {header_length} bytes exceeds {MAX_HEADER_BYTES}")
+    if max_body_bytes and body_length > max_body_bytes:
+        raise ProtocolError(f"Body of {body_length} bytes exceeds {max_body_bytes}")
+    try:
+        data = memoryview(await reader.readexactly(header_length + body_length))
+    except asyncio.IncompleteReadError:
+        raise ProtocolError('Truncated message')
+    try:
+        header = json.loads(bytes(data[:header_length]))
+    except ValueError as e:
+        raise ProtocolError(f"Malformed header: {e}")
+    if not isinstance(header, dict):
+        raise ProtocolError('Header must be a JSON object')
+    return header, data[header_length:]
+
+
+def message(header: Dict[str, Any], body: bytes = b'') -> List[bytes]:
+    """A framed message as buffers for writelines(), so the body is never concatenated"""
+    encoded = json.dumps(header, separators=(',', ':')).encode()
+    return [PREFIX.pack(len(encoded), len(body)) + encoded, body]
+
+
+def split_frames(body: memoryview, sizes: Optional[List[int]]) -> List[memoryview]:
+    """Cut the body into frames by the header's sizes (one frame when there are none)"""
+    if sizes is None:
+        return [body] if len(body) else []
+    if any(not isinstance(size, int) or size < 0 for size in sizes) or sum(sizes) != len(body):
+        raise ValueError('sizes must be non-negative and add up to the body length')
+    frames, offset = [], 0
+    for size in sizes:
+        frames.append(body[offset:offset + size])
+        offset += size
+    return frames
+
+
+def error_body(error: str) -> bytes:
+    return json.dumps({'error': error}).encode()
+
+
+class FrameServer:
+    """Length-prefixed request/response server on a Unix socket"""
+
+    def __init__(self, path: str, handler: Handler, max_body_bytes: int = 0,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.path = path
+        self.handler = handler
+        self.max_body_bytes = max_body_bytes
+        self.max_in_flight = max(1, max_in_flight)
+        self._socket: Optional[socket.socket] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        self.requests = 0
+        self.errors = 0
+
+    def listen(self) -> socket.socket:
+        """Bind the socket path, replacing a stale socket file; safe to call before fork"""
+        if self._socket is None:
+            try:
+                if stat.S_ISSOCK(os.stat(self.path).st_mode):
+                    os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(self.path)
+            # Same-host clients only; the socket's directory decides who else may connect
+            os.chmod(self.path, 0o660)
+            listener.listen(socket.SOMAXCONN)
+            listener.setblocking(False)
+            self._socket = listener
+        return self._socket
+
+    async def start(self):
+        """Accept connections on the running event loop"""
+        self._server = await asyncio.start_unix_server(self._connection, sock=self.listen())
+
+    def serve_in_thread(self) -> threading.Thread:
+        """Run the server on an event loop of its own, for threaded servers"""
+        loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            loop.run_forever()
+
+        thread = threading.Thread(target=run, name='frame-server', daemon=True)
+        thread.start()
+        return thread
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in list(self._connections):
+            task.cancel()
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(asyncio.current_task())
+        write_lock = asyncio.Lock()
+        pending: Set[asyncio.Task] = set()
+        # Last request per session on this connection; the next one waits for it
+        tails: Dict[str, asyncio.Task] = {}
+        # Taken before each read and given back when the request is answered
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        def finished(task: asyncio.Task, session_id: Optional[str]):
+            pending.discard(task)
+            in_flight.release()
+            if tails.get(session_id) is task:
+                del tails[session_id]
+
+        try:
+            while True:
+                await in_flight.acquire()
+                try:
+                    received = await read_message(reader, self.max_body_bytes)
+                except ProtocolError as e:
+                    # Framing is lost; answer once and drop the connection
+                    self.errors += 1
+                    async with write_lock:
+                        writer.writelines(message({'id': None, 'status': 400, 'content_type': JSON},
+                                                  error_body(str(e))))
+                        await writer.drain()
+                    break
+                if received is None:
+                    break
+                header, body = received
+                session_id = header.get('session_id')
+                task = asyncio.ensure_future(self._respond(header, body, tails.get(session_id), writer, write_lock))
+                pending.add(task)
+                task.add_done_callback(lambda done, session_id=session_id: finished(done, session_id))
+                if session_id is not None:
+                    tails[session_id] = task
+            if pending:
+                await asyncio.wait(pending)
+        except ConnectionError:
+            for task in pending:
+                task.cancel()
+        except asyncio.CancelledError:
+            for task in pending:
+                task.cancel()
+            raise
+        finally:
+            self._connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def _respond(self, header: Dict[str, Any], body: memoryview, previous: Optional[asyncio.Task],
+                       writer: asyncio.StreamWriter, write_lock: asyncio.Lock):
+        if previous is not None:
+            await asyncio.wait([previous])
+        self.requests += 1
+        try:
+            frames = split_frames(body, header.get('sizes'))
+            status, content_type, payload = await self.handler(header, frames)
+        except ValueError as e:
+            status, content_type, payload = 400, JSON, error_body(str(e))
+        except Exception as e:
+            status, content_type, payload = 500, JSON, error_body(str(e))
+        if status >= 400:
+            self.errors += 1
+        async with write_lock:
+            writer.writelines(message({'id': header.get('id'), 'status': status, 'content_type': content_type},
+                                      payload))
+            await writer.drain()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'listening': self._socket is not None,
+            'connections': len(self._connections),
+            'max_in_flight': self.max_in_flight,
+            'requests': self.requests,
+            'errors': self.errors
+        }
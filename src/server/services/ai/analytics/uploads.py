@@ -0,0 +1,132 @@
+"""
+Bounded in-memory frame uploads
+
+Frame requests carry a handful of JPEGs, so multipart file parts are
+collected in memory rather than spooled through werkzeug's default
+BytesIO-or-temporary-file stream and then copied out again with read().
+Each part is written into an UploadBuffer, a single bytearray that grows
+as the parser feeds it. view() hands that buffer to the service as a
+memoryview, which reaches the detection cache and the detector without
+another copy. Decoders open frames through buffer_file(). For a
+memoryview that is a file object reading straight from the view, so
+Pillow only copies the chunks it reads, rather than the whole frame up
+front as BytesIO(view) would. A part is capped at the frame size limit
+and raises UploadTooLarge as soon as it passes it, so one request can't
+make a worker allocate more than the upload limit, whatever the client
+claims in Content-Length.
+"""
+
+import io
+from typing import BinaryIO
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload, or one of its parts, exceeds its size limit"""
+
+
+class UploadBuffer(io.RawIOBase):
+    """Writable, seekable upload part backed by one bytearray and capped at max_bytes"""
+
+    def __init__(self, max_bytes: int = 0):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._data = bytearray()
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.max_bytes and len(self._data) + len(data) > self.max_bytes:
+            raise UploadTooLarge(f"Upload part exceeds the {self.max_bytes} byte limit")
+        self._data += data
+        return len(data)
+
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), len(self._data) - self._position)
+        with memoryview(self._data) as data:
+            buffer[:count] = data[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._data)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def view(self) -> memoryview:
+        """The part's bytes, without a copy; the buffer can't be written to while the view is held"""
+        return memoryview(self._data)
+
+
+class ViewReader(io.RawIOBase):
+    """Read-only, seekable file over a buffer; read() copies only the bytes asked for"""
+
+    def __init__(self, data):
+        super().__init__()
+        self._view = memoryview(data)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._position + size, len(self._view))
+        data = bytes(self._view[self._position:end])
+        self._position = max(self._position, end)
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), max(0, len(self._view) - self._position))
+        buffer[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+def buffer_file(data) -> BinaryIO:
+    """A file object over a frame's bytes for Image.open, without copying the frame"""
+    # BytesIO shares a bytes object until it is written to; any other buffer it would copy
+    if isinstance(data, bytes):
+        return io.BytesIO(data)
+    return ViewReader(data)
+
+
+def read_upload(stream: BinaryIO, max_bytes: int = 0) -> memoryview:
+    """An uploaded file's bytes: the buffer itself for an UploadBuffer, otherwise read in bounded chunks"""
+    if isinstance(stream, UploadBuffer):
+        return stream.view()
+    buffer = UploadBuffer(max_bytes)
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return buffer.view()
+        buffer.write(chunk)
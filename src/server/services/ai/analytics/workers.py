@@ -0,0 +1,167 @@
+"""
+Process pool for CPU-bound frame work
+
+Preparing a frame for the detector (decode, crop, resize, re-encode), its
+motion thumbnail and jersey colour sampling are pure functions of the
+frame bytes. With processes configured they run in worker processes
+instead of on request threads that share one GIL. A batch's frames are
+copied once into a shared-memory block, and workers read them in place
+by (offset, length). Only the block name crosses the process boundary,
+not a pickled copy of every frame. What comes back (a model-sized JPEG, a
+160 px thumbnail, a few colour features per player) is small. Anything
+stateful (motion sampler, tracker, team centroids, session metrics) stays
+in the service process.
+
+Without processes the same calls run on a thread pool. PIL releases the
+GIL while decoding, so that still overlaps somewhat.
+
+Every call returns futures, so callers can hand finished frames to the
+detector while the rest are still being prepared.
+"""
+
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from analytics.frames import InputTransform, prepare_frame, detection_input
+from analytics.homography import PitchCalibration
+from analytics.sampling import thumbnail
+from analytics.teams import frame_features
+
+PreparedFrame = Tuple[bytes, Optional[InputTransform], Tuple[int, int], Optional[np.ndarray]]
+
+
+def prepare_for_detection(image_data: bytes, max_size: int = 0, calibration: Optional[PitchCalibration] = None,
+                          roi_margin: float = 0.0, thumbnail_width: int = 0) -> PreparedFrame:
+    """Detector JPEG, its transform back to frame pixels, the frame size and (optionally) the motion thumbnail"""
+    jpeg_data, frame_size = prepare_frame(image_data)
+    region = calibration.image_region(frame_size, roi_margin) if calibration is not None else None
+    jpeg_data, transform = detection_input(jpeg_data, frame_size, max_size, region)
+    current = thumbnail(jpeg_data, thumbnail_width) if thumbnail_width else None
+    return jpeg_data, transform, frame_size, current
+
+
+def _from_shared(task: Callable, block: str, offset: int, length: int, *args) -> Any:
+    """Worker side: read one frame out of the batch's shared block and run task on it"""
+    shared = SharedMemory(name=block)
+    try:
+        data = bytes(shared.buf[offset:offset + length])
+    finally:
+        shared.close()
+    return task(data, *args)
+
+
+class _SharedBatch:
+    """One shared-memory block holding a batch of frames back to back, unlinked when its last task finishes"""
+
+    def __init__(self, frames: Sequence[bytes]):
+        self.offsets = []
+        size = sum(len(frame) for frame in frames)
+        self.block = SharedMemory(create=True, size=max(size, 1))
+        offset = 0
+        try:
+            for frame in frames:
+                self.block.buf[offset:offset + len(frame)] = frame
+                self.offsets.append((offset, len(frame)))
+                offset += len(frame)
+        except BaseException:
+            self._release()
+            raise
+        self._pending = len(frames)
+        self._lock = Lock()
+        if not frames:
+            self._release()
+
+    def done(self, _future: Future):
+        self.abandon(1)
+
+    def abandon(self, count: int):
+        """Stop waiting for count frames, e.g. ones that were never submitted"""
+        with self._lock:
+            self._pending -= count
+            last = self._pending == 0
+        if last:
+            self._release()
+
+    def _release(self):
+        self.block.close()
+        self.block.unlink()
+
+
+class FramePool:
+    """CPU-bound frame work on worker processes (processes > 0) or threads"""
+
+    def __init__(self, processes: int = 0, threads: int = 8, start_method: Optional[str] = None):
+        self.processes = processes
+        self.threads = threads
+        self.start_method = start_method
+        self._executor: Optional[Executor] = None
+        self._lock = Lock()
+
+    def _get_executor(self) -> Executor:
+        # Started on first use: a spawned child re-importing the service module must not start a pool of its own
+        with self._lock:
+            if self._executor is None:
+                if self.processes > 0:
+                    self._executor = ProcessPoolExecutor(self.processes, mp_context=self._context())
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.threads)
+            return self._executor
+
+    def _context(self):
+        # Forking a threaded server is unsafe; workers start clean and import only what tasks need
+        methods = multiprocessing.get_all_start_methods()
+        method = self.start_method or ('forkserver' if 'forkserver' in methods else 'spawn')
+        context = multiprocessing.get_context(method)
+        if method == 'forkserver':
+            # The default preload is __main__, i.e. the whole service
+            context.set_forkserver_preload([__name__])
+        return context
+
+    @property
+    def uses_processes(self) -> bool:
+        return self.processes > 0
+
+    def map_frames(self, task: Callable, frames: Sequence[bytes], *per_frame_args: Sequence[Any],
+                   shared_args: Tuple = ()) -> List[Future]:
+        """task(frame, *per_frame, *shared_args) for every frame, one future each, in frame order"""
+        per_frame = list(zip(*per_frame_args)) if per_frame_args else [()] * len(frames)
+        executor = self._get_executor()
+        if not self.uses_processes:
+            return [executor.submit(task, frame, *args, *shared_args) for frame, args in zip(frames, per_frame)]
+
+        batch = _SharedBatch(frames)
+        futures = []
+        try:
+            for (offset, length), args in zip(batch.offsets, per_frame):
+                future = executor.submit(_from_shared, task, batch.block.name, offset, length, *args, *shared_args)
+                future.add_done_callback(batch.done)
+                futures.append(future)
+        except BaseException:
+            # A broken or shut-down pool: cancel the queued tasks and count out the unsubmitted frames. The block
+            # is released here, or when the last task already running on a worker finishes with it
+            for future in futures:
+                future.cancel()
+            batch.abandon(len(batch.offsets) - len(futures))
+            raise
+        return futures
+
+    def prepare(self, frames: Sequence[bytes], max_size: int = 0, calibration: Optional[PitchCalibration] = None,
+                roi_margin: float = 0.0, thumbnail_width: int = 0) -> List[Future]:
+        """Futures of prepare_for_detection() per frame"""
+        return self.map_frames(prepare_for_detection, frames,
+                               shared_args=(max_size, calibration, roi_margin, thumbnail_width))
+
+    def team_features(self, frames: Sequence[bytes], boxes: Sequence[np.ndarray]) -> List[Future]:
+        """Futures of frame_features() per frame"""
+        return self.map_frames(frame_features, frames, boxes)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,139 @@
+import net from 'net';
+
+// u32 header length | u32 body length, big-endian (see analytics/transport.py)
+const PREFIX_BYTES = 8;
+
+export interface FrameSocketResponse {
+  status: number;
+  contentType: string;
+  body: Buffer;
+}
+
+interface ResponseHeader {
+  id: number | null;
+  status: number;
+  content_type: string;
+}
+
+interface PendingRequest {
+  resolve: (response: FrameSocketResponse) => void;
+  reject: (error: Error) => void;
+  timer?: NodeJS.Timeout;
+}
+
+/**
+ * Client for the analytics service's co-located frame transport on a Unix socket.
+ * Frames are written straight from the caller's Buffers (no multipart encoding, no copy),
+ * and requests are pipelined: the next frame goes out before the previous answer arrives.
+ */
+export class FrameSocketClient {
+  private socket: net.Socket | null = null;
+  private pending = new Map<number, PendingRequest>();
+  private nextId = 1;
+  private received: Buffer = Buffer.alloc(0);
+
+  constructor(private readonly path: string) {}
+
+  request(header: Record<string, unknown>, frames: Buffer[], timeout = 30000): Promise<FrameSocketResponse> {
+    const socket = this.connect();
+    const id = this.nextId++;
+    const encodedHeader = Buffer.from(JSON.stringify({ ...header, id, sizes: frames.map(frame => frame.length) }));
+    const prefix = Buffer.allocUnsafe(PREFIX_BYTES);
+    prefix.writeUInt32BE(encodedHeader.length, 0);
+    prefix.writeUInt32BE(frames.reduce((sum, frame) => sum + frame.length, 0), 4);
+
+    return new Promise((resolve, reject) => {
+      const timer = timeout
+        ? setTimeout(() => {
+            this.pending.delete(id);
+            reject(new Error(`Frame socket request ${id} timed out`));
+          }, timeout)
+        : undefined;
+      this.pending.set(id, { resolve, reject, timer });
+      socket.ref();
+
+      // Corked writes leave as one writev: prefix, header and every frame
+      socket.cork();
+      socket.write(prefix);
+      socket.write(encodedHeader);
+      frames.forEach(frame => socket.write(frame));
+      socket.uncork();
+    });
+  }
+
+  close(): void {
+    this.socket?.end();
+    this.socket = null;
+    // Replies on the ended socket are ignored from here on, so nothing pending could settle
+    this.reset(new Error('Frame socket client closed'));
+  }
+
+  private connect(): net.Socket {
+    if (this.socket) return this.socket;
+    const socket = net.createConnection({ path: this.path });
+    // A socket that was closed or failed can still emit; only the current one may touch client state
+    socket.on('data', chunk => {
+      if (socket === this.socket) this.receive(chunk);
+    });
+    socket.on('error', error => {
+      if (socket === this.socket) this.fail(error);
+    });
+    socket.on('close', () => {
+      if (socket === this.socket) this.fail(new Error('Frame socket closed'));
+    });
+    this.socket = socket;
+    return socket;
+  }
+
+  private receive(chunk: Buffer): void {
+    this.received = this.received.length ? Buffer.concat([this.received, chunk]) : chunk;
+    while (this.received.length >= PREFIX_BYTES) {
+      const headerLength = this.received.readUInt32BE(0);
+      const bodyLength = this.received.readUInt32BE(4);
+      const end = PREFIX_BYTES + headerLength + bodyLength;
+      if (this.received.length < end) return;
+
+      let header: ResponseHeader;
+      try {
+        header = JSON.parse(this.received.toString('utf8', PREFIX_BYTES, PREFIX_BYTES + headerLength));
+        if (typeof header !== 'object' || header === null) throw new Error('header is not an object');
+      } catch (error) {
+        this.fail(new Error(`Frame socket protocol error: ${(error as Error).message}`));
+        return;
+      }
+      const body = this.received.subarray(PREFIX_BYTES + headerLength, end);
+      this.received = this.received.subarray(end);
+      this.settle(header, body);
+    }
+  }
+
+  private settle(header: ResponseHeader, body: Buffer): void {
+    if (header.id === null) {
+      // The server lost framing and is closing the connection
+      this.fail(new Error(`Frame socket protocol error: ${body.toString('utf8')}`));
+      return;
+    }
+    const request = this.pending.get(header.id);
+    if (!request) return;
+    this.pending.delete(header.id);
+    clearTimeout(request.timer);
+    // Don't hold the process open for an idle connection
+    if (this.pending.size === 0) this.socket?.unref();
+    request.resolve({ status: header.status, contentType: header.content_type, body });
+  }
+
+  private fail(error: Error): void {
+    this.socket?.destroy();
+    this.socket = null;
+    this.reset(error);
+  }
+
+  private reset(error: Error): void {
+    this.received = Buffer.alloc(0);
+    for (const request of this.pending.values()) {
+      clearTimeout(request.timer);
+      request.reject(error);
+    }
+    this.pending.clear();
+  }
+}
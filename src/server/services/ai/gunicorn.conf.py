@@ -0,0 +1,71 @@
+"""
+Gunicorn settings for the Player Analytics Service
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    ANALYTICS_WORKER_CLASS=aiohttp.GunicornWebWorker gunicorn -c gunicorn.conf.py aio:app
+
+The app is imported once in the master (preload_app), so the service and
+the detector weights are shared copy-on-write by the pre-forked workers.
+Each worker serves ANALYTICS_THREADS requests at once (gthread), or any
+number as coroutines with the asyncio app. Decoding can use more cores
+through ANALYTICS_CPU_WORKERS.
+
+The service's state lives in the worker that received it. That covers
+match sessions, their live feeds, the jobs a worker accepted, and camera
+calibrations. ANALYTICS_CALIBRATION_FILE only seeds each worker when it
+starts; a calibration POSTed later reaches just the worker that handled
+it. Gunicorn can't route a request to the worker holding its session, so
+the default is one worker. Raise ANALYTICS_WORKERS only for stateless
+traffic: one-off frames and videos, with calibrations from the file.
+Session, calibration and job requests would otherwise land on a worker
+that doesn't know them and get a 404, or results in pixels instead of
+metres.
+
+On SIGTERM a worker stops reporting ready on /ready, cancels its running
+jobs and ends its live feeds. It then finishes in-flight requests for up
+to ANALYTICS_GRACEFUL_TIMEOUT seconds. Live viewers (GET
+/api/sessions/<id>/live) each hold a gthread thread; with many of them,
+serve the asyncio app instead.
+"""
+
+import os
+import signal
+
+bind = os.getenv('ANALYTICS_BIND', f"0.0.0.0:{os.getenv('ANALYTICS_PORT', 5001)}")
+# Sessions, calibrations, jobs and live feeds are per process (see above)
+workers = int(os.getenv('ANALYTICS_WORKERS', 1))
+threads = int(os.getenv('ANALYTICS_THREADS', 4))
+worker_class = os.getenv('ANALYTICS_WORKER_CLASS', 'gthread')
+preload_app = True
+
+# Longer than the usual 60 s load balancer idle timeout, so the proxy closes idle connections first
+keepalive = int(os.getenv('ANALYTICS_KEEPALIVE', 75))
+# Heartbeat timeout; gthread workers keep beating while a long upload streams on another thread
+timeout = int(os.getenv('ANALYTICS_WORKER_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('ANALYTICS_GRACEFUL_TIMEOUT', 30))
+backlog = int(os.getenv('ANALYTICS_BACKLOG', 2048))
+# Recycle workers after this many requests (0: never)
+max_requests = int(os.getenv('ANALYTICS_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('ANALYTICS_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.getenv('ANALYTICS_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('ANALYTICS_LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    from wsgi import service, frame_server
+
+    # Threaded workers serve the frame socket on a loop of their own; the asyncio app starts it on its loop
+    if frame_server is not None and 'aiohttp' not in worker_class:
+        frame_server.serve_in_thread()
+
+    # gunicorn installs its own SIGTERM handler during worker init; drain first, then let it run
+    stop = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        service.shutdown()
+        if callable(stop):
+            stop(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
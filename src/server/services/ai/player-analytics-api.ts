@@ -1,7 +1,10 @@
 import axios from 'axios';
 import FormData from 'form-data';
+import { FrameSocketClient } from './frame-socket';
 
 const ANALYTICS_SERVICE_URL = process.env.ANALYTICS_SERVICE_URL || 'http://localhost:5001';
+// HTTP endpoint for everything but frames when ANALYTICS_SERVICE_URL is a unix:// frame socket
+const ANALYTICS_CONTROL_URL = process.env.ANALYTICS_CONTROL_URL || 'http://localhost:5001';
 
 export interface PlayerDetection {
   player_id: string;
@@ -9,26 +12,245 @@ export interface PlayerDetection {
   bbox: { x: number; y: number; width: number; height: number };
   confidence: number;
   team: string;
+  track_id?: number;
+  pitch_position?: { x: number; y: number };
+}
+
+export interface FormationMatch {
+  formation: string;
+  lines: number;
+  confidence: number;
+  alternative?: string;
+  fit?: number;
+  window?: number;
+}
+
+export interface TeamShape {
+  players: number;
+  score: number;
+  mean_pairwise_distance: number;
+  hull_area: number;
+  width: number;
+  depth: number;
+  centroid_distance: number;
+  centroid: [number, number] | null;
 }
 
 export interface FrameAnalysisResult {
   success: boolean;
   players_detected: number;
   players: PlayerDetection[];
+  // false when the frame skipped detection and players come from tracker prediction
+  detected?: boolean;
   analytics: {
     field_coverage: number;
-    formation: {
-      formation: string;
-      lines: number;
-      confidence: number;
+    formation: FormationMatch;
+    formations?: {
+      home?: FormationMatch;
+      away?: FormationMatch;
     };
     team_compactness: number;
     player_density: number;
+    units?: 'pixels' | 'metres';
+    compactness?: {
+      home?: TeamShape;
+      away?: TeamShape;
+      separation?: number | null;
+    };
   };
   frame_size: [number, number];
   error?: string;
 }
 
+export interface BatchFrameAnalysisResult {
+  success: boolean;
+  frames: number;
+  frames_analyzed: number;
+  detector_frames: number;
+  results: FrameAnalysisResult[];
+  timing: {
+    decode_ms: number;
+    detection_ms: number;
+    analytics_ms: number;
+    total_ms: number;
+    frames_per_second: number;
+  };
+  error?: string;
+}
+
+export interface MatchSessionSummary {
+  session_id: string;
+  fps: number;
+  camera_id: string | null;
+  created_at: number;
+  frames_processed: number;
+  match_time: number;
+  metres_per_pixel: number | null;
+  tracking: {
+    active_tracks: number;
+    tracks_created: number;
+    frames: number;
+  };
+  sampling: {
+    enabled: boolean;
+    threshold: number;
+    max_gap: number;
+    frames: number;
+    detector_calls: number;
+    skipped: number;
+    reduction_ratio: number;
+  };
+  teams: {
+    fitted: boolean;
+    fits: number;
+    frames: number;
+    centroids: { home: [number, number, number]; away: [number, number, number] } | null;
+  };
+  kinematics: {
+    players_tracked: number;
+    total_distance_km: number;
+  };
+  heatmaps: {
+    resolution: [number, number];
+    samples: number;
+  };
+  live: {
+    subscribers: number;
+    updates: number;
+    keyframes: number;
+    keyframe_interval: number;
+    skipped: number;
+  };
+}
+
+// Events of a session's live feed; positions are integer cells of `step` units
+export type LivePlayer = [trackId: number, x: number, y: number, team: string];
+
+export interface LiveKeyframe {
+  seq: number;
+  match_time: number;
+  units: 'metres' | 'pixels';
+  step: number;
+  players: LivePlayer[];
+  analytics: Record<string, unknown>;
+}
+
+export interface LiveDelta {
+  seq: number;
+  match_time: number;
+  moved?: [trackId: number, dx: number, dy: number][];
+  entered?: LivePlayer[];
+  left?: number[];
+  analytics?: Record<string, unknown>; // changed fields only, deep-merged; null removes a field
+}
+
+export interface StreamFrameResult extends FrameAnalysisResult {
+  frame: number;
+  timestamp: number;
+}
+
+export interface StreamSummary {
+  done: true;
+  frames_received: number;
+  frames_sampled: number;
+  frames_analyzed: number;
+  session: MatchSessionSummary;
+}
+
+export interface VideoStreamOptions {
+  sessionId?: string; // continue a match session instead of a one-off one
+  contentType?: string; // MJPEG (multipart/x-mixed-replace, image/jpeg) or a video/* container
+  fps?: number;
+  every?: number; // analyze every Nth frame
+  cameraId?: string;
+  filter?: DetectionFilterOptions;
+  motionThreshold?: number; // one-off sessions only; 0 detects every frame
+  maxGap?: number;
+}
+
+export type JobState = 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+
+export interface AnalysisJob {
+  job_id: string;
+  state: JobState;
+  mimetype: string;
+  params: Record<string, string>;
+  created_at: number;
+  started_at: number | null;
+  finished_at: number | null;
+  progress: {
+    input_bytes: number;
+    bytes_read: number;
+    fraction: number;
+    frames_received: number;
+    frames_analyzed: number;
+  };
+  limits: { max_frames: number; max_seconds: number };
+  error: string | null;
+  summary: StreamSummary | null;
+}
+
+export interface VideoJobOptions extends VideoStreamOptions {
+  // Can only tighten the server's own limits
+  maxFrames?: number;
+  maxSeconds?: number;
+  maxBytes?: number;
+}
+
+export interface DetectionFilterOptions {
+  confidence?: number; // 0-100
+  overlap?: number; // NMS IoU threshold, 0-100
+  classes?: string[];
+}
+
+function detectionFilterParams(filter: DetectionFilterOptions = {}): Record<string, string | number | undefined> {
+  return {
+    confidence: filter.confidence,
+    overlap: filter.overlap,
+    classes: filter.classes?.join(','),
+  };
+}
+
+export interface SessionHeatmaps {
+  session_id: string;
+  resolution: [number, number];
+  samples: number;
+  heatmaps: Record<string, number[][]>;
+}
+
+export interface SessionPlayerData {
+  avg_speed: number;
+  distance_per_match: number;
+  sprint_count: number;
+  max_speed: number;
+  time_tracked: number;
+}
+
+export interface SessionFinalizeResult {
+  session_id: string;
+  match_time: number;
+  players: Record<string, {
+    player_data: SessionPlayerData;
+    performance?: PerformanceAnalysis;
+  }>;
+}
+
+export interface PitchCalibration {
+  camera_id: string;
+  matrix: number[][];
+  pitch_length: number;
+  pitch_width: number;
+  rmse: number;
+  points: number;
+  created_at: number;
+}
+
+export interface CalibrationPoint {
+  image: [number, number];
+  pitch?: [number, number];
+  landmark?: string;
+}
+
 export interface PerformanceMetric {
   player_value: number;
   pro_value: number;
@@ -77,9 +299,25 @@ export interface MatchPrediction {
 
 export class PlayerAnalyticsAPI {
   private baseUrl: string;
+  private frameSocket: FrameSocketClient | null = null;
 
   constructor(baseUrl: string = ANALYTICS_SERVICE_URL) {
-    this.baseUrl = baseUrl;
+    // unix:///path/to/frames.sock: a co-located service takes frames over its socket, the rest over HTTP
+    if (baseUrl.startsWith('unix://')) {
+      this.frameSocket = new FrameSocketClient(baseUrl.slice('unix://'.length));
+      this.baseUrl = ANALYTICS_CONTROL_URL;
+    } else {
+      this.baseUrl = baseUrl;
+    }
+  }
+
+  private async sendFrames<T>(header: Record<string, unknown>, frames: Buffer[], timeout: number): Promise<T> {
+    const response = await this.frameSocket!.request(header, frames, timeout);
+    const data = JSON.parse(response.body.toString('utf8'));
+    if (response.status >= 400) {
+      throw new Error(data.error || `Frame socket request failed with status ${response.status}`);
+    }
+    return data;
   }
 
   async healthCheck(): Promise<boolean> {
@@ -94,8 +332,16 @@ export class PlayerAnalyticsAPI {
     }
   }
 
-  async analyzeFrame(imageBuffer: Buffer): Promise<FrameAnalysisResult> {
+  async analyzeFrame(imageBuffer: Buffer, filter?: DetectionFilterOptions): Promise<FrameAnalysisResult> {
     try {
+      if (this.frameSocket) {
+        return await this.sendFrames<FrameAnalysisResult>(
+          { op: 'analyze-frame', ...detectionFilterParams(filter) },
+          [imageBuffer],
+          30000
+        );
+      }
+
       const formData = new FormData();
       formData.append('image', imageBuffer, {
         filename: 'frame.jpg',
@@ -107,6 +353,7 @@ export class PlayerAnalyticsAPI {
         formData,
         {
           headers: formData.getHeaders(),
+          params: detectionFilterParams(filter),
           timeout: 30000,
         }
       );
@@ -118,6 +365,208 @@ export class PlayerAnalyticsAPI {
     }
   }
 
+  async analyzeFrames(imageBuffers: Buffer[], filter?: DetectionFilterOptions): Promise<BatchFrameAnalysisResult> {
+    try {
+      if (this.frameSocket) {
+        return await this.sendFrames<BatchFrameAnalysisResult>(
+          { op: 'analyze-frames', ...detectionFilterParams(filter) },
+          imageBuffers,
+          120000
+        );
+      }
+
+      const formData = new FormData();
+      imageBuffers.forEach((imageBuffer, i) => {
+        formData.append('images', imageBuffer, {
+          filename: `frame-${i}.jpg`,
+          contentType: 'image/jpeg',
+        });
+      });
+
+      const response = await axios.post(
+        `${this.baseUrl}/api/analyze-frames`,
+        formData,
+        {
+          headers: formData.getHeaders(),
+          params: detectionFilterParams(filter),
+          timeout: 120000,
+        }
+      );
+
+      return response.data;
+    } catch (error) {
+      console.error('Batch frame analysis error:', error);
+      throw new Error('Failed to analyze frames');
+    }
+  }
+
+  async calibrateCamera(
+    cameraId: string,
+    points: CalibrationPoint[],
+    pitch: { length?: number; width?: number } = {}
+  ): Promise<PitchCalibration> {
+    try {
+      const response = await axios.post(
+        `${this.baseUrl}/api/calibrations/${encodeURIComponent(cameraId)}`,
+        {
+          points,
+          pitch_length: pitch.length,
+          pitch_width: pitch.width,
+        },
+        {
+          timeout: 5000,
+        }
+      );
+
+      return response.data;
+    } catch (error) {
+      console.error('Camera calibration error:', error);
+      throw new Error('Failed to calibrate camera');
+    }
+  }
+
+  async createSession(
+    options: {
+      sessionId?: string;
+      fps?: number;
+      cameraId?: string;
+      heatmapResolution?: string;
+      teamColors?: { home: string; away: string };
+      motionThreshold?: number;
+      maxGap?: number;
+      liveKeyframeInterval?: number;
+    } = {}
+  ): Promise<MatchSessionSummary> {
+    try {
+      const response = await axios.post(
+        `${this.baseUrl}/api/sessions`,
+        {
+          session_id: options.sessionId,
+          fps: options.fps,
+          camera_id: options.cameraId,
+          heatmap_resolution: options.heatmapResolution,
+          team_colors: options.teamColors,
+          motion_threshold: options.motionThreshold,
+          max_gap: options.maxGap,
+          live_keyframe_interval: options.liveKeyframeInterval,
+        },
+        {
+          timeout: 5000,
+        }
+      );
+
+      return response.data;
+    } catch (error) {
+      console.error('Session creation error:', error);
+      throw new Error('Failed to create analytics session');
+    }
+  }
+
+  async analyzeSessionFrame(
+    sessionId: string,
+    imageBuffer: Buffer,
+    filter?: DetectionFilterOptions
+  ): Promise<FrameAnalysisResult> {
+    try {
+      if (this.frameSocket) {
+        // Frames of one session on this connection are tracked in the order they were sent
+        return await this.sendFrames<FrameAnalysisResult>(
+          { op: 'analyze-frame', session_id: sessionId, ...detectionFilterParams(filter) },
+          [imageBuffer],
+          30000
+        );
+      }
+
+      const formData = new FormData();
+      formData.append('image', imageBuffer, {
+        filename: 'frame.jpg',
+        contentType: 'image/jpeg',
+      });
+
+      const response = await axios.post(
+        `${this.baseUrl}/api/sessions/${encodeURIComponent(sessionId)}/analyze-frame`,
+        formData,
+        {
+          headers: formData.getHeaders(),
+          params: detectionFilterParams(filter),
+          timeout: 30000,
+        }
+      );
+
+      return response.data;
+    } catch (error) {
+      console.error('Session frame analysis error:', error);
+      throw new Error('Failed to analyze session frame');
+    }
+  }
+
+  async finalizeSession(
+    sessionId: string,
+    positions: Record<string, string> = {}
+  ): Promise<SessionFinalizeResult> {
+    try {
+      const response = await axios.post(
+        `${this.baseUrl}/api/sessions/${encodeURIComponent(sessionId)}/finalize`,
+        {
+          positions,
+        },
+        {
+          timeout: 10000,
+        }
+      );
+
+      return response.data;
+    } catch (error) {
+      console.error('Session finalize error:', error);
+      throw new Error('Failed to finalize analytics session');
+    }
+  }
+
+  async getSessionHeatmaps(
+    sessionId: string,
+    options: { players?: string[]; teams?: string[]; resolution?: string } = {}
+  ): Promise<SessionHeatmaps> {
+    try {
+      const response = await axios.get(
+        `${this.baseUrl}/api/sessions/${encodeURIComponent(sessionId)}/heatmaps`,
+        {
+          params: {
+            players: options.players?.join(','),
+            teams: options.teams?.join(','),
+            resolution: options.resolution,
+          },
+          timeout: 10000,
+        }
+      );
+
+      return response.data;
+    } catch (error) {
+      console.error('Session heatmap error:', error);
+      throw new Error('Failed to fetch session heatmaps');
+    }
+  }
+
+  // Server-Sent Events URL of a session's live feed ('keyframe' and 'delta' events), for an EventSource or a proxy
+  getLiveSessionUrl(sessionId: string): string {
+    return `${this.baseUrl}/api/sessions/${encodeURIComponent(sessionId)}/live`;
+  }
+
+  async endSession(sessionId: string): Promise<MatchSessionSummary> {
+    try {
+      const response = await axios.delete(
+        `${this.baseUrl}/api/sessions/${encodeURIComponent(sessionId)}`,
+        {
+          timeout: 5000,
+        }
+      );
+
+      return response.data;
+    } catch (error) {
+      console.error('Session end error:', error);
+      throw new Error('Failed to end analytics session');
+    }
+  }
+
   async analyzePerformance(
     playerData: Record<string, number>,
     position: string
@@ -178,40 +627,77 @@ export class PlayerAnalyticsAPI {
   }
 
   async analyzeVideoStream(
-    videoBuffer: Buffer,
-    onFrameAnalyzed?: (result: FrameAnalysisResult) => void
+    video: Buffer | NodeJS.ReadableStream,
+    onFrameAnalyzed?: (result: StreamFrameResult) => void,
+    options: VideoStreamOptions = {}
   ): Promise<{
     total_frames: number;
     average_players: number;
     formations_detected: string[];
     highlights: any[];
+    summary?: StreamSummary;
   }> {
     try {
-      // Extract frames from video (simplified - in production use ffmpeg)
-      const frames = await this.extractFrames(videoBuffer);
-
-      const results: FrameAnalysisResult[] = [];
-
-      for (const frame of frames) {
-        const result = await this.analyzeFrame(frame);
-        results.push(result);
+      // The server decodes while we upload and answers with one NDJSON line per analyzed frame
+      const url = options.sessionId
+        ? `${this.baseUrl}/api/sessions/${encodeURIComponent(options.sessionId)}/stream`
+        : `${this.baseUrl}/api/analyze-video`;
+      const response = await axios.post(url, video, {
+        headers: { 'Content-Type': options.contentType || 'video/mp4' },
+        params: {
+          fps: options.fps,
+          every: options.every,
+          camera_id: options.cameraId,
+          motion_threshold: options.motionThreshold,
+          max_gap: options.maxGap,
+          ...detectionFilterParams(options.filter),
+        },
+        responseType: 'stream',
+        maxBodyLength: Infinity,
+        maxContentLength: Infinity,
+        timeout: 0,
+      });
 
+      const results: StreamFrameResult[] = [];
+      let summary: StreamSummary | undefined;
+      let pending = '';
+      const handleLine = (line: string) => {
+        if (!line.trim()) return;
+        const message = JSON.parse(line);
+        if (message.error && message.frame === undefined) {
+          throw new Error(message.error);
+        }
+        if (message.done) {
+          summary = message;
+          return;
+        }
+        results.push(message);
         if (onFrameAnalyzed) {
-          onFrameAnalyzed(result);
+          onFrameAnalyzed(message);
         }
+      };
+
+      for await (const chunk of response.data) {
+        pending += chunk.toString();
+        const lines = pending.split('\n');
+        pending = lines.pop() || '';
+        lines.forEach(handleLine);
       }
+      handleLine(pending);
 
       // Aggregate results
-      const totalPlayers = results.reduce((sum, r) => sum + r.players_detected, 0);
-      const formations = results
+      const analyzed = results.filter(r => r.success);
+      const totalPlayers = analyzed.reduce((sum, r) => sum + r.players_detected, 0);
+      const formations = analyzed
         .map(r => r.analytics?.formation?.formation)
         .filter((f, i, arr) => f && arr.indexOf(f) === i);
 
       return {
         total_frames: results.length,
-        average_players: totalPlayers / results.length,
+        average_players: analyzed.length ? totalPlayers / analyzed.length : 0,
         formations_detected: formations as string[],
-        highlights: this.identifyHighlights(results),
+        highlights: this.identifyHighlights(analyzed),
+        summary,
       };
     } catch (error) {
       console.error('Video stream analysis error:', error);
@@ -219,13 +705,103 @@ export class PlayerAnalyticsAPI {
     }
   }
 
-  private async extractFrames(videoBuffer: Buffer): Promise<Buffer[]> {
-    // Simplified frame extraction
-    // In production, use ffmpeg to extract frames at intervals
-    return [videoBuffer];
+  async submitVideoJob(video: Buffer | NodeJS.ReadableStream, options: VideoJobOptions = {}): Promise<AnalysisJob> {
+    try {
+      const response = await axios.post(`${this.baseUrl}/api/jobs`, video, {
+        headers: { 'Content-Type': options.contentType || 'video/mp4' },
+        params: {
+          session_id: options.sessionId,
+          fps: options.fps,
+          every: options.every,
+          camera_id: options.cameraId,
+          motion_threshold: options.motionThreshold,
+          max_gap: options.maxGap,
+          max_frames: options.maxFrames,
+          max_seconds: options.maxSeconds,
+          max_bytes: options.maxBytes,
+          ...detectionFilterParams(options.filter),
+        },
+        maxBodyLength: Infinity,
+        timeout: 0,
+      });
+
+      return response.data;
+    } catch (error) {
+      console.error('Video job submission error:', error);
+      throw new Error('Failed to submit video analysis job');
+    }
+  }
+
+  async getJob(jobId: string): Promise<AnalysisJob> {
+    try {
+      const response = await axios.get(`${this.baseUrl}/api/jobs/${encodeURIComponent(jobId)}`, {
+        timeout: 5000,
+      });
+
+      return response.data;
+    } catch (error) {
+      console.error('Job status error:', error);
+      throw new Error('Failed to fetch analysis job');
+    }
+  }
+
+  async waitForJob(
+    jobId: string,
+    options: { pollInterval?: number; onProgress?: (job: AnalysisJob) => void } = {}
+  ): Promise<AnalysisJob> {
+    const pollInterval = options.pollInterval ?? 2000;
+    for (;;) {
+      const job = await this.getJob(jobId);
+      if (options.onProgress) {
+        options.onProgress(job);
+      }
+      if (job.state !== 'queued' && job.state !== 'running') {
+        return job;
+      }
+      await new Promise(resolve => setTimeout(resolve, pollInterval));
+    }
+  }
+
+  async getJobResults(jobId: string): Promise<{ results: StreamFrameResult[]; summary?: StreamSummary }> {
+    try {
+      const response = await axios.get(`${this.baseUrl}/api/jobs/${encodeURIComponent(jobId)}/result`, {
+        responseType: 'text',
+        maxContentLength: Infinity,
+        timeout: 60000,
+      });
+
+      const results: StreamFrameResult[] = [];
+      let summary: StreamSummary | undefined;
+      for (const line of (response.data as string).split('\n')) {
+        if (!line.trim()) continue;
+        const message = JSON.parse(line);
+        if (message.done) {
+          summary = message;
+        } else {
+          results.push(message);
+        }
+      }
+      return { results, summary };
+    } catch (error) {
+      console.error('Job results error:', error);
+      throw new Error('Failed to download analysis job results');
+    }
+  }
+
+  async cancelJob(jobId: string): Promise<AnalysisJob> {
+    try {
+      const response = await axios.delete(`${this.baseUrl}/api/jobs/${encodeURIComponent(jobId)}`, {
+        timeout: 5000,
+      });
+
+      return response.data;
+    } catch (error) {
+      console.error('Job cancel error:', error);
+      throw new Error('Failed to cancel analysis job');
+    }
   }
 
-  private identifyHighlights(results: FrameAnalysisResult[]): any[] {
+  private identifyHighlights(results: StreamFrameResult[]): any[] {
     const highlights = [];
 
     for (let i = 0; i < results.length; i++) {
@@ -234,19 +810,19 @@ export class PlayerAnalyticsAPI {
       // Detect interesting moments
       if (result.analytics?.player_density > 0.5) {
         highlights.push({
-          frame: i,
+          frame: result.frame,
           type: 'high_action',
           description: 'High player density - potential action moment',
-          timestamp: i * 2, // Assuming 2 seconds per frame
+          timestamp: result.timestamp,
         });
       }
 
       if (result.analytics?.formation?.confidence > 0.8) {
         highlights.push({
-          frame: i,
+          frame: result.frame,
           type: 'formation_change',
           description: `Clear ${result.analytics.formation.formation} formation`,
-          timestamp: i * 2,
+          timestamp: result.timestamp,
         });
       }
     }
@@ -5,24 +5,115 @@ Provides real-time analysis of player performance
 """
 
 import os
-import sys
-import json
-import base64
+import time
+import shutil
+import tempfile
+import asyncio
+from contextlib import closing
 import numpy as np
-from typing import Dict, List, Any, Tuple
-from io import BytesIO
-from PIL import Image
-import requests
-from flask import Flask, request, jsonify
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Any, Tuple, Optional, Iterable, Iterator
+from flask import Flask, Request, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from analytics import batch_metrics, encoding, streaming
+from analytics.frames import InputTransform
+from analytics.detector_client import (RoboflowClient, AsyncRoboflowClient, CircuitBreaker, DetectorUnavailable,
+                                       async_supported)
+from analytics.detectors import DetectorBackend, RoboflowBackend, LocalModelBackend, ReplayBackend, RecordingBackend
+from analytics.detection_cache import DetectionCache, make_key
+from analytics.sessions import SessionRegistry, SessionNotFound, MatchSession
+from analytics.homography import CalibrationStore, PitchCalibration, PITCH_LENGTH, PITCH_WIDTH
+from analytics.heatmaps import parse_resolution
+from analytics.teams import assign_teams
+from analytics.postprocess import DetectionFilter, filter_detections
+from analytics.detections import FrameDetections
+from analytics.sampling import THUMBNAIL_WIDTH
+from analytics.workers import FramePool
+from analytics.jobs import Job, JobQueue, JobNotFound, JobLimitExceeded, QueueFull
+from analytics.transport import FrameServer
+from analytics.uploads import UploadBuffer, UploadTooLarge, read_upload
+from analytics.live import DEFAULT_KEYFRAME_INTERVAL
+from analytics.api import RequestParser, RequestError, heatmap_filename, job_result_path
 
 app = Flask(__name__)
+app.json = encoding.AnalyticsJSONProvider(app)
 CORS(app)
 
 # Configuration
 ROBOFLOW_API_KEY = os.getenv('ROBOFLOW_API_KEY', '')
 ROBOFLOW_WORKSPACE = os.getenv('ROBOFLOW_WORKSPACE', 'sportwarren')
 ROBOFLOW_MODEL = os.getenv('ROBOFLOW_MODEL', 'football-player-detection')
+ROBOFLOW_API_URL = os.getenv('ROBOFLOW_API_URL', 'https://detect.roboflow.com')
+ROBOFLOW_DEADLINE = float(os.getenv('ROBOFLOW_DEADLINE', 5.0))
+ROBOFLOW_MAX_RETRIES = int(os.getenv('ROBOFLOW_MAX_RETRIES', 2))
+ROBOFLOW_MAX_CONCURRENCY = int(os.getenv('ROBOFLOW_MAX_CONCURRENCY', 8))
+# Requests in flight from the asyncio server (aio.py), where each one is a coroutine rather than a thread
+ROBOFLOW_ASYNC_CONCURRENCY = int(os.getenv('ROBOFLOW_ASYNC_CONCURRENCY', 256))
+ROBOFLOW_BREAKER_THRESHOLD = int(os.getenv('ROBOFLOW_BREAKER_THRESHOLD', 5))
+ROBOFLOW_BREAKER_RESET = float(os.getenv('ROBOFLOW_BREAKER_RESET', 30.0))
+ROBOFLOW_CONFIDENCE = 40
+ROBOFLOW_OVERLAP = 30
+# Detectors return everything above this floor; thresholds and NMS are applied locally
+DETECTION_RAW_CONFIDENCE = int(os.getenv('DETECTION_RAW_CONFIDENCE', 10))
+DETECTION_CLASSES = [c for c in os.getenv('DETECTION_CLASSES', '').split(',') if c] or None
+DETECTION_CACHE_SIZE = int(os.getenv('DETECTION_CACHE_SIZE', 2048))
+DETECTION_CACHE_TTL = float(os.getenv('DETECTION_CACHE_TTL', 3600))
+DETECTION_CACHE_DIR = os.getenv('DETECTION_CACHE_DIR') or None
+DETECTION_CACHE_PHASH_DISTANCE = os.getenv('DETECTION_CACHE_PHASH_DISTANCE')
+SESSION_IDLE_TIMEOUT = float(os.getenv('ANALYTICS_SESSION_IDLE_TIMEOUT', 1800))
+MAX_SESSIONS = int(os.getenv('ANALYTICS_MAX_SESSIONS', 256))
+CALIBRATION_FILE = os.getenv('ANALYTICS_CALIBRATION_FILE') or None
+HEATMAP_RESOLUTION = parse_resolution(os.getenv('ANALYTICS_HEATMAP_RESOLUTION'))
+FORMATION_WINDOW = int(os.getenv('ANALYTICS_FORMATION_WINDOW', 25))
+# Session frames skip detection unless this share of thumbnail pixels moved (<= 0: detect every frame)
+MOTION_THRESHOLD = float(os.getenv('ANALYTICS_MOTION_THRESHOLD', 0.005))
+MOTION_MAX_GAP = int(os.getenv('ANALYTICS_MOTION_MAX_GAP', 5))
+TEAM_CLASSIFICATION = os.getenv('ANALYTICS_TEAM_CLASSIFICATION', '1') != '0'
+MAX_BATCH_FRAMES = int(os.getenv('ANALYTICS_MAX_BATCH_FRAMES', 64))
+DETECTION_CONCURRENCY = int(os.getenv('ANALYTICS_DETECTION_CONCURRENCY', 8))
+# Worker processes for decode/resize/jersey sampling (0: threads in this process)
+CPU_WORKERS = int(os.getenv('ANALYTICS_CPU_WORKERS', 0))
+# Batch frames go to the detector in chunks of this size as soon as they are prepared
+DETECTION_CHUNK = int(os.getenv('ANALYTICS_DETECTION_CHUNK', 16))
+DETECTOR_BACKEND = os.getenv('DETECTOR_BACKEND', 'roboflow').lower()
+DETECTOR_MODEL_PATH = os.getenv('DETECTOR_MODEL_PATH', 'models/player-detector.onnx')
+DETECTOR_INPUT_SIZE = int(os.getenv('DETECTOR_INPUT_SIZE', 640))
+# Frames are shrunk to this longer side before detection (0: send full resolution)
+DETECTION_INPUT_SIZE = int(os.getenv('ANALYTICS_DETECTION_INPUT_SIZE', DETECTOR_INPUT_SIZE))
+# Crop to the calibrated pitch (plus a margin in metres) before detection
+DETECTION_ROI = os.getenv('ANALYTICS_DETECTION_ROI', '0') == '1'
+DETECTION_ROI_MARGIN = float(os.getenv('ANALYTICS_DETECTION_ROI_MARGIN', 3.0))
+DETECTOR_CLASSES = tuple(os.getenv('DETECTOR_CLASSES', 'ball,goalkeeper,player,referee').split(','))
+DETECTOR_REPLAY_FILE = os.getenv('DETECTOR_REPLAY_FILE') or None
+# Load tests only: the replay detector makes up players for frames it has no recording of
+DETECTOR_REPLAY_SYNTHETIC = os.getenv('DETECTOR_REPLAY_SYNTHETIC', '0') == '1'
+DETECTOR_RECORD_FILE = os.getenv('DETECTOR_RECORD_FILE') or None
+STREAM_QUEUE_SIZE = int(os.getenv('ANALYTICS_STREAM_QUEUE_SIZE', 8))
+STREAM_BATCH_SIZE = int(os.getenv('ANALYTICS_STREAM_BATCH_SIZE', 8))
+STREAM_MAX_FRAME_BYTES = int(os.getenv('ANALYTICS_STREAM_MAX_FRAME_BYTES', 8 * 1024 * 1024))
+# Whole-request ceiling for frame uploads and JSON bodies (0: unlimited); video streams and jobs have their own
+MAX_UPLOAD_BYTES = int(os.getenv('ANALYTICS_MAX_UPLOAD_BYTES', 64 * 1024 * 1024))
+FFMPEG_PATH = os.getenv('FFMPEG_PATH') or shutil.which('ffmpeg')
+JOB_WORKERS = int(os.getenv('ANALYTICS_JOB_WORKERS', 2))
+JOB_QUEUE_SIZE = int(os.getenv('ANALYTICS_JOB_QUEUE_SIZE', 16))
+JOB_DIR = os.getenv('ANALYTICS_JOB_DIR') or os.path.join(tempfile.gettempdir(), 'player-analytics-jobs')
+JOB_TTL = float(os.getenv('ANALYTICS_JOB_TTL', 86400))
+# Per-job ceilings (0: unlimited); a job may ask for lower ones
+JOB_MAX_BYTES = int(os.getenv('ANALYTICS_JOB_MAX_BYTES', 4 * 1024 ** 3))
+JOB_MAX_FRAMES = int(os.getenv('ANALYTICS_JOB_MAX_FRAMES', 0))
+JOB_MAX_SECONDS = float(os.getenv('ANALYTICS_JOB_MAX_SECONDS', 4 * 3600))
+# Unix socket for the co-located length-prefixed frame transport (unset: HTTP only)
+FRAME_SOCKET = os.getenv('ANALYTICS_FRAME_SOCKET') or None
+# Requests read ahead of their answers per frame-socket connection; beyond this the socket pushes back
+FRAME_SOCKET_MAX_IN_FLIGHT = int(os.getenv('ANALYTICS_FRAME_SOCKET_MAX_IN_FLIGHT', 16))
+# Reported for frames the detector couldn't serve (outage, open breaker); they never reach a session
+DETECTION_FAILED = 'Detector returned no result for this frame'
+# Live feeds send a full keyframe every this many updates; idle feeds send a keepalive comment this often
+LIVE_KEYFRAME_INTERVAL = int(os.getenv('ANALYTICS_LIVE_KEYFRAME_INTERVAL', DEFAULT_KEYFRAME_INTERVAL))
+LIVE_HEARTBEAT = float(os.getenv('ANALYTICS_LIVE_HEARTBEAT', 15.0))
 
 class PlayerAnalyticsService:
     """Advanced player analytics using computer vision"""
@@ -30,6 +121,41 @@ class PlayerAnalyticsService:
     def __init__(self):
         self.roboflow_api_key = ROBOFLOW_API_KEY
         self.professional_benchmarks = self._load_pro_benchmarks()
+        self.frame_pool = FramePool(CPU_WORKERS, DETECTION_CONCURRENCY)
+        self._detection_pool = ThreadPoolExecutor(max_workers=DETECTION_CONCURRENCY)
+        self.detector = self._create_detector()
+        self.default_filter = DetectionFilter(ROBOFLOW_CONFIDENCE, ROBOFLOW_OVERLAP, DETECTION_CLASSES)
+        self.detection_cache = DetectionCache(
+            max_entries=DETECTION_CACHE_SIZE,
+            ttl=DETECTION_CACHE_TTL,
+            disk_dir=DETECTION_CACHE_DIR,
+            phash_distance=int(DETECTION_CACHE_PHASH_DISTANCE) if DETECTION_CACHE_PHASH_DISTANCE else None
+        )
+        self.sessions = SessionRegistry(idle_timeout=SESSION_IDLE_TIMEOUT, max_sessions=MAX_SESSIONS)
+        self.calibrations = CalibrationStore(CALIBRATION_FILE)
+        self.jobs = JobQueue(self.run_job, JOB_DIR, JOB_WORKERS, JOB_QUEUE_SIZE, JOB_TTL)
+        self.draining = False
+    
+    def preload(self):
+        """Load shared state before a pre-forking server forks its workers"""
+        self.detector.preload()
+    
+    def readiness(self) -> Dict[str, Any]:
+        """Whether this worker should receive traffic"""
+        # A hosted detector being down is not a reason to pull every instance; requests degrade instead
+        checks = {
+            'accepting': not self.draining,
+            'detector': self.detector.ready(),
+            'job_dir': os.access(JOB_DIR, os.W_OK)
+        }
+        return {'ready': all(checks.values()), 'checks': checks}
+    
+    def shutdown(self):
+        """Start draining: report not ready, stop taking jobs, cancel the running ones and end live feeds"""
+        self.draining = True
+        self.jobs.shutdown()
+        # Viewers would otherwise hold their connections open through the whole graceful timeout
+        self.sessions.close_feeds()
         
     def _load_pro_benchmarks(self) -> Dict[str, Any]:
         """Load professional player performance benchmarks"""
@@ -66,30 +192,21 @@ class PlayerAnalyticsService:
             }
         }
     
-    def analyze_frame(self, image_data: bytes) -> Dict[str, Any]:
+    def analyze_frame(self, image_data: bytes, session: Optional[MatchSession] = None,
+                      timestamp: Optional[float] = None, camera_id: Optional[str] = None,
+                      detection_filter: Optional[DetectionFilter] = None) -> Dict[str, Any]:
         """Analyze a single frame for player detection and tracking"""
         try:
-            # Decode image
-            image = Image.open(BytesIO(image_data))
+            calibration = self._calibration_for(session, camera_id)
             
-            # Convert to base64 for Roboflow API
-            buffered = BytesIO()
-            image.save(buffered, format="JPEG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
+            # Model-sized (and optionally pitch-cropped) JPEG for the detector
+            jpeg_data, transform, frame_size, current = self._prepare_frames([image_data], calibration, session)[0].result()
             
-            # Detect players using Roboflow
-            players = self._detect_players_roboflow(img_str)
+            # Within a session, near-static frames skip the detector and use the tracker's prediction
+            detected = session is None or session.sampler.select(jpeg_data, current)
+            detections = self._detect_players(jpeg_data, session, detection_filter, transform) if detected else None
             
-            # Analyze player positions and movements
-            analytics = self._analyze_player_movements(players, image.size)
-            
-            return {
-                'success': True,
-                'players_detected': len(players),
-                'players': players,
-                'analytics': analytics,
-                'frame_size': image.size
-            }
+            return self._frame_result(detections, detected, frame_size, timestamp, calibration, session)
         except Exception as e:
             return {
                 'success': False,
@@ -97,190 +214,522 @@ class PlayerAnalyticsService:
                 'players_detected': 0
             }
     
-    def _detect_players_roboflow(self, image_base64: str) -> List[Dict[str, Any]]:
-        """Detect players using Roboflow Rapid API"""
+    async def analyze_frame_async(self, image_data: bytes, session: Optional[MatchSession] = None,
+                                  timestamp: Optional[float] = None, camera_id: Optional[str] = None,
+                                  detection_filter: Optional[DetectionFilter] = None) -> Dict[str, Any]:
+        """analyze_frame for an event loop: the detector is awaited and CPU work runs on the pools"""
         try:
-            url = f"https://detect.roboflow.com/{ROBOFLOW_MODEL}/1"
-            params = {
-                "api_key": self.roboflow_api_key,
-                "confidence": 40,
-                "overlap": 30
-            }
+            calibration = self._calibration_for(session, camera_id)
+            prepared = self._prepare_frames([image_data], calibration, session)[0]
+            jpeg_data, transform, frame_size, current = await asyncio.wrap_future(prepared)
             
-            # For demo purposes, return mock data if API key not configured
-            if not self.roboflow_api_key:
-                return self._generate_mock_detections()
+            detected = session is None or session.sampler.select(jpeg_data, current)
+            detections = None
+            if detected:
+                detections = (await self._detect_batch_async([jpeg_data], session, detection_filter, [transform]))[0]
+                if detections is None:
+                    raise DetectorUnavailable(DETECTION_FAILED)
             
-            response = requests.post(
-                url,
-                params=params,
-                data=image_base64,
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._frame_result, detections, detected, frame_size, timestamp, calibration, session
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return self._process_roboflow_response(result)
-            else:
-                return self._generate_mock_detections()
-                
         except Exception as e:
-            print(f"Roboflow detection error: {e}")
-            return self._generate_mock_detections()
-    
-    def _generate_mock_detections(self) -> List[Dict[str, Any]]:
-        """Generate mock player detections for demo"""
-        return [
-            {
-                'player_id': f'player_{i}',
-                'position': {'x': np.random.randint(50, 950), 'y': np.random.randint(50, 550)},
-                'bbox': {'x': np.random.randint(50, 950), 'y': np.random.randint(50, 550), 
-                         'width': 80, 'height': 120},
-                'confidence': np.random.uniform(0.75, 0.95),
-                'team': 'home' if i % 2 == 0 else 'away'
-            }
-            for i in range(np.random.randint(8, 14))
-        ]
-    
-    def _process_roboflow_response(self, response: Dict) -> List[Dict[str, Any]]:
-        """Process Roboflow API response"""
-        players = []
-        for idx, prediction in enumerate(response.get('predictions', [])):
-            player = {
-                'player_id': f"player_{idx}",
-                'position': {
-                    'x': prediction['x'],
-                    'y': prediction['y']
-                },
-                'bbox': {
-                    'x': prediction['x'],
-                    'y': prediction['y'],
-                    'width': prediction['width'],
-                    'height': prediction['height']
-                },
-                'confidence': prediction['confidence'],
-                'class': prediction.get('class', 'player'),
-                'team': self._classify_team(prediction)
+            return {
+                'success': False,
+                'error': str(e),
+                'players_detected': 0
             }
-            players.append(player)
-        return players
     
-    def _classify_team(self, prediction: Dict) -> str:
-        """Classify player team based on detection"""
-        # This would use color analysis or jersey detection
-        # For now, simple heuristic
-        return 'home' if prediction.get('class', '') == 'player' else 'away'
+    def _frame_result(self, detections: Optional[FrameDetections], detected: bool, frame_size: Tuple[int, int],
+                      timestamp: Optional[float], calibration: Optional[PitchCalibration],
+                      session: Optional[MatchSession]) -> Dict[str, Any]:
+        """Track and measure one detected (or skipped) frame into its result"""
+        # Persistent player IDs and running metrics within a match session
+        if session is not None:
+            (detections,), (match_time,) = self._update_session(session, [detections], [frame_size], [timestamp],
+                                                                calibration)
+        
+        # Analyze player positions and movements
+        analytics = self._analyze_player_movements(detections, frame_size, calibration, session)
+        if session is not None:
+            session.live.publish(detections, analytics, match_time)
+        
+        return {
+            'success': True,
+            'players_detected': len(detections),
+            'players': detections,
+            'detected': detected,
+            'analytics': analytics,
+            'frame_size': frame_size
+        }
     
-    def _analyze_player_movements(self, players: List[Dict], frame_size: Tuple[int, int]) -> Dict:
-        """Analyze player movements and positioning"""
-        if not players:
-            return {'error': 'No players detected'}
+    def analyze_frames(self, frames: List[bytes], session: Optional[MatchSession] = None,
+                       timestamps: Optional[List[float]] = None, camera_id: Optional[str] = None,
+                       detection_filter: Optional[DetectionFilter] = None) -> Dict[str, Any]:
+        """Analyze a batch of frames with concurrent detection and vectorized analytics"""
+        started = time.perf_counter()
+        calibration = self._calibration_for(session, camera_id)
+        results: List[Dict[str, Any]] = [None] * len(frames)
+        
+        # Every frame is shrunk for the detector on the frame pool at once
+        prepared = self._prepare_frames(frames, calibration, session)
         
-        width, height = frame_size
+        # Each chunk goes to the detector as soon as it is ready, so detector I/O overlaps the remaining decodes
+        encoded = []
+        selected = []
+        dispatched = []
+        for start in range(0, len(frames), DETECTION_CHUNK):
+            chunk = range(start, min(start + DETECTION_CHUNK, len(frames)))
+            keyframes = self._select_frames(chunk, prepared, session, results, encoded, selected)
+            if keyframes:
+                dispatched.append(self._detection_pool.submit(
+                    self._detect_batch, [jpeg_data for jpeg_data, _ in keyframes], session, detection_filter,
+                    [transform for _, transform in keyframes]
+                ))
+        decoded_at = time.perf_counter()
         
-        # Calculate field coverage
-        positions = [p['position'] for p in players]
-        coverage = self._calculate_field_coverage(positions, width, height)
+        fresh = iter([frame_detections for future in dispatched for frame_detections in future.result()])
+        detections = [next(fresh) if detect else None for detect in selected]
+        detected_at = time.perf_counter()
         
-        # Detect formation
-        formation = self._detect_formation(players, width, height)
+        return self._batch_result(frames, results, encoded, selected, detections, timestamps, calibration, session,
+                                  started, decoded_at, detected_at)
+    
+    async def analyze_frames_async(self, frames: List[bytes], session: Optional[MatchSession] = None,
+                                   timestamps: Optional[List[float]] = None, camera_id: Optional[str] = None,
+                                   detection_filter: Optional[DetectionFilter] = None) -> Dict[str, Any]:
+        """analyze_frames for an event loop: every chunk's detector calls are in flight at once as coroutines"""
+        started = time.perf_counter()
+        calibration = self._calibration_for(session, camera_id)
+        results: List[Dict[str, Any]] = [None] * len(frames)
+        prepared = self._prepare_frames(frames, calibration, session)
         
-        # Calculate tactical metrics
-        compactness = self._calculate_team_compactness(players)
+        encoded = []
+        selected = []
+        dispatched = []
+        for start in range(0, len(frames), DETECTION_CHUNK):
+            chunk = range(start, min(start + DETECTION_CHUNK, len(frames)))
+            # Selection only reads finished futures, so the loop never waits on a decode
+            await asyncio.wait([asyncio.wrap_future(prepared[idx]) for idx in chunk])
+            keyframes = self._select_frames(chunk, prepared, session, results, encoded, selected)
+            if keyframes:
+                dispatched.append(asyncio.ensure_future(self._detect_batch_async(
+                    [jpeg_data for jpeg_data, _ in keyframes], session, detection_filter,
+                    [transform for _, transform in keyframes]
+                )))
+        decoded_at = time.perf_counter()
         
-        return {
-            'field_coverage': coverage,
-            'formation': formation,
-            'team_compactness': compactness,
-            'player_density': len(players) / (width * height) * 10000
-        }
+        fresh = iter([frame_detections for batch in await asyncio.gather(*dispatched) for frame_detections in batch])
+        detections = [next(fresh) if detect else None for detect in selected]
+        detected_at = time.perf_counter()
+        
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._batch_result, frames, results, encoded, selected, detections, timestamps, calibration,
+            session, started, decoded_at, detected_at
+        )
     
-    def _calculate_field_coverage(self, positions: List[Dict], width: int, height: int) -> float:
-        """Calculate how much of the field is covered by players"""
-        if not positions:
-            return 0.0
+    def _select_frames(self, chunk: Iterable[int], prepared: List[Future], session: Optional[MatchSession],
+                       results: List[Dict[str, Any]], encoded: List[Tuple[int, bytes, Tuple[int, int]]],
+                       selected: List[bool]) -> List[Tuple[bytes, Optional[InputTransform]]]:
+        """Collect a chunk of prepared frames in order; returns the (JPEG, transform) pairs that need the detector"""
+        keyframes = []
+        for idx in chunk:
+            try:
+                jpeg_data, transform, frame_size, current = prepared[idx].result()
+            except Exception as e:
+                results[idx] = {
+                    'success': False,
+                    'error': str(e),
+                    'players_detected': 0
+                }
+                continue
+            encoded.append((idx, jpeg_data, frame_size))
+            # Motion sampling within a session; skipped frames are filled in by tracking
+            detect = session is None or session.sampler.select(jpeg_data, current)
+            selected.append(detect)
+            if detect:
+                keyframes.append((jpeg_data, transform))
+        return keyframes
+    
+    def _batch_result(self, frames: List[bytes], results: List[Dict[str, Any]],
+                      encoded: List[Tuple[int, bytes, Tuple[int, int]]], selected: List[bool],
+                      detections: List[Optional[FrameDetections]], timestamps: Optional[List[float]],
+                      calibration: Optional[PitchCalibration], session: Optional[MatchSession],
+                      started: float, decoded_at: float, detected_at: float) -> Dict[str, Any]:
+        """Track and measure a detected batch into the analyze_frames result"""
+        # Frames the detector failed on are reported as failed and kept out of tracking and analytics
+        kept = []
+        for entry, detect, frame_detections in zip(encoded, selected, detections):
+            if detect and frame_detections is None:
+                results[entry[0]] = {'success': False, 'error': DETECTION_FAILED, 'players_detected': 0}
+            else:
+                kept.append((entry, detect, frame_detections))
+        encoded, selected, detections = (list(column) for column in zip(*kept)) if kept else ([], [], [])
         
-        # Create grid and mark occupied cells
-        grid_size = 20
-        grid = np.zeros((grid_size, grid_size))
+        # Tracking must see the batch in frame order
+        if session is not None:
+            detections, match_times = self._update_session(
+                session, detections,
+                [frame_size for _, _, frame_size in encoded],
+                [timestamps[idx] if timestamps else None for idx, _, _ in encoded],
+                calibration
+            )
         
-        for pos in positions:
-            grid_x = int((pos['x'] / width) * grid_size)
-            grid_y = int((pos['y'] / height) * grid_size)
-            if 0 <= grid_x < grid_size and 0 <= grid_y < grid_size:
-                grid[grid_y, grid_x] = 1
+        # One vectorized pass over all frames
+        frame_sizes = [frame_size for _, _, frame_size in encoded]
+        analytics = self._analyze_batch(detections, frame_sizes, calibration, session)
+        if session is not None:
+            for frame_detections, frame_analytics, match_time in zip(detections, analytics, match_times):
+                session.live.publish(frame_detections, frame_analytics, match_time)
+        finished = time.perf_counter()
         
-        return float(np.sum(grid) / (grid_size * grid_size))
+        # Players stay columnar; the response encoding decides their final form
+        for (idx, _, frame_size), frame_detections, detect, frame_analytics in zip(encoded, detections, selected, analytics):
+            results[idx] = {
+                'success': True,
+                'players_detected': len(frame_detections),
+                'players': frame_detections,
+                'detected': detect,
+                'analytics': frame_analytics,
+                'frame_size': frame_size
+            }
+        
+        total_seconds = finished - started
+        return {
+            'success': True,
+            'frames': len(frames),
+            'frames_analyzed': len(encoded),
+            'detector_frames': sum(selected),
+            'results': results,
+            'timing': {
+                'decode_ms': (decoded_at - started) * 1000,
+                'detection_ms': (detected_at - decoded_at) * 1000,
+                'analytics_ms': (finished - detected_at) * 1000,
+                'total_ms': total_seconds * 1000,
+                'frames_per_second': len(frames) / total_seconds if total_seconds > 0 else 0.0
+            }
+        }
     
-    def _detect_formation(self, players: List[Dict], width: int, height: int) -> Dict:
-        """Detect team formation from player positions"""
-        home_players = [p for p in players if p.get('team') == 'home']
+    def analyze_stream(self, frames: Iterable[bytes], session: MatchSession, fps: Optional[float] = None,
+                       every: int = 1, detection_filter: Optional[DetectionFilter] = None) -> Iterator[Dict[str, Any]]:
+        """Analyze a lazily decoded frame stream, yielding each sampled frame's result as soon as it is ready"""
+        fps = fps or session.fps
+        calibration = self._calibration_for(session, None)
+        received = [0]
+        # A session's clock carries on across streams and jobs: this video starts one frame after the last
+        start = session.match_time + 1 / fps if session.frames_processed else 0.0
         
-        if len(home_players) < 7:
-            return {'formation': 'unknown', 'confidence': 0.0}
+        def sample():
+            for index, jpeg_data in enumerate(frames):
+                received[0] = index + 1
+                if index % every == 0:
+                    yield {'frame': index, 'timestamp': start + index / fps, 'jpeg': jpeg_data}
         
-        # Analyze vertical distribution
-        y_positions = [p['position']['y'] for p in home_players]
-        y_positions.sort()
+        def select(batch):
+            prepared = self._prepare_frames([item.pop('jpeg') for item in batch], calibration, session)
+            for item, future in zip(batch, prepared):
+                try:
+                    item['jpeg'], item['transform'], item['frame_size'], current = future.result()
+                    item['detected'] = session.sampler.select(item['jpeg'], current)
+                except Exception as e:
+                    item.update(success=False, error=str(e), players_detected=0)
+            return batch
         
-        # Detect lines (defenders, midfielders, forwards)
-        lines = self._cluster_positions(y_positions, height)
+        def detect(batch):
+            ready = [item for item in batch if item.get('detected')]
+            detections = self._detect_batch(
+                [item['jpeg'] for item in ready], session, detection_filter, [item['transform'] for item in ready]
+            )
+            for item, frame_detections in zip(ready, detections):
+                if frame_detections is None:
+                    # Not tracked or measured: there is nothing real to add to the session
+                    item.pop('frame_size')
+                    item.update(success=False, error=DETECTION_FAILED, players_detected=0)
+                else:
+                    item['players'] = frame_detections
+            for item in batch:
+                item.pop('jpeg', None)
+                item.pop('transform', None)
+            return batch
+        
+        def track(batch):
+            # Long uploads must not let the session idle out
+            session.touch()
+            ready = [item for item in batch if 'frame_size' in item]
+            tracked, _ = self._update_session(
+                session, [item.get('players') for item in ready], [item['frame_size'] for item in ready],
+                [item['timestamp'] for item in ready], calibration
+            )
+            for item, frame_detections in zip(ready, tracked):
+                item['players'] = frame_detections
+            return batch
+        
+        def measure(batch):
+            ready = [item for item in batch if 'players' in item]
+            analytics = self._analyze_batch(
+                [item['players'] for item in ready], [item['frame_size'] for item in ready], calibration, session
+            )
+            for item, frame_analytics in zip(ready, analytics):
+                item.update(success=True, players_detected=len(item['players']), analytics=frame_analytics)
+                session.live.publish(item['players'], frame_analytics, item['timestamp'])
+            return batch
         
-        formations_map = {
-            3: '4-3-3',
-            4: '4-4-2',
+        sampled = analyzed = 0
+        for result in streaming.pipeline(sample(), [select, detect, track, measure], STREAM_QUEUE_SIZE, STREAM_BATCH_SIZE):
+            sampled += 1
+            analyzed += result['success']
+            yield result
+        yield {
+            'done': True,
+            'frames_received': received[0],
+            'frames_sampled': sampled,
+            'frames_analyzed': analyzed,
+            'session': session.summary()
         }
+    
+    def _calibration_for(self, session: Optional[MatchSession], camera_id: Optional[str]) -> Optional[PitchCalibration]:
+        """Resolve the pitch calibration for a session or explicit camera"""
+        return self.calibrations.get(session.camera_id if session is not None else camera_id)
+    
+    def calibrate_camera(self, camera_id: str, points: List[Dict[str, Any]],
+                         length: float = PITCH_LENGTH, width: float = PITCH_WIDTH) -> PitchCalibration:
+        """Compute and cache the image -> pitch homography for a camera"""
+        calibration = PitchCalibration.from_points(camera_id, points, length, width)
+        self.calibrations.put(calibration)
+        return calibration
+    
+    def run_job(self, job: Job) -> Dict[str, Any]:
+        """Analyze a spooled video job into its NDJSON result file; returns the final summary line"""
+        frames = job.limit(streaming.frames_from_upload(
+            job.read_chunks(), job.mimetype, FFMPEG_PATH, STREAM_MAX_FRAME_BYTES
+        ))
+        results = self.analyze_stream(
+            frames, job.context['session'], job.context.get('fps'), job.context.get('every', 1),
+            job.context.get('detection_filter')
+        )
+        summary = None
+        with closing(results), open(job.result_path, 'wb') as output:
+            for result in results:
+                job.check()
+                if result.get('done'):
+                    summary = result
+                else:
+                    job.frames_analyzed += result['success']
+                output.write(encoding.dumps_json(result) + b'\n')
+        return summary
+    
+    def _update_session(self, session: MatchSession, frames: List[Optional[FrameDetections]],
+                        frame_sizes: List[Tuple[int, int]], timestamps: List[Optional[float]],
+                        calibration: Optional[PitchCalibration] = None) -> Tuple[List[FrameDetections], List[float]]:
+        """Assign persistent track IDs and fold frames into the session's running metrics; frames that skipped detection (None) come back predicted, alongside each frame's match time"""
+        tracked = []
+        match_times = []
+        with session.lock:
+            for detections, frame_size, timestamp in zip(frames, frame_sizes, timestamps):
+                match_time = session.advance(frame_size, timestamp)
+                match_times.append(match_time)
+                if detections is None:
+                    detections = session.predicted_detections()
+                    track_ids = detections.track_ids
+                else:
+                    track_ids = session.tracker.update(detections.boxes)
+                    detections.track_ids = track_ids
+                    session.last_detections = detections
+                tracked.append(detections)
+                
+                # Tracker-filtered positions keep detector jitter out of distance
+                positions = session.tracker.positions(track_ids)
+                teams = detections.teams
+                if calibration is not None:
+                    pitch_positions = calibration.to_pitch(positions)
+                    session.kinematics.update(track_ids, pitch_positions, match_time)
+                    session.heatmaps.update(track_ids, teams, pitch_positions, calibration.frame_size)
+                else:
+                    session.kinematics.update(track_ids, positions, match_time, session.metres_per_pixel)
+                    session.heatmaps.update(track_ids, teams, positions, frame_size)
+        return tracked, match_times
+    
+    def finalize_session(self, session: MatchSession, positions: Dict[str, str],
+                         min_tracked_seconds: float = 5.0) -> Dict[str, Any]:
+        """Produce per-player player_data (and benchmark analysis where a position is known)"""
+        with session.lock:
+            player_data = session.kinematics.finalize(min_tracked_seconds)
         
-        formation = formations_map.get(len(lines), 'custom')
+        players = {}
+        for player_id, data in player_data.items():
+            players[player_id] = {'player_data': data}
+            if player_id in positions:
+                players[player_id]['performance'] = self.analyze_performance(data, positions[player_id])
         
         return {
-            'formation': formation,
-            'lines': len(lines),
-            'confidence': 0.75 if len(lines) in formations_map else 0.4
+            'session_id': session.session_id,
+            'match_time': session.match_time,
+            'players': players
         }
     
-    def _cluster_positions(self, positions: List[float], field_height: int) -> List[List[float]]:
-        """Cluster positions into lines"""
-        if not positions:
-            return []
-        
-        clusters = []
-        current_cluster = [positions[0]]
-        threshold = field_height * 0.15
+    def _create_detector(self) -> DetectorBackend:
+        """Build the detector backend selected by DETECTOR_BACKEND"""
+        backend = DETECTOR_BACKEND
+        if backend == 'roboflow' and not self.roboflow_api_key:
+            print("ROBOFLOW_API_KEY not configured, using the replay detector (unrecorded frames will fail)")
+            backend = 'replay'
         
-        for pos in positions[1:]:
-            if abs(pos - current_cluster[-1]) < threshold:
-                current_cluster.append(pos)
-            else:
-                clusters.append(current_cluster)
-                current_cluster = [pos]
+        if backend == 'roboflow':
+            client = RoboflowClient(
+                api_key=ROBOFLOW_API_KEY,
+                model=ROBOFLOW_MODEL,
+                base_url=ROBOFLOW_API_URL,
+                deadline=ROBOFLOW_DEADLINE,
+                max_retries=ROBOFLOW_MAX_RETRIES,
+                max_concurrency=ROBOFLOW_MAX_CONCURRENCY,
+                breaker=CircuitBreaker(ROBOFLOW_BREAKER_THRESHOLD, ROBOFLOW_BREAKER_RESET)
+            )
+            async_client = None
+            if async_supported():
+                async_client = AsyncRoboflowClient(
+                    api_key=ROBOFLOW_API_KEY,
+                    model=ROBOFLOW_MODEL,
+                    base_url=ROBOFLOW_API_URL,
+                    deadline=ROBOFLOW_DEADLINE,
+                    max_retries=ROBOFLOW_MAX_RETRIES,
+                    max_concurrency=ROBOFLOW_ASYNC_CONCURRENCY,
+                    breaker=client.breaker
+                )
+            detector = RoboflowBackend(client, DETECTION_RAW_CONFIDENCE, 100, DETECTION_CONCURRENCY, async_client)
+        elif backend in ('local', 'onnx', 'opencv'):
+            detector = LocalModelBackend(
+                DETECTOR_MODEL_PATH,
+                input_size=DETECTOR_INPUT_SIZE,
+                classes=DETECTOR_CLASSES,
+                confidence=DETECTION_RAW_CONFIDENCE / 100,
+                engine={'onnx': 'onnxruntime', 'opencv': 'opencv'}.get(backend)
+            )
+        elif backend == 'replay':
+            detector = ReplayBackend(DETECTOR_REPLAY_FILE, DETECTOR_REPLAY_SYNTHETIC)
+            if DETECTOR_REPLAY_SYNTHETIC:
+                print("DETECTOR_REPLAY_SYNTHETIC is set: unrecorded frames get made-up detections")
+        else:
+            raise ValueError(f"Unknown DETECTOR_BACKEND: {backend}")
         
-        clusters.append(current_cluster)
-        return clusters
+        if DETECTOR_RECORD_FILE:
+            detector = RecordingBackend(detector, DETECTOR_RECORD_FILE)
+        return detector
+    
+    def _prepare_frames(self, images: List[bytes], calibration: Optional[PitchCalibration] = None,
+                        session: Optional[MatchSession] = None) -> List[Future]:
+        """Futures of (detector-sized JPEG, its transform back to frame pixels, frame size, motion thumbnail)"""
+        thumbnail_width = THUMBNAIL_WIDTH if session is not None and session.sampler.enabled else 0
+        return self.frame_pool.prepare(
+            images, DETECTION_INPUT_SIZE, calibration if DETECTION_ROI else None, DETECTION_ROI_MARGIN, thumbnail_width
+        )
     
-    def _calculate_team_compactness(self, players: List[Dict]) -> float:
-        """Calculate team compactness (0-1, higher is more compact)"""
-        home_players = [p for p in players if p.get('team') == 'home']
+    def _detect_players(self, jpeg_data: bytes, session: Optional[MatchSession] = None,
+                        detection_filter: Optional[DetectionFilter] = None,
+                        transform: Optional[InputTransform] = None) -> FrameDetections:
+        """Detect players in one frame; DetectorUnavailable when the detector gave no result"""
+        detections = self._detect_batch([jpeg_data], session, detection_filter, [transform])[0]
+        if detections is None:
+            raise DetectorUnavailable(DETECTION_FAILED)
+        return detections
+    
+    def _detect_batch(self, frames: List[bytes], session: Optional[MatchSession] = None,
+                      detection_filter: Optional[DetectionFilter] = None,
+                      transforms: Optional[List[Optional[InputTransform]]] = None) -> List[Optional[FrameDetections]]:
+        """Detect players across a batch of frames, label teams by jersey colour and map boxes to frame pixels; None where detection failed"""
+        responses, cache_keys = self._cached_responses(frames)
         
-        if len(home_players) < 2:
-            return 0.0
+        # Everything else goes to the backend as one batch
+        missing = [idx for idx, response in enumerate(responses) if response is None]
+        if missing:
+            try:
+                fresh = self.detector.detect_batch([frames[idx] for idx in missing])
+            except Exception as e:
+                print(f"Detector error: {e}")
+                fresh = [None] * len(missing)
+            self._store_responses(frames, missing, fresh, responses, cache_keys)
+        return self._label_detections(frames, responses, session, detection_filter, transforms)
+    
+    async def _detect_batch_async(self, frames: List[bytes], session: Optional[MatchSession] = None,
+                                  detection_filter: Optional[DetectionFilter] = None,
+                                  transforms: Optional[List[Optional[InputTransform]]] = None) -> List[Optional[FrameDetections]]:
+        """_detect_batch with the detector awaited; the cache and post-processing run on the default executor"""
+        loop = asyncio.get_running_loop()
+        responses, cache_keys = await loop.run_in_executor(None, self._cached_responses, frames)
         
-        positions = [(p['position']['x'], p['position']['y']) for p in home_players]
+        missing = [idx for idx, response in enumerate(responses) if response is None]
+        if missing:
+            try:
+                fresh = await self.detector.detect_batch_async([frames[idx] for idx in missing])
+            except Exception as e:
+                print(f"Detector error: {e}")
+                fresh = [None] * len(missing)
+            await loop.run_in_executor(None, self._store_responses, frames, missing, fresh, responses, cache_keys)
+        return await loop.run_in_executor(
+            None, self._label_detections, frames, responses, session, detection_filter, transforms
+        )
+    
+    def _cached_responses(self, frames: List[bytes]) -> Tuple[List[Optional[Dict]], List[Optional[str]]]:
+        """Cached raw detector responses (None where missing) and each frame's cache key"""
+        responses: List[Optional[Dict]] = [None] * len(frames)
+        cache_keys: List[Optional[str]] = [None] * len(frames)
         
-        # Calculate average distance between players
-        total_distance = 0
-        count = 0
-        for i, pos1 in enumerate(positions):
-            for pos2 in positions[i+1:]:
-                distance = np.sqrt((pos1[0] - pos2[0])**2 + (pos1[1] - pos2[1])**2)
-                total_distance += distance
-                count += 1
+        # Replays, retried uploads and re-filtering at new thresholds reuse the cached raw response
+        if self.detection_cache.enabled:
+            for idx, jpeg_data in enumerate(frames):
+                cache_keys[idx] = make_key(jpeg_data, self.detector.model_id, raw_confidence=DETECTION_RAW_CONFIDENCE)
+                responses[idx] = self.detection_cache.get(cache_keys[idx], jpeg_data)
+        return responses, cache_keys
+    
+    def _store_responses(self, frames: List[bytes], missing: List[int], fresh: List[Optional[Dict]],
+                         responses: List[Optional[Dict]], cache_keys: List[Optional[str]]):
+        """Fill in the detector's responses and cache them"""
+        for idx, response in zip(missing, fresh):
+            responses[idx] = response
+            if response is not None and cache_keys[idx] is not None:
+                self.detection_cache.put(cache_keys[idx], response, frames[idx])
+    
+    def _label_detections(self, frames: List[bytes], responses: List[Optional[Dict]],
+                          session: Optional[MatchSession] = None,
+                          detection_filter: Optional[DetectionFilter] = None,
+                          transforms: Optional[List[Optional[InputTransform]]] = None) -> List[Optional[FrameDetections]]:
+        """Filter raw responses, label teams and map boxes back to frame pixels; frames without a response stay None"""
+        # Confidence, class and NMS filtering for the whole batch in one vectorized pass
+        filtered = filter_detections(responses, detection_filter or self.default_filter)
+        labeled = [idx for idx, frame in enumerate(filtered) if frame is not None]
         
-        avg_distance = total_distance / count if count > 0 else 0
+        if TEAM_CLASSIFICATION and labeled:
+            # Sessions reuse their kit centroids; otherwise kits are clustered per frame
+            classifier = session.teams if session is not None else None
+            # Only players are clustered by kit; the ball and referees would pull the centroids off
+            features = self.frame_pool.team_features([frames[idx] for idx in labeled],
+                                                     [filtered[idx].boxes[filtered[idx].players] for idx in labeled])
+            for idx, future in zip(labeled, features):
+                try:
+                    assign_teams(filtered[idx], future.result(), classifier)
+                except Exception as e:
+                    print(f"Team classification error: {e}")
         
-        # Normalize to 0-1 (assuming max distance is ~1000 pixels)
-        compactness = max(0, 1 - (avg_distance / 1000))
-        return float(compactness)
+        # Teams were sampled from the detector input; everything downstream works in frame pixels
+        for frame, transform in zip(filtered, transforms or []):
+            if frame is not None and transform is not None:
+                transform.to_frame(frame)
+        return filtered
+    
+    def _analyze_player_movements(self, detections: FrameDetections, frame_size: Tuple[int, int],
+                                  calibration: Optional[PitchCalibration] = None,
+                                  session: Optional[MatchSession] = None) -> Dict:
+        """Analyze player movements and positioning"""
+        # Same vectorized path as batches; metrics run in metres when calibrated
+        return self._analyze_batch([detections], [frame_size], calibration, session)[0]
+    
+    def _analyze_batch(self, detections: List[FrameDetections], frame_sizes: List[Tuple[int, int]],
+                       calibration: Optional[PitchCalibration] = None,
+                       session: Optional[MatchSession] = None) -> List[Dict]:
+        """Tactical analytics for a batch; within a session formations are smoothed over its window"""
+        if session is None:
+            return batch_metrics.analyze_batch(detections, frame_sizes, calibration)
+        with session.lock:
+            return batch_metrics.analyze_batch(detections, frame_sizes, calibration, session.formations)
     
     def analyze_performance(self, player_data: Dict, position: str) -> Dict[str, Any]:
         """Analyze player performance against professional benchmarks"""
@@ -446,27 +895,425 @@ class PlayerAnalyticsService:
 # Initialize service
 analytics_service = PlayerAnalyticsService()
 
+request_parser = RequestParser(
+    analytics_service.default_filter, HEATMAP_RESOLUTION, FORMATION_WINDOW, MOTION_THRESHOLD, MOTION_MAX_GAP,
+    LIVE_KEYFRAME_INTERVAL, MAX_BATCH_FRAMES, FFMPEG_PATH, JOB_MAX_BYTES, JOB_MAX_FRAMES, JOB_MAX_SECONDS
+)
+
+class AnalyticsRequest(Request):
+    """Request that collects uploaded files in bounded memory buffers"""
+    
+    # These read request.stream incrementally and bound it themselves
+    streaming_endpoints = frozenset({'analyze_video', 'stream_session_video', 'create_job'})
+    
+    @property
+    def max_content_length(self) -> Optional[int]:
+        if self.endpoint in self.streaming_endpoints:
+            return None
+        return super().max_content_length
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadBuffer(STREAM_MAX_FRAME_BYTES)
+
+app.request_class = AnalyticsRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES or None
+
+@app.before_request
+def reject_oversized_request():
+    """413 from the declared Content-Length, before any of the body is read"""
+    limit = request.max_content_length
+    if limit and request.content_length and request.content_length > limit:
+        return jsonify({'error': f"Request exceeds the {limit} byte upload limit"}), 413
+
+def uploaded_frames(field: str) -> List[memoryview]:
+    """The files uploaded under field, as views of their upload buffers"""
+    try:
+        files = request.files.getlist(field)
+    except RequestEntityTooLarge:
+        # A chunked body that ran past the limit while it was parsed
+        raise UploadTooLarge(f"Request exceeds the {request.max_content_length} byte upload limit")
+    return [read_upload(file.stream, STREAM_MAX_FRAME_BYTES) for file in files]
+
+def analysis_response(result: Dict[str, Any]) -> Response:
+    """Encode an analysis result as JSON, msgpack or Arrow IPC according to the Accept header"""
+    mimetype = encoding.negotiate(request.accept_mimetypes)
+    if mimetype == encoding.JSON:
+        response = jsonify(result)
+    else:
+        response = Response(encoding.encode(result, mimetype), mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+def stream_response(session: MatchSession) -> Response:
+    """NDJSON results for the video in the request body, analyzed while it is still uploading"""
+    # Clients must read results while uploading: once the queues fill, the upload is held back
+    options = request_parser.stream_options(request.mimetype, request.args)
+    frames = streaming.frames_from_upload(
+        streaming.read_chunks(request.stream), request.mimetype, FFMPEG_PATH, STREAM_MAX_FRAME_BYTES
+    )
+    
+    def generate():
+        try:
+            for result in analytics_service.analyze_stream(frames, session, **options):
+                yield encoding.dumps_json(result) + b'\n'
+        except Exception as e:
+            # Headers are long gone; report the failure as the last line
+            yield encoding.dumps_json({'error': str(e)}) + b'\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+async def handle_frame_message(header: Dict[str, Any], frames: List[memoryview]) -> Tuple[int, str, bytes]:
+    """Serve one frame-socket request like the matching analyze-frame(s) endpoint; returns (status, content type, body)"""
+    op = header.get('op')
+    if op not in ('analyze-frame', 'analyze-frames'):
+        return 400, encoding.JSON, encoding.dumps_json({'error': f"Unknown op: {op}"})
+    try:
+        if op == 'analyze-frame':
+            request_parser.frame(frames)
+            if len(frames) > 1:
+                raise RequestError('Too many images (max 1)')
+        else:
+            request_parser.batch(frames)
+        session_id = header.get('session_id')
+        session = analytics_service.sessions.get(session_id) if session_id else None
+        values = MultiDict({key: header[key] for key in ('confidence', 'overlap', 'classes') if header.get(key) is not None})
+        detection_filter = request_parser.detection_filter(values)
+        
+        if op == 'analyze-frame':
+            result = await analytics_service.analyze_frame_async(
+                frames[0], session=session, timestamp=header.get('timestamp'), camera_id=header.get('camera_id'),
+                detection_filter=detection_filter
+            )
+        else:
+            result = await analytics_service.analyze_frames_async(
+                frames, session=session, timestamps=request_parser.timestamps(header.get('timestamps'), len(frames)),
+                camera_id=header.get('camera_id'), detection_filter=detection_filter
+            )
+    except RequestError as e:
+        return e.status, encoding.JSON, encoding.dumps_json(e.body)
+    except SessionNotFound:
+        return 404, encoding.JSON, encoding.dumps_json({'error': 'Session not found'})
+    if session_id:
+        result['session_id'] = session_id
+    
+    mimetype = header.get('accept', encoding.JSON)
+    if mimetype not in encoding.available():
+        mimetype = encoding.JSON
+    body = await asyncio.get_running_loop().run_in_executor(None, encoding.encode, result, mimetype)
+    return 200, mimetype, body
+
+frame_server = FrameServer(
+    FRAME_SOCKET, handle_frame_message, MAX_BATCH_FRAMES * STREAM_MAX_FRAME_BYTES, FRAME_SOCKET_MAX_IN_FLIGHT
+) if FRAME_SOCKET else None
+
 # API Endpoints
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'service': 'player-analytics'})
+    return jsonify({
+        'status': 'healthy',
+        'service': 'player-analytics',
+        'detector': analytics_service.detector.stats(),
+        'detection_cache': analytics_service.detection_cache.stats(),
+        'jobs': analytics_service.jobs.stats(),
+        'frame_socket': frame_server.stats() if frame_server is not None else None
+    })
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe; 503 until the detector is loaded and once the worker starts draining"""
+    readiness = analytics_service.readiness()
+    return jsonify(readiness), 200 if readiness['ready'] else 503
 
 @app.route('/api/analyze-frame', methods=['POST'])
 def analyze_frame():
     """Analyze a single frame for player tracking"""
     try:
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image provided'}), 400
-        
-        image_file = request.files['image']
-        image_data = image_file.read()
-        
-        result = analytics_service.analyze_frame(image_data)
+        result = analytics_service.analyze_frame(
+            request_parser.frame(uploaded_frames('image')),
+            camera_id=request.form.get('camera_id'),
+            detection_filter=request_parser.detection_filter(request.values)
+        )
+        return analysis_response(result)
+    except RequestError as e:
+        return jsonify(e.body), e.status
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analyze-frames', methods=['POST'])
+def analyze_frames():
+    """Analyze a batch of frames in one request"""
+    try:
+        result = analytics_service.analyze_frames(
+            request_parser.batch(uploaded_frames('images')),
+            camera_id=request.form.get('camera_id'),
+            detection_filter=request_parser.detection_filter(request.values)
+        )
+        return analysis_response(result)
+    except RequestError as e:
+        return jsonify(e.body), e.status
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analyze-video', methods=['POST'])
+def analyze_video():
+    """Stream a video upload (MJPEG, or any container ffmpeg can read) through a one-off session"""
+    try:
+        return stream_response(request_parser.one_off_session(request.args))
+    except RequestError as e:
+        return jsonify(e.body), e.status
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/calibrations/<camera_id>', methods=['POST'])
+def calibrate_camera(camera_id):
+    """Calibrate a camera from pitch landmarks"""
+    try:
+        points, length, width = request_parser.calibration(request.get_json(silent=True) or {})
+        calibration = analytics_service.calibrate_camera(camera_id, points, length=length, width=width)
+        return jsonify(calibration.to_dict()), 201
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': f'Invalid calibration: {e}'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/calibrations/<camera_id>', methods=['GET'])
+def get_calibration(camera_id):
+    """Get a cached camera calibration"""
+    calibration = analytics_service.calibrations.get(camera_id)
+    if calibration is None:
+        return jsonify({'error': 'Calibration not found'}), 404
+    return jsonify(calibration.to_dict())
+
+@app.route('/api/calibrations/<camera_id>', methods=['DELETE'])
+def delete_calibration(camera_id):
+    """Remove a camera calibration"""
+    calibration = analytics_service.calibrations.remove(camera_id)
+    if calibration is None:
+        return jsonify({'error': 'Calibration not found'}), 404
+    return jsonify(calibration.to_dict())
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session():
+    """Start a match session with persistent player tracking"""
+    try:
+        data = request.get_json(silent=True) or {}
+        session = analytics_service.sessions.create(data.get('session_id'), **request_parser.session_options(data))
+        return jsonify(session.summary()), 201
+    except RequestError as e:
+        return jsonify(e.body), e.status
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    """Get match session state"""
+    try:
+        return jsonify(analytics_service.sessions.get(session_id).summary())
+    except SessionNotFound:
+        return jsonify({'error': 'Session not found'}), 404
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def end_session(session_id):
+    """End a match session and release its state"""
+    try:
+        return jsonify(analytics_service.sessions.remove(session_id).summary())
+    except SessionNotFound:
+        return jsonify({'error': 'Session not found'}), 404
+
+@app.route('/api/sessions/<session_id>/analyze-frame', methods=['POST'])
+def analyze_session_frame(session_id):
+    """Analyze the next frame of a match session"""
+    try:
+        session = analytics_service.sessions.get(session_id)
+        result = analytics_service.analyze_frame(
+            request_parser.frame(uploaded_frames('image')), session=session,
+            timestamp=request.form.get('timestamp', type=float),
+            detection_filter=request_parser.detection_filter(request.values)
+        )
+        result['session_id'] = session_id
+        return analysis_response(result)
+    except SessionNotFound:
+        return jsonify({'error': 'Session not found'}), 404
+    except RequestError as e:
+        return jsonify(e.body), e.status
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sessions/<session_id>/analyze-frames', methods=['POST'])
+def analyze_session_frames(session_id):
+    """Analyze the next batch of frames of a match session, in order"""
+    try:
+        session = analytics_service.sessions.get(session_id)
+        frames = request_parser.batch(uploaded_frames('images'))
+        result = analytics_service.analyze_frames(
+            frames, session=session, timestamps=request_parser.timestamps(request.form.getlist('timestamps'), len(frames)),
+            detection_filter=request_parser.detection_filter(request.values)
+        )
+        result['session_id'] = session_id
+        return analysis_response(result)
+    except SessionNotFound:
+        return jsonify({'error': 'Session not found'}), 404
+    except RequestError as e:
+        return jsonify(e.body), e.status
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sessions/<session_id>/stream', methods=['POST'])
+def stream_session_video(session_id):
+    """Stream the next stretch of a match session's video, one NDJSON result per sampled frame"""
+    try:
+        return stream_response(analytics_service.sessions.get(session_id))
+    except SessionNotFound:
+        return jsonify({'error': 'Session not found'}), 404
+    except RequestError as e:
+        return jsonify(e.body), e.status
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sessions/<session_id>/live', methods=['GET'])
+def live_session(session_id):
+    """Server-Sent Events feed of a session's analytics: a keyframe, then deltas as its frames are processed"""
+    try:
+        subscription = analytics_service.sessions.get(session_id).live.subscribe()
+    except SessionNotFound:
+        return jsonify({'error': 'Session not found'}), 404
+    
+    # Each viewer holds a worker thread here; the asyncio app (aio.py) serves viewers as coroutines
+    def generate():
+        try:
+            yield b'retry: 2000\n\n'
+            while not subscription.closed:
+                events = subscription.get(LIVE_HEARTBEAT)
+                # The keepalive comment also lets the server notice a viewer that went away
+                yield b''.join(events) if events else b': keepalive\n\n'
+        finally:
+            subscription.close()
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/sessions/<session_id>/heatmaps', methods=['GET'])
+def get_session_heatmaps(session_id):
+    """Whole-match occupancy heatmaps per player and team (npz or downsampled JSON)"""
+    try:
+        npz, result = request_parser.heatmaps(analytics_service.sessions.get(session_id), request.args)
+        if npz is not None:
+            return Response(npz, mimetype='application/octet-stream',
+                            headers={'Content-Disposition': f'attachment; filename={heatmap_filename(session_id)}'})
         return jsonify(result)
+    except SessionNotFound:
+        return jsonify({'error': 'Session not found'}), 404
+    except KeyError as e:
+        return jsonify({'error': f'Unknown heatmap: {e.args[0]}'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/sessions/<session_id>/finalize', methods=['POST'])
+def finalize_session(session_id):
+    """Produce per-player speed, distance and sprint data for analyze-performance"""
+    try:
+        session = analytics_service.sessions.get(session_id)
+        data = request.get_json(silent=True) or {}
+        result = analytics_service.finalize_session(
+            session,
+            positions=data.get('positions', {}),
+            min_tracked_seconds=request_parser.min_tracked_seconds(data)
+        )
+        return jsonify(result)
+    except SessionNotFound:
+        return jsonify({'error': 'Session not found'}), 404
+    except RequestError as e:
+        return jsonify(e.body), e.status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queue a video upload for background analysis; poll the job, then download its NDJSON results"""
+    try:
+        options = request_parser.stream_options(request.mimetype, request.args)
+        max_bytes, max_frames, max_seconds = request_parser.job_limits(request.args, request.content_length)
+        session_id = request.args.get('session_id')
+        session = analytics_service.sessions.get(session_id) if session_id else request_parser.one_off_session(request.args)
+        
+        job = analytics_service.jobs.create(
+            request.mimetype, request.args.to_dict(), max_frames=max_frames, max_seconds=max_seconds
+        )
+        try:
+            job.spool(streaming.read_chunks(request.stream), max_bytes)
+        except Exception:
+            analytics_service.jobs.discard(job)
+            raise
+        job.context.update(session=session, **options)
+        analytics_service.jobs.submit(job)
+        return jsonify(job.to_dict()), 202
+    except RequestError as e:
+        return jsonify(e.body), e.status
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    except JobLimitExceeded as e:
+        return jsonify({'error': str(e)}), 413
+    except SessionNotFound:
+        return jsonify({'error': 'Session not found'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job state and progress"""
+    try:
+        return jsonify(analytics_service.jobs.get(job_id).to_dict())
+    except JobNotFound:
+        return jsonify({'error': 'Job not found'}), 404
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Per-frame NDJSON results of a finished job (partial for failed or cancelled ones)"""
+    try:
+        return send_file(job_result_path(analytics_service.jobs.get(job_id)), mimetype='application/x-ndjson',
+                         as_attachment=True, download_name=f"{job_id}.ndjson")
+    except RequestError as e:
+        return jsonify(e.body), e.status
+    except JobNotFound:
+        return jsonify({'error': 'Job not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job, or delete a finished one and its results"""
+    try:
+        return jsonify(analytics_service.jobs.cancel(job_id).to_dict())
+    except JobNotFound:
+        return jsonify({'error': 'Job not found'}), 404
+
 @app.route('/api/analyze-performance', methods=['POST'])
 def analyze_performance():
     """Analyze player performance against pro benchmarks"""
@@ -499,6 +1346,12 @@ def get_pro_benchmarks():
     return jsonify(analytics_service.professional_benchmarks)
 
 if __name__ == '__main__':
+    # Development server only; production runs gunicorn -c gunicorn.conf.py wsgi:app (or aio:app, see aio.py)
     port = int(os.getenv('ANALYTICS_PORT', 5001))
+    debug = os.getenv('ANALYTICS_DEBUG', '0') == '1'
     print(f"Starting Player Analytics Service on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=True)
+    if frame_server is not None:
+        frame_server.listen()
+        frame_server.serve_in_thread()
+        print(f"Serving frames on {FRAME_SOCKET}")
+    app.run(host='0.0.0.0', port=port, debug=debug, threaded=True)
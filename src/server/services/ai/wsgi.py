@@ -0,0 +1,33 @@
+"""
+WSGI entry point for production serving
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+player-analytics.py can't be imported by name, so it is loaded from its
+path here. Importing this module builds the service and preloads the
+detector. Under gunicorn's preload_app that happens once in the master,
+before the workers are forked. The asyncio server (aio.py) imports the
+same service from here.
+"""
+
+import os
+import sys
+import importlib.util
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+_spec = importlib.util.spec_from_file_location('player_analytics', os.path.join(HERE, 'player-analytics.py'))
+player_analytics = importlib.util.module_from_spec(_spec)
+sys.modules['player_analytics'] = player_analytics
+_spec.loader.exec_module(player_analytics)
+
+app = player_analytics.app
+service = player_analytics.analytics_service
+service.preload()
+
+# Bound before the fork so every worker accepts frame-socket connections too (see gunicorn.conf.py)
+frame_server = player_analytics.frame_server
+if frame_server is not None:
+    frame_server.listen()